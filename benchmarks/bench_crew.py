@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+离线端到端基准测试
+
+启动本地模拟服务（benchmarks/stub_server.py，独立子进程），把 DEEP_SEEK_URL 指向它，
+反复执行 AgentProject().crew().kickoff，输出：
+- 吞吐量（次/秒）
+- 单次运行延迟的 p50 / p95 / p99
+- 本进程每次运行的 CPU 时间（不含模拟服务）
+- 本进程常驻内存峰值，以及可选的 Python 对象分配峰值（--tracemalloc）
+
+模拟服务的延迟固定，数值的变化即反映 crew.py 和工具代码的开销变化，可作为回归对比的基线。
+
+用法（在项目根目录执行）：
+    python -m benchmarks.bench_crew --runs 20 --concurrency 4 --local-bazi --concurrent
+    python -m benchmarks.bench_crew --runs 10 --token-latency 0.002 --json bench.json
+"""
+
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.append(str(ROOT / 'src'))
+
+BENCH_INPUTS = {
+    'name': '测试',
+    'gender': '男',
+    'birth_date': '2003年2月13日',
+    'birth_time': '23时55分',
+    'birth_place': '福建厦门',
+    'provided_bazi': '',
+}
+
+
+def percentile(values: Sequence[float], pct: float) -> float:
+    """线性插值的百分位数"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * pct / 100
+    low = int(rank)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+def start_stub(first_token_latency: float, token_latency: float, response_tokens: int):
+    """以子进程启动模拟服务，返回 (进程, 端口)"""
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'benchmarks.stub_server', '--port', '0',
+         '--first-token-latency', str(first_token_latency),
+         '--token-latency', str(token_latency),
+         '--response-tokens', str(response_tokens)],
+        cwd=ROOT, stdout=subprocess.PIPE, text=True,
+    )
+    line = process.stdout.readline()
+    if not line.startswith('listening on '):
+        process.kill()
+        raise RuntimeError(f"模拟服务启动失败：{line.strip()}")
+    return process, int(line.split()[-1])
+
+
+def point_to_stub(port: int) -> None:
+    """让团队和 litellm 的所有调用都发往模拟服务（必须在导入 agent_project.crew 之前调用）"""
+    url = f"http://127.0.0.1:{port}"
+    os.environ['DEEP_SEEK_URL'] = url
+    os.environ['DEEP_SEEK_KEY'] = 'stub'
+    # crewAI 规划的结构化输出经由 instructor 调用，不带 base_url，按 litellm 的 deepseek 默认配置寻址
+    os.environ['DEEPSEEK_API_BASE'] = url
+    os.environ['DEEPSEEK_API_KEY'] = 'stub'
+    os.environ.setdefault('OTEL_SDK_DISABLED', 'true')
+    os.environ.setdefault('CREWAI_DISABLE_TELEMETRY', 'true')
+
+
+def run_benchmark(runs: int, warmup: int = 1, concurrency: int = 1,
+                  options: Optional[Dict[str, Any]] = None, stream: bool = False,
+                  trace_memory: bool = False) -> Dict[str, Any]:
+    """执行基准测试（模拟服务须已启动并已调用 point_to_stub）"""
+    if runs < 1 or concurrency < 1:
+        raise ValueError("运行次数和并发数至少为1")
+    from agent_project.crew import AgentProject
+    from agent_project.streaming_callback import SimpleStreamingHandler, StreamingCallback, attach_streaming
+
+    options = {k: v for k, v in (options or {}).items() if v is not None}
+
+    def kickoff() -> float:
+        started = time.perf_counter()
+        project = AgentProject(stream=stream, verbose=False, **options)
+        if stream:
+            # 与 streaming_main 相同的事件路由和处理器，模型输出写到空设备
+            with open(os.devnull, 'w', encoding='utf-8') as sink:
+                handler = SimpleStreamingHandler(sink)
+                with attach_streaming(project, StreamingCallback(handler)):
+                    project.crew().kickoff(inputs=dict(BENCH_INPUTS))
+                handler.close()
+        else:
+            project.crew().kickoff(inputs=dict(BENCH_INPUTS))
+        return time.perf_counter() - started
+
+    for _ in range(warmup):
+        kickoff()
+
+    if trace_memory:
+        tracemalloc.start()
+    cpu_started = time.process_time()
+    started = time.perf_counter()
+    latencies: List[float] = []
+    lock = threading.Lock()
+
+    def measured(_):
+        elapsed = kickoff()
+        with lock:
+            latencies.append(elapsed)
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(measured, range(runs)))
+
+    wall = time.perf_counter() - started
+    cpu = time.process_time() - cpu_started
+    peak_traced = 0
+    if trace_memory:
+        peak_traced = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    # Linux 上 ru_maxrss 以 KB 为单位，macOS 上以字节为单位
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin':
+        max_rss //= 1024
+
+    return {
+        'runs': runs,
+        'concurrency': concurrency,
+        'options': options,
+        'stream': stream,
+        'wall_seconds': round(wall, 3),
+        'throughput_per_second': round(runs / wall, 3),
+        'latency_seconds': {
+            'mean': round(sum(latencies) / len(latencies), 4),
+            'p50': round(percentile(latencies, 50), 4),
+            'p95': round(percentile(latencies, 95), 4),
+            'p99': round(percentile(latencies, 99), 4),
+            'max': round(max(latencies), 4),
+        },
+        'cpu_seconds_per_run': round(cpu / runs, 4),
+        'peak_traced_mb': round(peak_traced / 2 ** 20, 2) if trace_memory else None,
+        'max_rss_mb': round(max_rss / 1024, 1),
+    }
+
+
+def format_report(result: Dict[str, Any]) -> str:
+    latency = result['latency_seconds']
+    enabled = ", ".join(sorted(k for k, v in result['options'].items() if v)) or "默认"
+    lines = [
+        f"=== 离线基准测试（{result['runs']} 次，并发 {result['concurrency']}，模式：{enabled}"
+        f"{'，流式' if result['stream'] else ''}）===",
+        f"总耗时      {result['wall_seconds']:.3f} 秒",
+        f"吞吐量      {result['throughput_per_second']:.3f} 次/秒",
+        f"延迟        p50 {latency['p50']:.3f}  p95 {latency['p95']:.3f}  p99 {latency['p99']:.3f}"
+        f"  最大 {latency['max']:.3f} 秒",
+        f"CPU         {result['cpu_seconds_per_run']:.4f} 秒/次",
+    ]
+    if result['peak_traced_mb'] is not None:
+        lines.append(f"内存分配峰值 {result['peak_traced_mb']:.2f} MB（tracemalloc）")
+    lines.append(f"常驻内存峰值 {result['max_rss_mb']:.1f} MB")
+    return "\n".join(lines)
+
+
+def build_parser() -> argparse.ArgumentParser:
+    """基准测试自身的参数；其余参数作为运行模式开关交给 options_from_argv"""
+    # 关闭前缀缩写：否则运行模式开关 --trace 会被当作 --tracemalloc 的缩写
+    parser = argparse.ArgumentParser(description="八字分析团队离线基准测试",
+                                     epilog="另可使用与 main.py 相同的运行模式开关，如 --local-bazi --concurrent",
+                                     allow_abbrev=False)
+    parser.add_argument('--runs', type=int, default=10, help="计时的运行次数")
+    parser.add_argument('--warmup', type=int, default=1, help="不计时的预热运行次数")
+    parser.add_argument('--concurrency', type=int, default=1, help="同时执行的运行数")
+    parser.add_argument('--stream', action='store_true', help="以流式模式调用模型")
+    parser.add_argument('--first-token-latency', type=float, default=0.0, help="模拟服务首token延迟（秒）")
+    parser.add_argument('--token-latency', type=float, default=0.0, help="模拟服务每token延迟（秒）")
+    parser.add_argument('--response-tokens', type=int, default=100, help="模拟服务每次回答的token数")
+    parser.add_argument('--tracemalloc', action='store_true',
+                        help="统计Python内存分配峰值（开销较大，会拉高延迟和CPU时间）")
+    parser.add_argument('--json', help="把结果以JSON写入该文件")
+    return parser
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    parser = build_parser()
+    args, mode_flags = parser.parse_known_args(argv)
+
+    stub, port = start_stub(args.first_token_latency, args.token_latency, args.response_tokens)
+    try:
+        point_to_stub(port)
+        # 模型实例在导入时按环境变量创建，因此团队模块在指向模拟服务之后才导入
+        from agent_project.crew import CLI_FLAGS, options_from_argv
+        unknown = [flag for flag in mode_flags if flag not in CLI_FLAGS]
+        if unknown:
+            parser.error(f"未知参数：{' '.join(unknown)}")
+        with tempfile.TemporaryDirectory() as cache:
+            # 缓存写到临时目录，不读写项目的 .bazi_cache
+            os.environ['BAZI_CACHE_DIR'] = cache
+            result = run_benchmark(args.runs, args.warmup, args.concurrency, options_from_argv(argv),
+                                   stream=args.stream, trace_memory=args.tracemalloc)
+    finally:
+        stub.terminate()
+        stub.wait()
+
+    print(format_report(result))
+    if args.json:
+        Path(args.json).write_text(json.dumps(result, ensure_ascii=False, indent=2), encoding='utf-8')
+    return result
+
+
+if __name__ == "__main__":
+    main()
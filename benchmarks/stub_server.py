@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+本地 DeepSeek / OpenAI 兼容的模拟服务
+
+只实现 POST /chat/completions（含 /v1、/beta 前缀），按配置的延迟和长度返回固定格式的回答，
+用于离线测量团队框架本身的开销：
+- 普通请求返回 ReAct 格式的 Final Answer
+- crewAI 规划请求（提示词中含 "Task Number"）返回与任务数一致的规划 JSON
+- 请求中带 tools 时（instructor 结构化输出）以工具调用返回同样的规划 JSON
+- stream 为 true 时以 SSE 逐token返回
+
+用法：
+    python -m benchmarks.stub_server --port 18080 --token-latency 0.005 --response-tokens 200
+启动后在标准输出打印一行 "listening on <端口>"（--port 0 时由系统分配端口）。
+"""
+
+import argparse
+import json
+import re
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List
+
+# 每个模拟token包含的字符数
+TOKEN_CHARS = 2
+
+# 组成回答正文的文字，按需要的token数循环截取
+ANSWER_TEXT = "日主戊土生于寅月，木旺土虚，喜火土扶身，忌水木克泄。流年逢火，事业渐入佳境。"
+
+
+class StubConfig:
+    """模拟服务参数"""
+
+    def __init__(self, first_token_latency: float = 0.0, token_latency: float = 0.0,
+                 response_tokens: int = 100):
+        if response_tokens < 1:
+            raise ValueError("回答长度至少为1个token")
+        self.first_token_latency = first_token_latency
+        self.token_latency = token_latency
+        self.response_tokens = response_tokens
+        self.requests = 0
+        self._lock = threading.Lock()
+
+    def count(self) -> None:
+        with self._lock:
+            self.requests += 1
+
+
+def answer_body(tokens: int) -> str:
+    """长度为 tokens 个模拟token的回答正文"""
+    chars = tokens * TOKEN_CHARS
+    repeated = ANSWER_TEXT * (chars // len(ANSWER_TEXT) + 1)
+    return repeated[:chars]
+
+
+def plan_json(task_count: int) -> str:
+    """与 crewAI PlannerTaskPydanticOutput 结构一致的规划结果"""
+    return json.dumps({'list_of_plans_per_task': [
+        {'task': f"Task Number {i + 1}", 'plan': f"\n步骤：依次完成第{i + 1}个任务。"}
+        for i in range(task_count)
+    ]}, ensure_ascii=False)
+
+
+def _prompt_text(messages: List[Dict[str, Any]]) -> str:
+    return "\n".join(str(m.get('content') or '') for m in messages)
+
+
+def build_reply(body: Dict[str, Any], config: StubConfig) -> Dict[str, Any]:
+    """根据请求内容生成回答：{'content': 文本} 或 {'tool': 名称, 'arguments': JSON}"""
+    prompt = _prompt_text(body.get('messages', []))
+    task_count = len(set(re.findall(r"Task Number (\d+)", prompt)))
+    tools = body.get('tools') or []
+    if tools:
+        return {'tool': tools[0]['function']['name'], 'arguments': plan_json(max(task_count, 1))}
+    if task_count:
+        return {'content': f"Thought: I now can give a great answer\nFinal Answer: {plan_json(task_count)}"}
+    return {'content': f"Thought: I now can give a great answer\nFinal Answer: {answer_body(config.response_tokens)}"}
+
+
+def _usage(prompt: str, completion: str) -> Dict[str, int]:
+    prompt_tokens = len(prompt) // TOKEN_CHARS + 1
+    completion_tokens = len(completion) // TOKEN_CHARS + 1
+    return {'prompt_tokens': prompt_tokens, 'completion_tokens': completion_tokens,
+            'total_tokens': prompt_tokens + completion_tokens}
+
+
+def make_handler(config: StubConfig):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_message(self, *args):
+            pass
+
+        def do_POST(self):
+            if not self.path.rstrip('/').endswith('/chat/completions'):
+                self._send_json(404, {'error': {'message': f"未知路径：{self.path}"}})
+                return
+            body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+            config.count()
+            reply = build_reply(body, config)
+            completion = reply.get('content') or reply['arguments']
+            usage = _usage(_prompt_text(body.get('messages', [])), completion)
+            model = body.get('model', 'deepseek-chat')
+            if body.get('stream') and 'content' in reply:
+                self._stream(reply['content'], usage, model)
+                return
+            # 非流式请求一次性返回，耗时等于逐token生成的总时长
+            time.sleep(config.first_token_latency
+                       + config.token_latency * (len(completion) // TOKEN_CHARS))
+            if 'tool' in reply:
+                message = {'role': 'assistant', 'content': None, 'tool_calls': [{
+                    'id': 'call_0', 'type': 'function',
+                    'function': {'name': reply['tool'], 'arguments': reply['arguments']},
+                }]}
+                finish_reason = 'tool_calls'
+            else:
+                message = {'role': 'assistant', 'content': reply['content']}
+                finish_reason = 'stop'
+            self._send_json(200, {
+                'id': 'chatcmpl-stub', 'object': 'chat.completion', 'created': int(time.time()),
+                'model': model, 'usage': usage,
+                'choices': [{'index': 0, 'message': message, 'finish_reason': finish_reason}],
+            })
+
+        def _send_json(self, status: int, payload: Dict[str, Any]):
+            data = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _stream(self, text: str, usage: Dict[str, int], model: str):
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/event-stream')
+            self.send_header('Connection', 'close')
+            self.end_headers()
+            self.close_connection = True
+            time.sleep(config.first_token_latency)
+            for i in range(0, len(text), TOKEN_CHARS):
+                self._chunk({'content': text[i:i + TOKEN_CHARS]}, None, model)
+                time.sleep(config.token_latency)
+            self._chunk({}, 'stop', model, usage)
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.wfile.flush()
+
+        def _chunk(self, delta: Dict[str, Any], finish_reason, model: str, usage=None):
+            chunk = {'id': 'chatcmpl-stub', 'object': 'chat.completion.chunk', 'created': int(time.time()),
+                     'model': model, 'choices': [{'index': 0, 'delta': delta, 'finish_reason': finish_reason}]}
+            if usage:
+                chunk['usage'] = usage
+            self.wfile.write(b"data: " + json.dumps(chunk, ensure_ascii=False).encode('utf-8') + b"\n\n")
+            self.wfile.flush()
+
+    return Handler
+
+
+def create_server(host: str = '127.0.0.1', port: int = 0,
+                  config: StubConfig = None) -> ThreadingHTTPServer:
+    """创建模拟服务（调用方负责 serve_forever / shutdown）"""
+    server = ThreadingHTTPServer((host, port), make_handler(config or StubConfig()))
+    server.daemon_threads = True
+    return server
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="DeepSeek 兼容的本地模拟服务")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=18080)
+    parser.add_argument('--first-token-latency', type=float, default=0.0, help="首个token前的延迟（秒）")
+    parser.add_argument('--token-latency', type=float, default=0.0, help="每个token的生成延迟（秒）")
+    parser.add_argument('--response-tokens', type=int, default=100, help="每次回答的token数")
+    args = parser.parse_args(argv)
+
+    config = StubConfig(args.first_token_latency, args.token_latency, args.response_tokens)
+    server = create_server(args.host, args.port, config)
+    print(f"listening on {server.server_address[1]}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(f"served {config.requests} requests", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
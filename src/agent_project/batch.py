@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+JSONL 批量分析
+
+从输入 JSONL 逐行读取出生信息（字段与 HTTP 服务的 /analyze 相同，另加可选的 id），
+由固定数量的工作协程并行执行分析，每完成一条立即追加写入输出 JSONL：
+    {"id": "...", "status": "ok", "output": "最终报告", "elapsed": 秒数}
+    {"id": "...", "status": "error", "error": "错误信息"}
+
+读取与执行之间只有有界队列，内存占用与输入规模无关。
+中断后用相同参数重新运行即可续跑：输出文件中已成功的 id 会被跳过，失败的记录重新执行。
+
+用法：
+    batch births.jsonl results.jsonl --workers 8 --local-bazi
+    batch births.jsonl results.jsonl --workers 8 --processes   # 使用多进程执行
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, Optional, Set, Tuple, Union
+
+from agent_project.crew import CLI_FLAGS, options_from_argv
+from agent_project.crew_pool import shared_pool
+from agent_project.server import inputs_from_payload
+
+# 工作协程数的默认值
+DEFAULT_WORKERS = 4
+
+
+def completed_ids(path: Union[str, Path]) -> Set[str]:
+    """读取输出文件中已成功完成的记录 id（忽略崩溃时写了一半的行）"""
+    done: Set[str] = set()
+    path = Path(path)
+    if not path.exists():
+        return done
+    with path.open(encoding='utf-8') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if isinstance(record, dict) and record.get('status') == 'ok' and record.get('id') is not None:
+                done.add(str(record['id']))
+    return done
+
+
+def read_records(path: Union[str, Path]) -> Iterator[Tuple[str, Any]]:
+    """逐行读取输入记录，返回 (id, 记录)；缺少 id 的记录以行号作为 id"""
+    with Path(path).open(encoding='utf-8') as f:
+        for lineno, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                yield f"line-{lineno}", None
+                continue
+            record_id = record.get('id') if isinstance(record, dict) else None
+            yield str(record_id if record_id is not None else f"line-{lineno}"), record
+
+
+def analyze_record(inputs: Dict[str, Any], options: Dict[str, Any]) -> str:
+    """执行一条分析（在工作线程或子进程中运行，复用本进程的团队实例池）"""
+    return shared_pool(verbose=False, **options).kickoff(inputs).raw
+
+
+class BatchRunner:
+    """JSONL 批量分析执行器"""
+
+    def __init__(self, workers: int = DEFAULT_WORKERS, processes: bool = False,
+                 options: Optional[Dict[str, Any]] = None,
+                 analyze: Callable[[Dict[str, Any], Dict[str, Any]], str] = analyze_record):
+        if workers < 1:
+            raise ValueError("工作数至少为1")
+        self.workers = workers
+        self.processes = processes
+        self.options = {k: v for k, v in (options or {}).items() if v is not None}
+        # 多进程模式下 analyze 必须是可以pickle的模块级函数
+        self.analyze = analyze
+        self.stats = {'ok': 0, 'error': 0, 'skipped': 0}
+
+    def _executor(self) -> Executor:
+        if self.processes:
+            return ProcessPoolExecutor(max_workers=self.workers)
+        if self.analyze is analyze_record:
+            shared_pool(verbose=False, **self.options).warm(self.workers)
+        return ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='bazi-batch')
+
+    async def run(self, input_path: Union[str, Path], output_path: Union[str, Path]) -> Dict[str, int]:
+        done = completed_ids(output_path)
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.workers * 2)
+        loop = asyncio.get_running_loop()
+
+        with self._executor() as executor, self._open_output(output_path) as out:
+            def write(result: Dict[str, Any]):
+                out.write(json.dumps(result, ensure_ascii=False) + "\n")
+                out.flush()
+                self.stats[result['status']] += 1
+
+            async def worker():
+                while True:
+                    item = await queue.get()
+                    if item is None:
+                        return
+                    record_id, record = item
+                    started = time.perf_counter()
+                    try:
+                        inputs = inputs_from_payload(record)
+                        output = await loop.run_in_executor(executor, self.analyze, inputs, self.options)
+                    except Exception as e:
+                        write({'id': record_id, 'status': 'error', 'error': str(e)})
+                    else:
+                        write({'id': record_id, 'status': 'ok', 'output': output,
+                               'elapsed': round(time.perf_counter() - started, 3)})
+
+            tasks = [asyncio.create_task(worker()) for _ in range(self.workers)]
+            for record_id, record in read_records(input_path):
+                if record_id in done:
+                    self.stats['skipped'] += 1
+                    continue
+                await queue.put((record_id, record))
+            for _ in tasks:
+                await queue.put(None)
+            await asyncio.gather(*tasks)
+
+        return self.stats
+
+    @staticmethod
+    def _open_output(path: Union[str, Path]):
+        """以追加方式打开输出文件；上次崩溃留下的半行先补上换行"""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        if path.exists() and path.stat().st_size:
+            with path.open('rb') as f:
+                f.seek(-1, os.SEEK_END)
+                incomplete = f.read(1) != b"\n"
+            if incomplete:
+                with path.open('a', encoding='utf-8') as f:
+                    f.write("\n")
+        return path.open('a', encoding='utf-8')
+
+
+def run_batch():
+    """批量分析命令行入口"""
+    parser = argparse.ArgumentParser(description="JSONL 批量八字分析")
+    parser.add_argument('input', help="输入 JSONL，每行一条出生信息")
+    parser.add_argument('output', help="输出 JSONL，每完成一条追加一行")
+    parser.add_argument('--workers', type=int, default=int(os.getenv('BAZI_BATCH_WORKERS', DEFAULT_WORKERS)),
+                        help="并行执行的分析数")
+    parser.add_argument('--processes', action='store_true', help="使用多进程代替线程执行分析")
+    for flag in CLI_FLAGS:
+        parser.add_argument(flag, action='store_true')
+    args = parser.parse_args()
+
+    runner = BatchRunner(args.workers, args.processes, options_from_argv(sys.argv))
+    started = time.perf_counter()
+    stats = asyncio.run(runner.run(args.input, args.output))
+    print(f"批量分析完成：成功 {stats['ok']}，失败 {stats['error']}，跳过 {stats['skipped']}，"
+          f"耗时 {time.perf_counter() - started:.1f} 秒")
+
+
+if __name__ == "__main__":
+    run_batch()
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+任务输出检查点
+
+带运行ID的 kickoff 在开始时保存输入，每个任务完成时立即保存其完整输出（SQLite，cache_dir()/checkpoints.sqlite3）。
+运行中途失败（如模型调用超时）后以同一运行ID续跑：已完成的任务直接使用保存的输出，
+从第一个未完成的任务开始执行，已付费的模型输出不会丢失。
+输出连同任务配置哈希一起保存，YAML 配置修改后对应的检查点不再使用。
+"""
+
+import json
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+from agent_project.result_cache import cache_dir
+
+_default_checkpoint_store: Optional["CheckpointStore"] = None
+
+
+def new_run_id() -> str:
+    """生成运行ID：时间戳加随机后缀，如 20250601143000-3f9a1c"""
+    return f"{datetime.now():%Y%m%d%H%M%S}-{uuid.uuid4().hex[:6]}"
+
+
+def default_checkpoint_store() -> "CheckpointStore":
+    """进程内共享的检查点存储"""
+    global _default_checkpoint_store
+    if _default_checkpoint_store is None:
+        _default_checkpoint_store = CheckpointStore()
+    return _default_checkpoint_store
+
+
+class CheckpointStore:
+    """按运行ID保存输入和各任务输出（线程安全）"""
+
+    def __init__(self, path: Union[str, Path, None] = None):
+        self.path = Path(path) if path else cache_dir() / "checkpoints.sqlite3"
+        self._lock = threading.Lock()
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS runs "
+            "(run_id TEXT PRIMARY KEY, inputs TEXT NOT NULL, created_at REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS task_outputs "
+            "(run_id TEXT NOT NULL, task TEXT NOT NULL, config_hash TEXT NOT NULL, "
+            "output TEXT NOT NULL, created_at REAL NOT NULL, PRIMARY KEY (run_id, task))"
+        )
+        self._conn.commit()
+
+    def start(self, run_id: str, inputs: Dict[str, Any]) -> None:
+        """记录运行的输入；续跑时保留第一次记录的输入"""
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR IGNORE INTO runs (run_id, inputs, created_at) VALUES (?, ?, ?)",
+                (run_id, json.dumps(inputs, ensure_ascii=False, default=str), time.time()),
+            )
+            self._conn.commit()
+
+    def inputs(self, run_id: str) -> Optional[Dict[str, Any]]:
+        """运行的输入，没有该运行时返回 None"""
+        with self._lock:
+            row = self._conn.execute("SELECT inputs FROM runs WHERE run_id = ?", (run_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def save(self, run_id: str, task: str, config_hash: str, output: str) -> None:
+        """保存任务的完整输出"""
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO task_outputs (run_id, task, config_hash, output, created_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (run_id, task, config_hash, output, time.time()),
+            )
+            self._conn.commit()
+
+    def outputs(self, run_id: str) -> Dict[str, Tuple[str, str]]:
+        """运行中已完成的任务：任务名 → (配置哈希, 输出)"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT task, config_hash, output FROM task_outputs WHERE run_id = ?", (run_id,)
+            ).fetchall()
+        return {task: (h, output) for task, h, output in rows}
+
+    def runs(self, limit: int = 20) -> List[Tuple[str, int]]:
+        """最近的运行及各自已完成的任务数，新的在前"""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT r.run_id, COUNT(o.task) FROM runs r LEFT JOIN task_outputs o ON o.run_id = r.run_id "
+                "GROUP BY r.run_id ORDER BY r.created_at DESC LIMIT ?", (limit,)
+            ).fetchall()
+
+    def delete(self, run_id: str) -> None:
+        """删除运行及其检查点"""
+        with self._lock:
+            self._conn.execute("DELETE FROM task_outputs WHERE run_id = ?", (run_id,))
+            self._conn.execute("DELETE FROM runs WHERE run_id = ?", (run_id,))
+            self._conn.commit()
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
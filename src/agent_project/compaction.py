@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+上下文压缩
+
+下游任务默认不再接收上游任务的完整报告，而是接收本地提取的结构化摘要：
+命盘与五行评分、喜用/忌讳五行、关键结论。摘要在本地生成，不额外调用LLM。
+同时提供按任务统计压缩前后输入token数的度量工具。
+"""
+
+import re
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from agent_project.tools.bazi_chart import BaziChart
+from agent_project.tools.wuxing_engine import ELEMENTS, day_master_strength, score_chart
+
+# 各任务摘要的标题
+TASK_LABELS = {
+    'calculate_bazi_task': '八字排盘',
+    'analyze_wuxing_task': '五行分析',
+    'interpret_personality_task': '性格解读',
+    'predict_fortune_task': '运势预测',
+    'provide_life_guidance_task': '人生指导',
+}
+
+# 单个摘要的字符上限；原文本身短于该长度时不做压缩
+DIGEST_MAX_CHARS = 500
+
+# 每个摘要最多保留的结论条数及每条的长度
+MAX_FINDINGS = 6
+FINDING_WIDTH = 80
+
+_ELEMENT_RUN = r'([木火土金水](?:[、，,和与及/\s]*[木火土金水])*)'
+_FAVORABLE = re.compile(r'(?:喜用神|用神|喜神|喜用)[^。\n木火土金水]{0,6}' + _ELEMENT_RUN)
+_UNFAVORABLE = re.compile(r'(?:忌神|仇神|忌)[^。\n木火土金水]{0,6}' + _ELEMENT_RUN)
+
+# 与 crewAI 拼接上下文时使用的分隔符一致
+CONTEXT_DIVIDER = "\n\n----------\n\n"
+
+# 结论性语句的关键词
+_KEYWORDS = re.compile(r'结论|总结|总体|建议|宜|忌|喜用|特点|优势|不足|偏旺|偏弱|身强|身弱|注意|吉|凶')
+
+_MARKDOWN_PREFIX = re.compile(r'^(?:[#>*\-•\s]+|\d+[.、)）]\s*)+')
+_SENTENCE_END = re.compile(r'(?<=[。！？；])')
+
+
+def _elements_in(pattern: re.Pattern, text: str) -> List[str]:
+    """提取模式匹配到的五行（保持出现顺序，去重）"""
+    found: List[str] = []
+    for match in pattern.finditer(text):
+        for char in match.group(1):
+            if char in ELEMENTS and char not in found:
+                found.append(char)
+    return found
+
+
+def extract_elements(text: str) -> Tuple[List[str], List[str]]:
+    """从分析文本中提取喜用五行和忌讳五行"""
+    favorable = _elements_in(_FAVORABLE, text)
+    unfavorable = [e for e in _elements_in(_UNFAVORABLE, text) if e not in favorable]
+    return favorable, unfavorable
+
+
+def key_findings(text: str, limit: int = MAX_FINDINGS, width: int = FINDING_WIDTH) -> List[str]:
+    """
+    提取关键结论
+
+    优先选取含结论性关键词的行，每行只保留第一句；没有这类行时按顺序取正文首句。
+    """
+    lines = []
+    for line in text.splitlines():
+        line = _MARKDOWN_PREFIX.sub('', line).replace('**', '').strip()
+        if len(line) >= 6 and not set(line) <= set('=-*_ '):
+            lines.append(line)
+
+    preferred = [line for line in lines if _KEYWORDS.search(line)] or lines
+    findings: List[str] = []
+    for line in preferred:
+        sentence = _SENTENCE_END.split(line, maxsplit=1)[0][:width]
+        if sentence not in findings:
+            findings.append(sentence)
+        if len(findings) >= limit:
+            break
+    return findings
+
+
+def chart_summary(chart: BaziChart) -> str:
+    """命盘与五行评分的一行摘要"""
+    scores = score_chart(chart)
+    strength = day_master_strength(chart, scores)
+    day_element = ELEMENTS[chart.indices[4] // 2]
+    score_text = ' '.join(f"{e}{s:.2f}" for e, s in zip(ELEMENTS, scores))
+    return (f"命盘：{chart}（日主{chart.day_master}{day_element}）\n"
+            f"五行评分：{score_text}；日主同党占比{strength * 100:.1f}%"
+            f"（{'偏强' if strength > 0.5 else '偏弱'}）")
+
+
+def digest(task_name: str, raw: str, chart: Optional[BaziChart] = None,
+           max_chars: int = DIGEST_MAX_CHARS) -> str:
+    """
+    生成任务输出的结构化摘要
+
+    排盘任务的摘要包含命盘和五行评分（chart 缺省时从原文解析），
+    其余任务的摘要包含喜用/忌讳五行和关键结论。
+    """
+    if len(raw) <= max_chars:
+        return raw
+
+    lines = [f"【{TASK_LABELS.get(task_name, task_name)}摘要】"]
+    if task_name == 'calculate_bazi_task':
+        chart = chart or BaziChart.parse(raw)
+        if chart is not None:
+            lines.append(chart_summary(chart))
+
+    favorable, unfavorable = extract_elements(raw)
+    if favorable or unfavorable:
+        lines.append(f"喜用：{'、'.join(favorable) or '未明确'}；忌：{'、'.join(unfavorable) or '未明确'}")
+
+    findings = key_findings(raw)
+    if findings:
+        lines.append("要点：")
+        for finding in findings:
+            if sum(len(line) + 1 for line in lines) + len(finding) + 2 > max_chars:
+                break
+            lines.append(f"- {finding}")
+    return "\n".join(lines)
+
+
+def count_tokens(text: str, model: str) -> int:
+    """按模型分词器估算token数"""
+    import litellm
+
+    return litellm.token_counter(model=model, text=text)
+
+
+def measure_context_tokens(tasks: Sequence, raw_outputs: Dict[str, str], model: str) -> List[Dict]:
+    """
+    统计每个任务压缩前后的输入token数
+
+    raw_outputs 为任务名到原始输出文本的映射；压缩后的上下文由 digest 重新生成，
+    因此在完整上下文模式下同样可以评估压缩效果。
+    输入按任务描述、期望输出和上下文计算，不含智能体的系统提示。
+    """
+    rows = []
+    for task in tasks:
+        prompt = f"{task.description}\n{task.expected_output}\n"
+        context = [c.name for c in (task.context if isinstance(task.context, list) else [])
+                   if c.name in raw_outputs]
+        full = CONTEXT_DIVIDER.join(raw_outputs[name] for name in context)
+        compact = CONTEXT_DIVIDER.join(digest(name, raw_outputs[name]) for name in context)
+        rows.append({
+            'task': task.name,
+            'before': count_tokens(prompt + full, model),
+            'after': count_tokens(prompt + compact, model),
+        })
+    return rows
+
+
+def format_token_report(rows: List[Dict]) -> str:
+    """渲染token统计表"""
+    lines = ["上下文压缩token统计：", f"{'任务':<28}{'压缩前':>8}{'压缩后':>8}{'节省':>8}"]
+    for row in rows:
+        saved = 1 - row['after'] / row['before'] if row['before'] else 0.0
+        lines.append(f"{row['task']:<30}{row['before']:>10}{row['after']:>10}{saved * 100:>9.1f}%")
+    before = sum(row['before'] for row in rows)
+    after = sum(row['after'] for row in rows)
+    if before:
+        lines.append(f"{'合计':<28}{before:>10}{after:>10}{(1 - after / before) * 100:>9.1f}%")
+    return "\n".join(lines)
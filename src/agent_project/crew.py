@@ -1,11 +1,161 @@
 from crewai import Agent, Crew, Process, Task, LLM
-from crewai.project import CrewBase, agent, crew, task
+from crewai.project import CrewBase, agent, crew, task, after_kickoff, before_kickoff
+from crewai.crews.crew_output import CrewOutput
+from crewai.tasks.task_output import TaskOutput
 import os
+import re
+from functools import partial
+from typing import Any, Dict, List, Optional, Tuple, Union
 from dotenv import load_dotenv
 
+from agent_project.checkpoints import CheckpointStore, default_checkpoint_store
+from agent_project.compaction import digest, format_token_report, measure_context_tokens
+from agent_project.http_pool import shared_http_handler
+from agent_project.instrumentation import instrumentation, write_trace
+from agent_project.plan_cache import PlanCachingCrew, default_plan_cache, plan_cache_key
+from agent_project.result_cache import (
+    PersonalDetails, ResultCache, anonymize, cache_dir, chart_cache_key, config_hash, personal_details, personalize,
+)
+from agent_project.scheduler import schedule_concurrently
+from agent_project.tools.bazi_chart import BaziChart
+from agent_project.tools.chart_index import BaziCheck, check_provided_bazi
+from agent_project.tools.custom_tool import BaziCalculatorTool, render_bazi_report, render_wuxing_report
+from agent_project.tools.luck_engine import luck_cycle, render_luck_report
+from agent_project.tools.lunar_calendar import LunarDate, lunar_to_solar, parse_lunar_date
+from agent_project.tools.relations import render_relations_report
+from agent_project.tools.solar_time import place_longitude
+from agent_project.tools.time_context import fortune_years, parse_reference_date, time_context
+
 # 加载环境变量
 load_dotenv()
 
+# 只依赖命盘和性别、可按命盘缓存输出的任务
+CHART_CACHEABLE_TASKS = ('analyze_wuxing_task', 'interpret_personality_task')
+
+# 增量模式下另按出生信息缓存的任务（输出含出生时间、地点，不随参照日期变化）
+BIRTH_CACHEABLE_TASKS = ('calculate_bazi_task',)
+
+# kickoff 输入中的运行ID，带运行ID的运行逐任务保存检查点，可用同一ID续跑
+RUN_ID_KEY = 'run_id'
+
+_default_chart_cache: Optional[ResultCache] = None
+
+
+LUNAR_CALENDAR_NAMES = ('农历', '阴历', 'lunar')
+
+
+def lunar_birth_date(inputs: Dict[str, Any]) -> Optional[LunarDate]:
+    """
+    输入中的农历出生日期，公历输入返回 None
+
+    两种写法：birth_calendar 为"农历"时 birth_year/birth_month/birth_day 按农历理解
+    （birth_leap_month 为真表示闰月）；或 birth_date 以"农历"开头，如：农历2003年正月十三。
+    """
+    if str(inputs.get('birth_calendar') or '').strip().lower() in LUNAR_CALENDAR_NAMES:
+        if all(inputs.get(k) not in (None, "") for k in ('birth_year', 'birth_month', 'birth_day')):
+            return LunarDate(int(inputs['birth_year']), int(inputs['birth_month']), int(inputs['birth_day']),
+                             bool(inputs.get('birth_leap_month')))
+        text = str(inputs.get('birth_date') or '')
+    else:
+        text = str(inputs.get('birth_date') or '').strip()
+        if not text.startswith(LUNAR_CALENDAR_NAMES[:2]):
+            return None
+    lunar = parse_lunar_date(text)
+    if lunar is None:
+        raise ValueError(f"无法识别农历出生日期：{text}")
+    return lunar
+
+
+def parse_birth_inputs(inputs: Dict[str, Any]) -> Tuple[int, int, int, int, int]:
+    """
+    从 kickoff 输入中取出 (年, 月, 日, 时, 分)，日期为公历
+
+    优先使用 birth_year 等数值字段，否则解析 birth_date（如：2003年2月13日）
+    和 birth_time（如：23时55分）文本；农历日期（见 lunar_birth_date）先换算为公历。
+    """
+    lunar = lunar_birth_date(inputs)
+    if lunar is not None:
+        solar = lunar_to_solar(*lunar)
+        year, month, day = solar.year, solar.month, solar.day
+        if inputs.get('birth_hour') not in (None, ""):
+            return year, month, day, int(inputs['birth_hour']), int(inputs.get('birth_minute') or 0)
+        time_match = re.search(r'(\d{1,2})时(?:(\d{1,2})分)?', str(inputs.get('birth_time', '')))
+        if not time_match:
+            raise ValueError("本地排盘需要完整的出生日期和时间")
+        return year, month, day, int(time_match.group(1)), int(time_match.group(2) or 0)
+
+    if all(inputs.get(k) not in (None, "") for k in ('birth_year', 'birth_month', 'birth_day', 'birth_hour')):
+        return (int(inputs['birth_year']), int(inputs['birth_month']), int(inputs['birth_day']),
+                int(inputs['birth_hour']), int(inputs.get('birth_minute') or 0))
+
+    date_match = re.search(r'(\d{4})年(\d{1,2})月(\d{1,2})日', str(inputs.get('birth_date', '')))
+    time_match = re.search(r'(\d{1,2})时(?:(\d{1,2})分)?', str(inputs.get('birth_time', '')))
+    if not date_match or not time_match:
+        raise ValueError("本地排盘需要完整的出生日期和时间")
+    year, month, day = (int(x) for x in date_match.groups())
+    return year, month, day, int(time_match.group(1)), int(time_match.group(2) or 0)
+
+
+def _env_flag(name: str) -> bool:
+    """读取布尔型环境变量"""
+    return os.getenv(name, "").lower() in ("1", "true", "yes")
+
+
+def default_chart_cache() -> ResultCache:
+    """进程内共享的命盘结果缓存"""
+    global _default_chart_cache
+    if _default_chart_cache is None:
+        _default_chart_cache = ResultCache()
+    return _default_chart_cache
+
+
+def build_deepseek_llm(stream: bool = False) -> LLM:
+    """创建 DeepSeek 模型实例（共用 shared_http_handler 的连接池）；stream 为 True 时逐token返回并在事件总线上发出流式事件"""
+    return LLM(
+        model="deepseek/deepseek-chat",
+        api_key=os.getenv("DEEP_SEEK_KEY"),
+        base_url=os.getenv("DEEP_SEEK_URL"),
+        temperature=0.7,
+        max_tokens=4000,
+        stream=stream,
+        client=shared_http_handler(),
+    )
+
+
+# 命令行开关与 AgentProject 构造参数的对应关系
+CLI_FLAGS = {
+    '--local-bazi': 'local_bazi',
+    '--concurrent': 'concurrent_tasks',
+    '--chart-cache': 'chart_cache',
+    '--full-context': 'full_context',
+    '--measure-tokens': 'measure_tokens',
+    '--plan-cache': 'plan_cache',
+    '--trace': 'trace',
+    '--incremental': 'incremental',
+}
+
+
+def options_from_argv(argv) -> Dict[str, Optional[bool]]:
+    """由命令行开关生成 AgentProject 构造参数，未给出的开关沿用环境变量默认值"""
+    return {option: True if flag in argv else None for flag, option in CLI_FLAGS.items()}
+
+
+REFERENCE_DATE_FLAG = '--reference-date'
+
+
+def reference_date_from_argv(argv) -> Optional[str]:
+    """
+    命令行给出的参照日期：--reference-date 2025-06-15 或 --reference-date=2025-06-15
+
+    未给出时取环境变量 BAZI_REFERENCE_DATE，仍为空返回 None（默认当天）。
+    """
+    for i, arg in enumerate(argv):
+        if arg.startswith(REFERENCE_DATE_FLAG + '='):
+            return arg.split('=', 1)[1]
+        if arg == REFERENCE_DATE_FLAG and i + 1 < len(argv):
+            return argv[i + 1]
+    return os.getenv("BAZI_REFERENCE_DATE") or None
+
 
 # If you want to run a snippet of code before or after the crew starts,
 # you can use the @before_kickoff and @after_kickoff decorators
@@ -20,21 +170,82 @@ class AgentProject():
     agents_config = 'config/agents.yaml'
     tasks_config = 'config/tasks.yaml'
 
+    def __init__(self, local_bazi: Optional[bool] = None, concurrent_tasks: Optional[bool] = None,
+                 chart_cache: Union[bool, ResultCache, None] = None, full_context: Optional[bool] = None,
+                 measure_tokens: Optional[bool] = None, stream: bool = False,
+                 verbose: Optional[bool] = None, plan_cache: Union[bool, ResultCache, None] = None,
+                 trace: Optional[bool] = None, checkpoints: Optional[CheckpointStore] = None,
+                 incremental: Optional[bool] = None):
+        # 本地排盘模式：八字由 BaziCalculatorTool 在本地计算，跳过 calculate_bazi 的LLM调用
+        if local_bazi is None:
+            local_bazi = _env_flag("BAZI_LOCAL_CHART")
+        # 并发模式：按任务依赖图调度，互不依赖的任务同时执行
+        if concurrent_tasks is None:
+            concurrent_tasks = _env_flag("BAZI_CONCURRENT_TASKS")
+        # 增量模式：只重新执行与参照日期有关的运势预测和人生指导，排盘、五行分析、性格解读复用已缓存的输出；
+        # 未单独指定时同时开启命盘缓存和规划缓存
+        if incremental is None:
+            incremental = _env_flag("BAZI_INCREMENTAL")
+        if incremental:
+            chart_cache = True if chart_cache is None else chart_cache
+            plan_cache = True if plan_cache is None else plan_cache
+        self.incremental = incremental
+        # 命盘缓存：只依赖命盘的任务命中缓存时跳过LLM调用
+        if chart_cache is None:
+            chart_cache = _env_flag("BAZI_CHART_CACHE")
+        if chart_cache is True:
+            chart_cache = default_chart_cache()
+        # 规划缓存：任务规划按配置和输入形态缓存，命中时跳过规划模型调用
+        if plan_cache is None:
+            plan_cache = _env_flag("BAZI_PLAN_CACHE")
+        if plan_cache is True:
+            plan_cache = default_plan_cache()
+        # 完整上下文模式：下游任务接收上游的完整报告，而不是压缩后的摘要
+        if full_context is None:
+            full_context = _env_flag("BAZI_FULL_CONTEXT")
+        # token度量模式：运行结束后输出每个任务压缩前后的输入token数
+        if measure_tokens is None:
+            measure_tokens = _env_flag("BAZI_MEASURE_TOKENS")
+        # 流式模式：每个实例使用独立的流式模型，事件总线上的token可按实例区分；
+        # 过程输出交给 StreamingCallback，默认关闭 crewAI 自带的详细日志
+        if stream:
+            self.deepseek_llm = build_deepseek_llm(stream=True)
+        self.stream = stream
+        self.verbose = (not stream) if verbose is None else verbose
+        # 运行统计：记录各任务耗时和token，运行结束后写出 JSON 跟踪和 Prometheus 指标
+        if trace is None:
+            trace = _env_flag("BAZI_TRACE")
+        if trace:
+            instrumentation()
+        self.trace = trace
+        # 检查点：带运行ID（inputs['run_id']）的运行逐任务保存输出，默认存入 default_checkpoint_store()
+        self.checkpoints = checkpoints
+        self.run_id: Optional[str] = None
+        self.last_trace: Optional[Dict[str, Any]] = None
+        self.bazi_check: Optional[BaziCheck] = None
+        self.local_bazi = local_bazi
+        self.concurrent_tasks = concurrent_tasks
+        self.chart_cache = chart_cache or None
+        self.plan_cache = plan_cache or None
+        self.full_context = full_context
+        self.measure_tokens = measure_tokens
+        self.token_report: List[Dict[str, Any]] = []
+        self._all_tasks: List[Task] = []
+        self._scheduled_tasks: List[Task] = []
+        self._raw_outputs: Dict[str, str] = {}
+        self._cache_keys: Dict[str, str] = {}
+        self._requester_name = ''
+        self._requester_details: Optional[PersonalDetails] = None
+
     # 使用DeepSeek API（修复配置）
-    deepseek_llm = LLM(
-        model="deepseek/deepseek-chat",
-        api_key=os.getenv("DEEP_SEEK_KEY"),
-        base_url=os.getenv("DEEP_SEEK_URL"),
-        temperature=0.7,
-        max_tokens=4000
-    )
+    deepseek_llm = build_deepseek_llm()
 
     # 八字分析智能体定义（移除工具调用，直接使用专业知识）
     @agent
     def bazi_calculator_agent(self) -> Agent:
         return Agent(
             config=self.agents_config['bazi_calculator'],
-            verbose=True,
+            verbose=self.verbose,
             llm=self.deepseek_llm
         )
 
@@ -42,7 +253,7 @@ class AgentProject():
     def wuxing_analyzer_agent(self) -> Agent:
         return Agent(
             config=self.agents_config['wuxing_analyzer'],
-            verbose=True,
+            verbose=self.verbose,
             llm=self.deepseek_llm
         )
 
@@ -50,7 +261,7 @@ class AgentProject():
     def personality_interpreter_agent(self) -> Agent:
         return Agent(
             config=self.agents_config['personality_interpreter'],
-            verbose=True,
+            verbose=self.verbose,
             llm=self.deepseek_llm
         )
 
@@ -58,7 +269,7 @@ class AgentProject():
     def fortune_predictor_agent(self) -> Agent:
         return Agent(
             config=self.agents_config['fortune_predictor'],
-            verbose=True,
+            verbose=self.verbose,
             llm=self.deepseek_llm
         )
 
@@ -66,7 +277,7 @@ class AgentProject():
     def life_advisor_agent(self) -> Agent:
         return Agent(
             config=self.agents_config['life_advisor'],
-            verbose=True,
+            verbose=self.verbose,
             llm=self.deepseek_llm
         )
 
@@ -96,10 +307,14 @@ class AgentProject():
 
     @task
     def predict_fortune_task(self) -> Task:
+        context = [self.calculate_bazi_task(), self.analyze_wuxing_task()]
+        # 并发模式下运势预测只依赖排盘和五行分析，与性格解读同时进行
+        if not self.concurrent_tasks:
+            context.append(self.interpret_personality_task())
         return Task(
             config=self.tasks_config['predict_fortune'],
             agent=self.fortune_predictor_agent(),
-            context=[self.calculate_bazi_task(), self.analyze_wuxing_task(), self.interpret_personality_task()]
+            context=context
         )
 
     @task
@@ -111,29 +326,326 @@ class AgentProject():
                     self.interpret_personality_task(), self.predict_fortune_task()]
         )
 
+    def _inject_output(self, task: Task, raw: str, source: str) -> None:
+        """为不需要执行的任务直接填入输出，下游任务通过 context 读取；source 记录输出来源"""
+        self._crew.skipped_tasks[task.name] = source
+        self._store_output(task, TaskOutput(
+            description=task.description,
+            name=task.name,
+            expected_output=task.expected_output,
+            raw=raw,
+            agent=task.agent.role,
+        ))
+
+    def _store_output(self, task: Task, output: TaskOutput) -> None:
+        """
+        记录任务的完整输出，并把下游读取的 task.output 换成摘要
+
+        crewAI 的最终结果使用任务执行时返回的输出对象，不受这里替换的影响。
+        """
+        self._raw_outputs[task.name] = output.raw
+        if self.full_context:
+            task.output = output
+        else:
+            task.output = output.model_copy(update={'raw': digest(task.name, output.raw)})
+
+    def _task_completed(self, task: Task, output: TaskOutput) -> None:
+        """任务完成回调：保存检查点、写入命盘缓存（姓名、出生信息无法可靠替换为占位符时不写入）并压缩输出"""
+        if self.run_id is not None:
+            self._checkpoint_store().save(self.run_id, task.name, self._task_config_hash(task), output.raw)
+        key = self._cache_keys.get(task.name)
+        if key is not None:
+            anonymized = anonymize(output.raw, self._requester_name, self._requester_details)
+            if anonymized is not None:
+                self.chart_cache.put(key, anonymized)
+        self._store_output(task, output)
+
+    def _local_chart(self, inputs: Dict[str, Any]) -> BaziChart:
+        """根据输入本地计算命盘（优先使用用户提供的八字）"""
+        birth_year, birth_month, birth_day, birth_hour, birth_minute = parse_birth_inputs(inputs)
+        return BaziCalculatorTool().calculate(birth_year, birth_month, birth_day, birth_hour,
+                                              birth_minute, inputs.get('provided_bazi') or None,
+                                              str(inputs.get('birth_place') or ''))
+
+    def _task_config_hash(self, task: Task) -> str:
+        """任务配置与执行该任务的智能体配置的哈希，修改YAML后缓存自动失效"""
+        agent = task.agent
+        # 智能体配置取插值前的原文，复用的实例在上一次运行后已填入参照日期等输入
+        return config_hash(self.tasks_config.get(task.name[:-len('_task')]),
+                           agent._original_role or agent.role, agent._original_goal or agent.goal,
+                           agent._original_backstory or agent.backstory)
+
+    def _checkpoint_store(self) -> CheckpointStore:
+        if self.checkpoints is None:
+            self.checkpoints = default_checkpoint_store()
+        return self.checkpoints
+
+    def _checkpointed_outputs(self, run_id: str) -> Dict[str, str]:
+        """运行中已完成且任务配置未变的任务输出：任务名 → 完整输出"""
+        hashes = {t.name: self._task_config_hash(t) for t in self._all_tasks}
+        return {name: output for name, (h, output) in self._checkpoint_store().outputs(run_id).items()
+                if hashes.get(name) == h}
+
+    @before_kickoff
+    def convert_lunar_birth(self, inputs: Dict[str, Any]) -> Dict[str, Any]:
+        """农历出生日期在本地换算为公历，任务描述中的出生日期改为"公历（农历）"，无需模型换算"""
+        try:
+            lunar = lunar_birth_date(inputs)
+            solar = lunar_to_solar(*lunar) if lunar is not None else None
+        except ValueError:
+            # 无效的农历日期留给后续环节报告
+            return inputs
+        if solar is None:
+            return inputs
+        inputs = {k: v for k, v in inputs.items() if k not in ('birth_calendar', 'birth_leap_month')}
+        inputs['birth_date'] = f"{solar.year}年{solar.month}月{solar.day}日（农历{lunar}）"
+        if inputs.get('birth_year') not in (None, ""):
+            inputs.update(birth_year=solar.year, birth_month=solar.month, birth_day=solar.day)
+        return inputs
+
+    @before_kickoff
+    def prepare_reference_date(self, inputs: Dict[str, Any]) -> Dict[str, Any]:
+        """参照日期（reference_date，默认当天）在本地换算为时间背景，填入运势预测和人生指导的任务描述"""
+        reference = parse_reference_date(inputs.get('reference_date'))
+        return dict(inputs, **time_context(reference))
+
+    @before_kickoff
+    def prepare_local_bazi(self, inputs: Dict[str, Any]) -> Dict[str, Any]:
+        """本地排盘模式下，直接计算八字和五行评分作为 calculate_bazi 的输出"""
+        self._crew.skipped_tasks = {}
+        if not self.local_bazi:
+            return inputs
+
+        birth_year, birth_month, birth_day, birth_hour, birth_minute = parse_birth_inputs(inputs)
+        chart = self._local_chart(inputs)
+        report = render_bazi_report(chart, inputs.get('name', ''), birth_year, birth_month, birth_day,
+                                    birth_hour, birth_minute, inputs.get('gender', ''),
+                                    inputs.get('birth_place', ''))
+        report += "\n" + render_wuxing_report(chart)
+        self._inject_output(self.calculate_bazi_task(), report, 'local')
+        return inputs
+
+    @before_kickoff
+    def prepare_chart_facts(self, inputs: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        本地推算十神、刑冲合害和大运流年
+
+        分别作为 {chart_relations}（性格解读、运势预测）和 {luck_pillars}（运势预测）填入任务描述，
+        流年自参照日期所在年起。
+        """
+        try:
+            birth = parse_birth_inputs(inputs)
+            chart = self._local_chart(inputs)
+        except ValueError:
+            return dict(inputs,
+                        chart_relations="（出生信息不完整，未能本地推算，请根据排盘结果分析十神与刑冲合害）",
+                        luck_pillars="（出生信息不完整，未能本地推算，请根据排盘结果推算大运流年）")
+        try:
+            cycle = luck_cycle(chart, str(inputs.get('gender') or ''), *birth)
+        except ValueError:
+            # 性别不明时无法确定顺逆，只给出流年
+            cycle = None
+        return dict(inputs, chart_relations=render_relations_report(chart),
+                    luck_pillars=render_luck_report(
+                        chart, cycle, fortune_years(parse_reference_date(inputs.get('reference_date')))))
+
+    @before_kickoff
+    def check_provided_bazi(self, inputs: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        用命盘反查索引核对用户提供的八字
+
+        结果填入排盘任务的 {bazi_check}；不一致时同时记录在 self.bazi_check，调用方可在模型调用前提示用户。
+        """
+        self.bazi_check = None
+        provided = str(inputs.get('provided_bazi') or '').strip()
+        if not provided:
+            return dict(inputs, bazi_check="（未提供八字，无需核对）")
+        try:
+            birth = parse_birth_inputs(inputs)
+        except ValueError:
+            return dict(inputs, bazi_check="（出生信息不完整，未能核对用户提供的八字）")
+        self.bazi_check = check_provided_bazi(provided, *birth,
+                                              longitude=place_longitude(str(inputs.get('birth_place') or '')),
+                                              index_dir=cache_dir())
+        return dict(inputs, bazi_check=self.bazi_check.note)
+
+    @before_kickoff
+    def apply_chart_cache(self, inputs: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        命盘缓存命中的任务直接使用缓存输出，未命中的任务完成后写入缓存
+
+        增量模式下排盘任务也参与缓存，以命盘加出生时间、地点和用户提供的八字为键。
+        """
+        if self.chart_cache is None:
+            return inputs
+
+        try:
+            chart = str(self._local_chart(inputs))
+            birth_time = parse_birth_inputs(inputs)
+            birth = '|'.join(str(x) for x in (chart, birth_time, inputs.get('birth_place') or '',
+                                              inputs.get('provided_bazi') or ''))
+            lunar = lunar_birth_date(inputs)
+        except ValueError:
+            # 出生信息不完整时无法确定命盘，不使用缓存
+            return inputs
+
+        name = str(inputs.get('name') or '')
+        gender = str(inputs.get('gender') or '')
+        model = self.deepseek_llm.model
+        self._requester_name = name
+        self._requester_details = personal_details(
+            birth_time, str(inputs.get('birth_place') or ''),
+            str(inputs.get('birth_date') or (lunar if lunar is not None else '')), str(inputs.get('birth_time') or ''))
+        self._cache_keys = {}
+        skipped = []
+        cacheable = {name: chart for name in CHART_CACHEABLE_TASKS}
+        if self.incremental:
+            cacheable.update({name: birth for name in BIRTH_CACHEABLE_TASKS})
+        for task in self._scheduled_tasks:
+            if task.name not in cacheable:
+                continue
+            key = chart_cache_key(cacheable[task.name], gender, task.name, self._task_config_hash(task), model)
+            cached = self.chart_cache.get(key)
+            if cached is not None:
+                self._inject_output(task, personalize(cached, name, self._requester_details), 'chart')
+                skipped.append(task)
+            else:
+                self._cache_keys[task.name] = key
+
+        tasks = [t for t in self._scheduled_tasks if t not in skipped]
+        if self.concurrent_tasks:
+            tasks = schedule_concurrently(tasks)
+        self._crew.tasks = tasks
+        return inputs
+
+    @before_kickoff
+    def apply_checkpoints(self, inputs: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        带运行ID的运行：记录输入，检查点中已有输出的任务直接使用保存的输出
+
+        运行ID不作为任务输入。检查点中全部任务都已完成时仍执行最后一个任务，以便 crewAI 生成团队结果
+        （resume 在这种情况下直接返回保存的输出）。
+        """
+        run_id = str(inputs.get(RUN_ID_KEY) or '').strip()
+        self.run_id = run_id or None
+        if not run_id:
+            return inputs
+
+        inputs = {k: v for k, v in inputs.items() if k != RUN_ID_KEY}
+        self._checkpoint_store().start(run_id, inputs)
+        done = self._checkpointed_outputs(run_id)
+        tasks = [t for t in self._crew.tasks if t.name not in done] or self._crew.tasks[-1:]
+        if len(tasks) == len(self._crew.tasks):
+            return inputs
+
+        for task in self._crew.tasks:
+            if task not in tasks:
+                self._inject_output(task, done[task.name], 'checkpoint')
+                self._cache_keys.pop(task.name, None)
+        if self.concurrent_tasks:
+            tasks = schedule_concurrently(tasks)
+        self._crew.tasks = tasks
+        return inputs
+
+    @before_kickoff
+    def apply_plan_cache(self, inputs: Dict[str, Any]) -> Dict[str, Any]:
+        """按配置、参与执行的任务、输入形态和参照月份确定规划缓存键，并记录用于填入规划占位符的本次输入"""
+        if self.plan_cache is not None:
+            self._crew.plan_cache_key = plan_cache_key(
+                self.agents_config, self.tasks_config, [t.name for t in self._crew.tasks],
+                inputs, self.deepseek_llm.model, str(inputs.get('reference_time') or ''),
+            )
+            self._crew.plan_inputs = dict(inputs)
+        return inputs
+
+    @after_kickoff
+    def report_context_tokens(self, result):
+        """token度量模式下输出每个任务压缩前后的输入token数"""
+        if self.measure_tokens:
+            self.token_report = measure_context_tokens(self._crew.tasks, self._raw_outputs,
+                                                       self.deepseek_llm.model)
+            print(format_token_report(self.token_report))
+        return result
+
+    @after_kickoff
+    def export_trace(self, result):
+        """运行统计模式下写出本次运行的 JSON 跟踪（BAZI_TRACE_DIR）和累计指标（BAZI_METRICS_FILE）"""
+        if self.trace:
+            self.last_trace = instrumentation().last_run(self._crew)
+            if self.last_trace is not None:
+                path = write_trace(self.last_trace, os.getenv("BAZI_TRACE_DIR"))
+                print(f"运行跟踪已写入：{path}")
+            if os.getenv("BAZI_METRICS_FILE"):
+                instrumentation().write_prometheus(os.getenv("BAZI_METRICS_FILE"))
+        return result
+
+    def reset(self) -> None:
+        """清除上一次运行留下的任务输出和运行状态，使同一实例可以再次 kickoff"""
+        for t in self._all_tasks:
+            t.output = None
+        if self.concurrent_tasks:
+            schedule_concurrently(self._scheduled_tasks)
+        if self._scheduled_tasks:
+            self._crew.tasks = list(self._scheduled_tasks)
+        self._raw_outputs = {}
+        self._cache_keys = {}
+        self.token_report = []
+        self.run_id = None
+
+    def resume(self, run_id: str):
+        """
+        续跑中断的运行：已完成的任务使用检查点中的输出，从第一个未完成的任务开始执行
+
+        全部任务都已完成时直接返回最后一个任务的输出，不调用模型。
+        """
+        inputs = self._checkpoint_store().inputs(run_id)
+        if inputs is None:
+            raise ValueError(f"未找到运行记录：{run_id}")
+        crew = self.crew()
+        final = self._checkpointed_outputs(run_id).get(self._scheduled_tasks[-1].name)
+        if final is not None:
+            return CrewOutput(raw=final)
+        return crew.kickoff(inputs={**inputs, RUN_ID_KEY: run_id})
+
     @crew
     def crew(self) -> Crew:
         """创建八字分析智能体团队"""
         # To learn how to add knowledge sources to your crew, check out the documentation:
         # https://docs.crewai.com/concepts/knowledge#what-is-knowledge
-        return Crew(
-            agents=[
-                self.bazi_calculator_agent(),
-                self.wuxing_analyzer_agent(),
-                self.personality_interpreter_agent(),
-                self.fortune_predictor_agent(),
-                self.life_advisor_agent(),
-            ], # 八字分析智能体列表
-            tasks=[
-                self.calculate_bazi_task(),
-                self.analyze_wuxing_task(),
-                self.interpret_personality_task(),
-                self.predict_fortune_task(),
-                self.provide_life_guidance_task(),
-            ], # 八字分析任务列表
+        agents = [
+            self.bazi_calculator_agent(),
+            self.wuxing_analyzer_agent(),
+            self.personality_interpreter_agent(),
+            self.fortune_predictor_agent(),
+            self.life_advisor_agent(),
+        ] # 八字分析智能体列表
+        tasks = [
+            self.calculate_bazi_task(),
+            self.analyze_wuxing_task(),
+            self.interpret_personality_task(),
+            self.predict_fortune_task(),
+            self.provide_life_guidance_task(),
+        ] # 八字分析任务列表
+        for t in tasks:
+            t.callback = partial(self._task_completed, t)
+        self._all_tasks = list(tasks)
+
+        # 本地排盘模式下排盘任务不进入执行序列，其输出在 kickoff 前由 prepare_local_bazi 填入
+        if self.local_bazi:
+            agents.remove(self.bazi_calculator_agent())
+            tasks.remove(self.calculate_bazi_task())
+
+        if self.concurrent_tasks:
+            tasks = schedule_concurrently(tasks)
+        self._scheduled_tasks = list(tasks)
+
+        self._crew = PlanCachingCrew(
+            agents=agents,
+            tasks=tasks,
             process=Process.sequential,
             planning=True,
             planning_llm=self.deepseek_llm,
-            verbose=True,
-
+            verbose=self.verbose,
+            plan_cache=self.plan_cache,
         )
+        return self._crew
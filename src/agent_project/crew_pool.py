@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+预热的团队实例池
+
+构建 AgentProject 需要解析 agents.yaml / tasks.yaml 并创建五个智能体和五个任务。
+服务和批量模式通过实例池复用已构建好的团队：每次运行结束后清除运行状态放回池中，
+下一个请求直接取用，单次请求的准备开销接近于零。
+所有实例的模型调用共用一个 keep-alive HTTP 连接池（见 http_pool）。
+同时到达的相同请求合并为一次执行（见 single_flight）。
+"""
+
+import queue
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Tuple
+
+from agent_project.crew import AgentProject
+from agent_project.single_flight import SingleFlight, flight_key
+
+_pools: Dict[Tuple, "CrewPool"] = {}
+_pools_lock = threading.Lock()
+
+
+def release_memoized(project: AgentProject) -> None:
+    """
+    删除 crewAI 为该实例记下的智能体、任务和团队
+
+    @agent / @task / @crew 的 memoize 缓存在模块级，以实例为键，不删除时被丢弃的实例永远不会释放。
+    """
+    for cls in type(project).__mro__:
+        for member in vars(cls).values():
+            code = getattr(member, '__code__', None)
+            if code is None or 'cache' not in code.co_freevars or not member.__closure__:
+                continue
+            cache = member.__closure__[code.co_freevars.index('cache')].cell_contents
+            if not isinstance(cache, dict):
+                continue
+            for key in list(cache):
+                args = key[0] if isinstance(key, tuple) and key and isinstance(key[0], tuple) else ()
+                if args and args[0] is project:
+                    cache.pop(key, None)
+
+
+class CrewPool:
+    """
+    AgentProject 实例池（线程安全）
+
+    池中没有空闲实例时按需新建，因此取用不会阻塞；并发上限由调用方控制（例如 HTTP 服务的准入控制）。
+    归还时最多保留 max_idle 个空闲实例，多出的实例删除 crewAI 的记录后丢弃，由垃圾回收释放。
+    """
+
+    def __init__(self, max_idle: int = 16, **options: Any):
+        self.options = options
+        self.max_idle = max_idle
+        self._idle: "queue.LifoQueue[AgentProject]" = queue.LifoQueue()
+        self.flights = SingleFlight()
+
+    def _build(self) -> AgentProject:
+        project = AgentProject(**self.options)
+        project.crew()
+        return project
+
+    def warm(self, count: int) -> None:
+        """预先构建 count 个空闲实例"""
+        while self._idle.qsize() < min(count, self.max_idle):
+            self._idle.put(self._build())
+
+    @property
+    def idle(self) -> int:
+        return self._idle.qsize()
+
+    @contextmanager
+    def acquire(self) -> Iterator[AgentProject]:
+        """取出一个团队实例，用完后清除运行状态并归还"""
+        try:
+            project = self._idle.get_nowait()
+        except queue.Empty:
+            project = self._build()
+        try:
+            yield project
+        finally:
+            project.reset()
+            if self._idle.qsize() < self.max_idle:
+                self._idle.put(project)
+            else:
+                release_memoized(project)
+
+    def kickoff(self, inputs: Dict[str, Any]):
+        """使用池中的实例执行一次分析；与正在执行的相同请求共享其结果"""
+        def run():
+            with self.acquire() as project:
+                return project.crew().kickoff(inputs=inputs)
+
+        return self.flights.do(flight_key(inputs), run)
+
+
+def shared_pool(**options: Any) -> CrewPool:
+    """按团队参数共享的进程级实例池"""
+    key = tuple(sorted(options.items()))
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = _pools[key] = CrewPool(**options)
+        return pool
@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+模型调用共用的 keep-alive HTTP 连接池
+
+crewAI 通过 litellm 调用 DeepSeek 接口，litellm 的 deepseek 接口走 base_llm_http_handler，
+只使用调用时传入的 client（否则取它自己按参数缓存、会过期重建的客户端），不读取 litellm.client_session。
+因此由 build_deepseek_llm 把同一个 HTTPHandler 作为 client 传给每个模型实例，
+进程内所有团队的模型调用复用同一组连接。
+"""
+
+import os
+import threading
+from typing import Optional
+
+# 共享连接池的默认大小（环境变量 BAZI_HTTP_MAX_CONNECTIONS 可调整）
+DEFAULT_MAX_CONNECTIONS = 32
+
+# 空闲连接保持时间（秒）
+KEEPALIVE_EXPIRY = 60.0
+
+_lock = threading.Lock()
+_handler = None
+
+
+def shared_http_handler(max_connections: Optional[int] = None):
+    """进程内共享的 litellm HTTPHandler（第一次调用时创建，之后的 max_connections 不再生效）"""
+    global _handler
+    with _lock:
+        if _handler is None:
+            import httpx
+            import litellm
+            from litellm.llms.custom_httpx.http_handler import HTTPHandler
+
+            max_connections = max_connections or int(
+                os.getenv("BAZI_HTTP_MAX_CONNECTIONS", DEFAULT_MAX_CONNECTIONS))
+            client = httpx.Client(
+                limits=httpx.Limits(max_connections=max_connections,
+                                    max_keepalive_connections=max_connections,
+                                    keepalive_expiry=KEEPALIVE_EXPIRY),
+                timeout=httpx.Timeout(600.0, connect=10.0),
+                verify=litellm.ssl_verify,
+            )
+            _handler = HTTPHandler(client=client)
+        return _handler
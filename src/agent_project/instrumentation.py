@@ -0,0 +1,347 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+运行耗时与token统计
+
+监听 crewAI 事件总线，为每次运行记录各任务/智能体的：
+- 执行耗时（任务开始到完成）
+- 排队耗时（依赖的上游任务全部完成到本任务开始）
+- LLM调用耗时与调用次数、失败次数
+- 输入/输出token数（取智能体token计数在任务前后的差值）
+- 重试次数、缓存命中（命盘缓存直接给出输出的任务，以及规划缓存）；本地排盘跳过的任务记为 skipped
+
+可导出为 Prometheus 文本格式（累计值），也可把单次运行写成 JSON 跟踪文件。
+"""
+
+import json
+import threading
+import time
+import uuid
+import weakref
+from collections import OrderedDict, deque
+from pathlib import Path
+from typing import Any, Deque, Dict, List, Optional, Tuple, Union
+
+from crewai.utilities.events import (
+    CrewKickoffCompletedEvent,
+    CrewKickoffFailedEvent,
+    CrewKickoffStartedEvent,
+    LLMCallCompletedEvent,
+    LLMCallFailedEvent,
+    LLMCallStartedEvent,
+    TaskCompletedEvent,
+    TaskFailedEvent,
+    TaskStartedEvent,
+)
+from crewai.utilities.events.base_event_listener import BaseEventListener
+
+from agent_project.result_cache import cache_dir
+
+# 内存中保留的最近运行记录数
+RECENT_RUNS = 100
+
+# 保留"最近一次运行"的团队数（实例池中的团队各占一项）
+LAST_RUNS = 256
+
+# 按 (任务, 智能体) 累计的指标：(指标名, 类型, 说明)
+_TASK_METRICS = (
+    ('task_seconds', 'summary', '任务执行耗时（秒）'),
+    ('task_queue_seconds', 'summary', '任务在依赖完成后等待开始的时间（秒）'),
+    ('llm_seconds', 'summary', '任务内LLM调用耗时（秒）'),
+    ('llm_calls_total', 'counter', '任务内LLM调用次数'),
+    ('llm_failures_total', 'counter', '任务内LLM调用失败次数'),
+    ('prompt_tokens_total', 'counter', '任务输入token数'),
+    ('completion_tokens_total', 'counter', '任务输出token数'),
+    ('task_retries_total', 'counter', '任务重试次数'),
+    ('task_failures_total', 'counter', '任务失败次数'),
+)
+
+
+def _role(agent: Any) -> str:
+    return str(getattr(agent, 'role', '') or '').strip()
+
+
+def _tokens(agent: Any) -> Tuple[int, int]:
+    process = getattr(agent, '_token_process', None)
+    if process is None:
+        return 0, 0
+    return process.prompt_tokens, process.completion_tokens
+
+
+def _label(value: Any) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class Instrumentation(BaseEventListener):
+    """运行统计监听器（进程内唯一，通过 instrumentation() 获取）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._runs: Dict[int, Dict[str, Any]] = {}
+        self._thread_runs: Dict[int, Dict[str, Any]] = {}
+        self._thread_spans: Dict[int, Dict[str, Any]] = {}
+        self._llm_started: Dict[int, float] = {}
+        # 各团队最近一次运行：id(crew) → (团队弱引用, 运行记录)，只保留最近 LAST_RUNS 个团队；
+        # 查询时核对弱引用，id 被新对象复用时不会返回旧记录
+        self._last_runs: "OrderedDict[int, Tuple[weakref.ref, Dict[str, Any]]]" = OrderedDict()
+        self.recent: Deque[Dict[str, Any]] = deque(maxlen=RECENT_RUNS)
+        self.task_totals: Dict[Tuple[str, str], Dict[str, float]] = {}
+        self.cache_hits: Dict[Tuple[str, str], int] = {}
+        self.run_totals: Dict[str, float] = {'ok': 0, 'failed': 0, 'seconds': 0.0,
+                                             'planning_seconds': 0.0, 'planning_calls': 0}
+        super().__init__()
+
+    # ---- 事件处理 ----
+
+    def setup_listeners(self, crewai_event_bus):
+        @crewai_event_bus.on(CrewKickoffStartedEvent)
+        def on_kickoff_started(source, event):
+            self._start_run(source)
+
+        @crewai_event_bus.on(CrewKickoffCompletedEvent)
+        def on_kickoff_completed(source, event):
+            self._finish_run(source, 'ok')
+
+        @crewai_event_bus.on(CrewKickoffFailedEvent)
+        def on_kickoff_failed(source, event):
+            self._finish_run(source, 'failed', event.error)
+
+        @crewai_event_bus.on(TaskStartedEvent)
+        def on_task_started(source, event):
+            self._start_span(event.task)
+
+        @crewai_event_bus.on(TaskCompletedEvent)
+        def on_task_completed(source, event):
+            self._finish_span(event.task, 'ok')
+
+        @crewai_event_bus.on(TaskFailedEvent)
+        def on_task_failed(source, event):
+            self._finish_span(event.task, 'failed', event.error)
+
+        @crewai_event_bus.on(LLMCallStartedEvent)
+        def on_llm_started(source, event):
+            self._llm_started[threading.get_ident()] = time.perf_counter()
+
+        @crewai_event_bus.on(LLMCallCompletedEvent)
+        def on_llm_completed(source, event):
+            self._finish_llm_call(failed=False)
+
+        @crewai_event_bus.on(LLMCallFailedEvent)
+        def on_llm_failed(source, event):
+            self._finish_llm_call(failed=True)
+
+    def _start_run(self, crew):
+        run = {
+            'run_id': uuid.uuid4().hex,
+            'started_at': time.time(),
+            'status': 'running',
+            'seconds': 0.0,
+            'planning': {'seconds': 0.0, 'calls': 0, 'cache_hit': None},
+            'tasks': [],
+            '_t0': time.perf_counter(),
+            '_finished': {},
+        }
+        with self._lock:
+            self._runs[id(crew)] = run
+            self._thread_runs[threading.get_ident()] = run
+
+    def _start_span(self, task):
+        crew = getattr(task.agent, 'crew', None)
+        with self._lock:
+            run = self._runs.get(id(crew))
+        if run is None:
+            return
+        now = time.perf_counter()
+        context = task.context if isinstance(task.context, list) else []
+        ready = max([run['_finished'][c.name] for c in context if c.name in run['_finished']],
+                    default=run['_t0'])
+        span = {
+            'task': task.name,
+            'agent': _role(task.agent),
+            'status': 'running',
+            'start_offset': round(now - run['_t0'], 4),
+            'queue_seconds': round(max(now - ready, 0.0), 4),
+            'seconds': 0.0,
+            'llm_seconds': 0.0,
+            'llm_calls': 0,
+            'llm_failures': 0,
+            'prompt_tokens': 0,
+            'completion_tokens': 0,
+            'retries': 0,
+            '_t0': now,
+            '_tokens': _tokens(task.agent),
+            '_run': run,
+        }
+        with self._lock:
+            run['tasks'].append(span)
+            self._thread_spans[threading.get_ident()] = span
+
+    def _finish_span(self, task, status: str, error: Optional[str] = None):
+        with self._lock:
+            span = self._thread_spans.pop(threading.get_ident(), None)
+        if span is None or span['task'] != task.name:
+            return
+        now = time.perf_counter()
+        prompt_tokens, completion_tokens = _tokens(task.agent)
+        span.update({
+            'status': status,
+            'seconds': round(now - span['_t0'], 4),
+            'llm_seconds': round(span['llm_seconds'], 4),
+            'prompt_tokens': prompt_tokens - span['_tokens'][0],
+            'completion_tokens': completion_tokens - span['_tokens'][1],
+            'retries': getattr(task, 'retry_count', 0),
+        })
+        if error:
+            span['error'] = error
+        span['_run']['_finished'][task.name] = now
+
+    def _finish_llm_call(self, failed: bool):
+        tid = threading.get_ident()
+        started = self._llm_started.pop(tid, None)
+        if started is None:
+            return
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            span = self._thread_spans.get(tid)
+            run = self._thread_runs.get(tid)
+        if span is not None:
+            span['llm_seconds'] += elapsed
+            span['llm_calls'] += 1
+            span['llm_failures'] += int(failed)
+        elif run is not None:
+            # 运行线程中不属于任何任务的调用来自 planning
+            run['planning']['seconds'] = round(run['planning']['seconds'] + elapsed, 4)
+            run['planning']['calls'] += 1
+
+    def _finish_run(self, crew, status: str, error: Optional[str] = None):
+        with self._lock:
+            run = self._runs.pop(id(crew), None)
+            for tid in [t for t, r in self._thread_runs.items() if r is run]:
+                del self._thread_runs[tid]
+        if run is None:
+            return
+        run['status'] = status
+        run['seconds'] = round(time.perf_counter() - run['_t0'], 4)
+        run['planning']['cache_hit'] = getattr(crew, 'plan_cache_hit', None)
+        if error:
+            run['error'] = error
+
+        # 本地排盘、命盘缓存直接给出输出的任务没有执行事件，在这里补记
+        for name, source in (getattr(crew, 'skipped_tasks', None) or {}).items():
+            run['tasks'].append({'task': name, 'status': 'skipped', 'source': source})
+        for span in run['tasks']:
+            for key in [k for k in span if k.startswith('_')]:
+                del span[key]
+        del run['_t0'], run['_finished']
+
+        self._aggregate(run)
+        with self._lock:
+            self.recent.append(run)
+            self._last_runs[id(crew)] = (weakref.ref(crew), run)
+            self._last_runs.move_to_end(id(crew))
+            while len(self._last_runs) > LAST_RUNS:
+                self._last_runs.popitem(last=False)
+
+    def _aggregate(self, run: Dict[str, Any]):
+        with self._lock:
+            self.run_totals['ok' if run['status'] == 'ok' else 'failed'] += 1
+            self.run_totals['seconds'] += run['seconds']
+            self.run_totals['planning_seconds'] += run['planning']['seconds']
+            self.run_totals['planning_calls'] += run['planning']['calls']
+            if run['planning']['cache_hit']:
+                key = ('planning', 'plan')
+                self.cache_hits[key] = self.cache_hits.get(key, 0) + 1
+
+            for span in run['tasks']:
+                if span['status'] == 'skipped':
+                    if span['source'] != 'local':
+                        key = (span['task'], span['source'])
+                        self.cache_hits[key] = self.cache_hits.get(key, 0) + 1
+                    continue
+                totals = self.task_totals.setdefault((span['task'], span['agent']), {
+                    'count': 0, 'task_seconds': 0.0, 'task_queue_seconds': 0.0, 'llm_seconds': 0.0,
+                    'llm_calls_total': 0, 'llm_failures_total': 0, 'prompt_tokens_total': 0,
+                    'completion_tokens_total': 0, 'task_retries_total': 0, 'task_failures_total': 0,
+                })
+                totals['count'] += 1
+                totals['task_seconds'] += span['seconds']
+                totals['task_queue_seconds'] += span['queue_seconds']
+                totals['llm_seconds'] += span['llm_seconds']
+                totals['llm_calls_total'] += span['llm_calls']
+                totals['llm_failures_total'] += span['llm_failures']
+                totals['prompt_tokens_total'] += span['prompt_tokens']
+                totals['completion_tokens_total'] += span['completion_tokens']
+                totals['task_retries_total'] += span['retries']
+                totals['task_failures_total'] += int(span['status'] != 'ok')
+
+    # ---- 导出 ----
+
+    def last_run(self, crew) -> Optional[Dict[str, Any]]:
+        """crew 最近一次运行的跟踪记录"""
+        with self._lock:
+            ref, run = self._last_runs.get(id(crew), (None, None))
+            return run if ref is not None and ref() is crew else None
+
+    def prometheus_text(self) -> str:
+        """累计指标的 Prometheus 文本格式"""
+        lines: List[str] = []
+        with self._lock:
+            task_totals = {k: dict(v) for k, v in self.task_totals.items()}
+            cache_hits = dict(self.cache_hits)
+            run_totals = dict(self.run_totals)
+
+        lines += ['# HELP bazi_runs_total 完成的运行次数', '# TYPE bazi_runs_total counter']
+        for status in ('ok', 'failed'):
+            lines.append(f'bazi_runs_total{{status="{status}"}} {run_totals[status]:g}')
+        lines += ['# HELP bazi_run_seconds 整次运行耗时（秒）', '# TYPE bazi_run_seconds summary',
+                  f'bazi_run_seconds_sum {run_totals["seconds"]:.4f}',
+                  f'bazi_run_seconds_count {run_totals["ok"] + run_totals["failed"]:g}']
+        lines += ['# HELP bazi_planning_seconds 规划调用耗时（秒）', '# TYPE bazi_planning_seconds summary',
+                  f'bazi_planning_seconds_sum {run_totals["planning_seconds"]:.4f}',
+                  f'bazi_planning_seconds_count {run_totals["planning_calls"]:g}']
+
+        for name, kind, help_text in _TASK_METRICS:
+            lines += [f'# HELP bazi_{name} {help_text}', f'# TYPE bazi_{name} {kind}']
+            for (task, agent), totals in sorted(task_totals.items()):
+                labels = f'task="{_label(task)}",agent="{_label(agent)}"'
+                if kind == 'summary':
+                    lines.append(f'bazi_{name}_sum{{{labels}}} {totals[name]:.4f}')
+                    lines.append(f'bazi_{name}_count{{{labels}}} {totals["count"]:g}')
+                else:
+                    lines.append(f'bazi_{name}{{{labels}}} {totals[name]:g}')
+
+        lines += ['# HELP bazi_cache_hits_total 缓存命中而跳过的执行次数', '# TYPE bazi_cache_hits_total counter']
+        for (task, cache), count in sorted(cache_hits.items()):
+            lines.append(f'bazi_cache_hits_total{{task="{_label(task)}",cache="{_label(cache)}"}} {count}')
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path: Union[str, Path]) -> Path:
+        """把累计指标写入文本文件（可配合 node_exporter 的 textfile 采集）"""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(path.suffix + '.tmp')
+        tmp.write_text(self.prometheus_text(), encoding='utf-8')
+        tmp.replace(path)
+        return path
+
+
+def write_trace(run: Dict[str, Any], directory: Union[str, Path, None] = None) -> Path:
+    """把单次运行的跟踪记录写成 JSON 文件，默认目录为 cache_dir()/traces"""
+    directory = Path(directory) if directory else cache_dir() / "traces"
+    directory.mkdir(parents=True, exist_ok=True)
+    path = directory / f"{run['run_id']}.json"
+    path.write_text(json.dumps(run, ensure_ascii=False, indent=2), encoding='utf-8')
+    return path
+
+
+_instrumentation: Optional[Instrumentation] = None
+_instrumentation_lock = threading.Lock()
+
+
+def instrumentation() -> Instrumentation:
+    """进程内唯一的统计监听器（首次使用时注册到事件总线）"""
+    global _instrumentation
+    with _instrumentation_lock:
+        if _instrumentation is None:
+            _instrumentation = Instrumentation()
+        return _instrumentation
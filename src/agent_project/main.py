@@ -4,7 +4,12 @@ import warnings
 
 from datetime import datetime
 
-from agent_project.crew import AgentProject
+from agent_project.checkpoints import default_checkpoint_store, new_run_id
+from agent_project.crew import (
+    REFERENCE_DATE_FLAG, RUN_ID_KEY, AgentProject, options_from_argv, reference_date_from_argv,
+)
+from agent_project.tools.lunar_calendar import LunarDate, lunar_to_solar
+from agent_project.tools.time_context import parse_reference_date
 
 warnings.filterwarnings("ignore", category=SyntaxWarning, module="pysbd")
 
@@ -16,6 +21,19 @@ warnings.filterwarnings("ignore", category=SyntaxWarning, module="pysbd")
 def run():
     """
     运行八字分析智能体团队
+
+    命令行参数：
+    --local-bazi  本地计算八字，跳过排盘环节的LLM调用
+    --concurrent  按任务依赖图并发执行互不依赖的任务
+    --chart-cache 相同命盘复用五行分析与性格解读的结果
+    --full-context 下游任务接收上游的完整报告（默认接收压缩摘要）
+    --measure-tokens 运行结束后输出每个任务压缩前后的输入token数
+    --plan-cache  复用已缓存的任务规划，跳过每次运行前的规划调用
+    --trace       记录各任务耗时与token数，运行结束后写出JSON跟踪文件
+    --incremental 只重新执行运势预测和人生指导，其余任务复用已缓存的输出
+    --reference-date 2025-06-15  运势预测的参照日期（默认当天，也可用 BAZI_REFERENCE_DATE 设置）
+
+    每个任务完成后保存检查点，运行中断时可用 resume <运行ID> 从第一个未完成的任务继续。
     """
     print("=== 八字分析智能体系统 ===")
     print("请输入您的出生信息进行八字分析：")
@@ -26,6 +44,7 @@ def run():
 
     # 获取出生日期
     try:
+        lunar = input("出生日期是公历还是农历？（公历/农历，默认公历）：").strip() == "农历"
         birth_year = int(input("请输入出生年份（如：1990）："))
         birth_month = int(input("请输入出生月份（如：5）："))
         birth_day = int(input("请输入出生日期（如：15）："))
@@ -43,6 +62,17 @@ def run():
         if gender not in ['男', '女']:
             raise ValueError("性别请输入'男'或'女'")
 
+        # 农历日期在本地换算为公历
+        birth_note = ""
+        if lunar:
+            leap = input("是否闰月？(y/n，默认n)：").lower().strip() in ['y', 'yes', '是']
+            lunar_date = LunarDate(birth_year, birth_month, birth_day, leap)
+            solar = lunar_to_solar(*lunar_date)
+            birth_year, birth_month, birth_day = solar.year, solar.month, solar.day
+            birth_note = f"（农历{lunar_date}）"
+
+        reference = parse_reference_date(reference_date_from_argv(sys.argv))
+
     except ValueError as e:
         print(f"输入错误：{e}")
         return
@@ -51,21 +81,27 @@ def run():
     inputs = {
         'name': name,
         'gender': gender,
-        'birth_date': f"{birth_year}年{birth_month}月{birth_day}日",
+        'birth_date': f"{birth_year}年{birth_month}月{birth_day}日{birth_note}",
         'birth_time': f"{birth_hour}时",
-        'birth_place': "未指定"  # 可选字段
+        'birth_place': "未指定",  # 可选字段
+        'provided_bazi': "",
+        'reference_date': f"{reference:%Y-%m-%d}",
     }
 
     print(f"\n开始为 {name}（{gender}）进行八字分析...")
-    print(f"出生时间：{birth_year}年{birth_month}月{birth_day}日{birth_hour}时")
+    print(f"出生时间：{birth_year}年{birth_month}月{birth_day}日{birth_hour}时{birth_note}")
+    print(f"参照日期：{reference:%Y-%m-%d}")
+    run_id = inputs[RUN_ID_KEY] = new_run_id()
+    print(f"运行ID：{run_id}")
     print("=" * 50)
 
     try:
-        result = AgentProject().crew().kickoff(inputs=inputs)
+        result = AgentProject(**options_from_argv(sys.argv)).crew().kickoff(inputs=inputs)
         print("\n八字分析完成！")
         return result
     except Exception as e:
         print(f"分析过程中出现错误：{e}")
+        print(f"已完成的任务已保存，可运行 resume {run_id} 继续")
         raise Exception(f"An error occurred while running the crew: {e}")
 
 
@@ -92,6 +128,27 @@ def replay():
     except Exception as e:
         raise Exception(f"An error occurred while replaying the crew: {e}")
 
+def resume():
+    """
+    续跑中断的运行：resume <运行ID> [命令行开关]
+
+    已完成的任务使用检查点中保存的输出，从第一个未完成的任务开始执行；不带运行ID时列出最近的运行。
+    """
+    run_ids = [arg for i, arg in enumerate(sys.argv[1:], 1)
+               if not arg.startswith('--') and sys.argv[i - 1] != REFERENCE_DATE_FLAG]
+    if not run_ids:
+        print("最近的运行（运行ID，已完成任务数）：")
+        for run_id, done in default_checkpoint_store().runs():
+            print(f"  {run_id}  {done}")
+        return
+
+    try:
+        result = AgentProject(**options_from_argv(sys.argv)).resume(run_ids[0])
+        print("\n八字分析完成！")
+        return result
+    except Exception as e:
+        raise Exception(f"An error occurred while resuming the crew: {e}")
+
 def test():
     """
     Test the crew execution and returns the results.
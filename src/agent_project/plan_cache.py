@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+规划结果缓存
+
+crewAI 开启 planning 后每次 kickoff 都会先调用一次规划模型，为每个任务生成执行步骤。
+开启缓存时规划按未插值的任务模板生成（描述中保留 {birth_date}、{chart_relations} 等占位符），
+不含任何求测者的出生信息和命盘；应用时再把规划中的占位符替换为本次输入。
+这样规划只取决于智能体/任务配置、参与执行的任务、输入字段的形态和参照月份（智能体目标中含预测时段），
+以这些内容的哈希为键缓存，命中时跳过规划调用。YAML 配置修改后哈希随之变化，旧的规划自动失效。
+"""
+
+import json
+from typing import Any, Dict, List, Optional
+
+from crewai import Crew
+from crewai.utilities.planning_handler import CrewPlanner
+from pydantic import Field
+
+from agent_project.result_cache import ResultCache, cache_dir, config_hash
+
+# 规划的生成方式变化时递增，旧格式（按插值后的描述生成、含求测者信息）的缓存随之失效
+PLAN_FORMAT_VERSION = 2
+
+_default_plan_cache: Optional[ResultCache] = None
+
+
+def default_plan_cache() -> ResultCache:
+    """进程内共享的规划缓存（持久化在 cache_dir()/plans.sqlite3）"""
+    global _default_plan_cache
+    if _default_plan_cache is None:
+        _default_plan_cache = ResultCache(cache_dir() / "plans.sqlite3", max_entries=64, table="plans")
+    return _default_plan_cache
+
+
+def input_shape(inputs: Dict[str, Any]) -> List[List[Any]]:
+    """输入的形态：字段名及其是否有值（不含具体取值）"""
+    return [[key, inputs[key] not in (None, "")] for key in sorted(inputs)]
+
+
+def plan_cache_key(agents_config: Any, tasks_config: Any, task_names: List[str],
+                   inputs: Dict[str, Any], model: str, reference_time: str = '') -> str:
+    """规划缓存键；reference_time 为参照年月的时间背景，按月更新规划"""
+    return config_hash(PLAN_FORMAT_VERSION, agents_config, tasks_config, task_names, input_shape(inputs),
+                       model, reference_time)
+
+
+def fill_placeholders(text: str, inputs: Dict[str, Any]) -> str:
+    """把文本中的 {字段名} 替换为输入值，未知的花括号内容保持原样"""
+    for key, value in inputs.items():
+        text = text.replace('{' + key + '}', str(value))
+    return text
+
+
+class PlanCachingCrew(Crew):
+    """规划结果可缓存的 Crew：设置 plan_cache 和 plan_cache_key 后复用已缓存的规划"""
+
+    plan_cache: Optional[Any] = Field(default=None, exclude=True)
+    plan_cache_key: Optional[str] = Field(default=None, exclude=True)
+    # 本次运行的输入，用于填入规划中的占位符
+    plan_inputs: Dict[str, Any] = Field(default_factory=dict, exclude=True)
+    # 供运行统计使用：本次规划是否命中缓存，以及未执行而直接给出输出的任务及其来源
+    plan_cache_hit: Optional[bool] = Field(default=None, exclude=True)
+    skipped_tasks: Dict[str, str] = Field(default_factory=dict, exclude=True)
+
+    def _handle_crew_planning(self):
+        if self.plan_cache is None or self.plan_cache_key is None:
+            return super()._handle_crew_planning()
+
+        plans = None
+        cached = self.plan_cache.get(self.plan_cache_key)
+        if cached is not None:
+            plans = json.loads(cached)
+            if len(plans) != len(self.tasks):
+                plans = None
+
+        self.plan_cache_hit = plans is not None
+        if plans is None:
+            self._logger.log("info", "Planning the crew execution")
+            plans = self._plan_from_templates()
+            self.plan_cache.put(self.plan_cache_key, json.dumps(plans, ensure_ascii=False))
+        plans = [fill_placeholders(plan, self.plan_inputs) for plan in plans]
+
+        for task, plan in zip(self.tasks, plans):
+            task.description += plan
+
+    def _plan_from_templates(self) -> List[str]:
+        """以未插值的任务描述和期望输出调用规划模型，规划中不会出现本次求测者的信息"""
+        interpolated = [(t.description, t.expected_output) for t in self.tasks]
+        for t in self.tasks:
+            t.description = t._original_description or t.description
+            t.expected_output = t._original_expected_output or t.expected_output
+        try:
+            result = CrewPlanner(tasks=self.tasks, planning_agent_llm=self.planning_llm)._handle_crew_planning()
+        finally:
+            for t, (description, expected_output) in zip(self.tasks, interpolated):
+                t.description, t.expected_output = description, expected_output
+        return [step.plan for step in result.list_of_plans_per_task]
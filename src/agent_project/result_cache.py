@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+分析结果缓存
+
+内存 LRU + SQLite 持久化的键值缓存。五行分析、性格解读等只依赖命盘和性别的任务
+以"标准化命盘 + 性别 + 任务配置哈希 + 模型"为键缓存输出，命中时跳过对应的LLM调用。
+同一命盘的缓存由不同求测者共用，写入前把姓名和出生日期、时间、地点替换为占位符
+（性别属于缓存键，共用者的性别相同）。
+"""
+
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple, Union
+
+
+# 缓存内容中用于替换求测者姓名和出生信息的占位符，避免不同用户之间泄露个人信息
+NAME_PLACEHOLDER = '〔求测者〕'
+DATE_PLACEHOLDER = '〔出生日期〕'
+TIME_PLACEHOLDER = '〔出生时间〕'
+PLACE_PLACEHOLDER = '〔出生地点〕'
+
+# 姓名达到此长度时整体替换；更短的姓名（如"金""林木"）可能同时是五行、地名等普通用字，
+# 只替换已知位置上的姓名：字段标签或"求测者"之后、称谓之前
+FULL_REPLACE_NAME_LENGTH = 3
+NAME_PREFIX_PATTERN = r'(姓名[：:]\s*|求测者)'
+NAME_SUFFIX_PATTERN = r'(?=先生|女士|同学|小朋友)'
+
+
+class PersonalDetails(NamedTuple):
+    """
+    求测者的出生信息
+
+    forms：占位符 → 该信息在文本中的各种写法，第一项为命中缓存时填回的文本；
+    residue：替换后不应再出现的片段（正则），出现时说明文本以其他写法提到了出生信息。
+    """
+    forms: Dict[str, List[str]]
+    residue: List[str]
+
+
+def personal_details(birth: Tuple[int, int, int, int, int], place: str = '',
+                     date_text: str = '', time_text: str = '') -> PersonalDetails:
+    """
+    由出生时间 (年, 月, 日, 时, 分)、出生地点和输入中的日期、时间原文生成出生信息的常见写法
+
+    残留检查：出生年份（及原文中的其他年份，如农历年）、出生钟点、出生地点中的任意两字。
+    """
+    year, month, day, hour, minute = birth
+    dates = [date_text, f"{year}年{month}月{day}日", f"{year}年{month:02d}月{day:02d}日",
+             f"{year}-{month:02d}-{day:02d}", f"{year}-{month}-{day}", f"{year}/{month}/{day}",
+             f"{year}.{month}.{day}"]
+    times = [time_text, f"{hour}时{minute}分", f"{hour:02d}时{minute:02d}分", f"{hour}点{minute}分",
+             f"{hour:02d}:{minute:02d}", f"{hour}:{minute:02d}"]
+    forms = {DATE_PLACEHOLDER: dates, TIME_PLACEHOLDER: times, PLACE_PLACEHOLDER: [place]}
+    forms = {k: list(dict.fromkeys(f.strip() for f in v if f and f.strip())) for k, v in forms.items()}
+    forms = {k: v for k, v in forms.items() if v}
+
+    years = {str(year)} | set(re.findall(r'\d{4}', date_text or ''))
+    residue = [rf'(?<!\d){y}(?!\d)' for y in sorted(years)]
+    residue.append(rf'(?<!\d)0?{hour}\s*[时点:：]')
+    place = (place or '').strip()
+    residue += [re.escape(place[i:i + 2]) for i in range(len(place) - 1)]
+    return PersonalDetails(forms, residue)
+
+
+def anonymize(text: str, name: str, details: Optional[PersonalDetails] = None) -> Optional[str]:
+    """
+    把文本中的求测者姓名和出生信息替换为占位符
+
+    短姓名替换已知位置后文本中仍含该姓名、或出生信息替换后仍有残留（见 personal_details）时，
+    无法确认已去除个人信息，返回 None，调用方不应缓存。
+    """
+    if details is not None:
+        for placeholder, forms in details.forms.items():
+            for form in sorted(forms, key=len, reverse=True):
+                # 以数字开头或结尾的写法不能是更长数字的一部分（如 3:05 与 13:05）
+                pattern = ((r'(?<!\d)' if form[0].isdigit() else '') + re.escape(form)
+                           + (r'(?!\d)' if form[-1].isdigit() else ''))
+                text = re.sub(pattern, placeholder, text)
+        if any(re.search(pattern, text) for pattern in details.residue):
+            return None
+
+    name = (name or '').strip()
+    if not name:
+        return text
+    if len(name) >= FULL_REPLACE_NAME_LENGTH:
+        return text.replace(name, NAME_PLACEHOLDER)
+    escaped = re.escape(name)
+    text = re.sub(NAME_PREFIX_PATTERN + escaped, lambda m: m.group(1) + NAME_PLACEHOLDER, text)
+    text = re.sub(escaped + NAME_SUFFIX_PATTERN, NAME_PLACEHOLDER, text)
+    return None if name in text else text
+
+
+def personalize(text: str, name: str, details: Optional[PersonalDetails] = None) -> str:
+    """把缓存文本中的占位符换回当前求测者的姓名和出生信息"""
+    text = text.replace(NAME_PLACEHOLDER, name or '求测者')
+    for placeholder, forms in (details.forms.items() if details else ()):
+        text = text.replace(placeholder, forms[0])
+    return text
+
+
+def cache_dir() -> Path:
+    """本地持久化数据目录（环境变量 BAZI_CACHE_DIR，默认 .bazi_cache）"""
+    return Path(os.getenv("BAZI_CACHE_DIR", ".bazi_cache"))
+
+
+def config_hash(*configs: Any) -> str:
+    """任务/智能体配置的稳定哈希，配置变化后缓存自动失效"""
+    payload = json.dumps(configs, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:16]
+
+
+def chart_cache_key(chart: str, gender: str, task_name: str, task_config_hash: str, model: str) -> str:
+    """命盘结果缓存键"""
+    raw = '|'.join((chart, gender, task_name, task_config_hash, model))
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+class ResultCache:
+    """内存 LRU + SQLite 持久化缓存（线程安全）"""
+
+    def __init__(self, path: Union[str, Path, None] = None, max_entries: int = 1024,
+                 table: str = "results"):
+        self.path = Path(path) if path else cache_dir() / "chart_results.sqlite3"
+        self.max_entries = max_entries
+        self.table = table
+        self.hits = 0
+        self.misses = 0
+        self._memory: "OrderedDict[str, str]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {self.table} "
+            "(key TEXT PRIMARY KEY, value TEXT NOT NULL, created_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    def get(self, key: str) -> Optional[str]:
+        """查询缓存，先查内存再查磁盘"""
+        with self._lock:
+            value = self._memory.get(key)
+            if value is not None:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return value
+
+            row = self._conn.execute(
+                f"SELECT value FROM {self.table} WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self._remember(key, row[0])
+            self.hits += 1
+            return row[0]
+
+    def put(self, key: str, value: str) -> None:
+        """写入缓存（内存与磁盘）"""
+        with self._lock:
+            self._remember(key, value)
+            self._conn.execute(
+                f"INSERT OR REPLACE INTO {self.table} (key, value, created_at) VALUES (?, ?, ?)",
+                (key, value, time.time()),
+            )
+            self._conn.commit()
+
+    def delete(self, key: str) -> None:
+        """删除缓存项"""
+        with self._lock:
+            self._memory.pop(key, None)
+            self._conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+            self._conn.commit()
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def _remember(self, key: str, value: str) -> None:
+        self._memory[key] = value
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+任务依赖图调度
+
+根据任务声明的 context 构建依赖图，按拓扑层级重排任务，
+同一层级中互不依赖的任务标记为异步执行，由 crewAI 的顺序流程并发运行，
+并在下一层的同步任务处汇合。
+"""
+
+from typing import Dict, List
+
+from crewai import Task
+
+
+def task_levels(tasks: List[Task]) -> List[List[Task]]:
+    """
+    按依赖关系把任务分层
+
+    第 0 层为不依赖列表内其他任务的任务；不在列表内的上下文任务（例如本地预先填入输出的任务）视为已完成。
+    同一层内保持原有顺序。
+    """
+    index: Dict[int, int] = {id(t): i for i, t in enumerate(tasks)}
+    level: Dict[int, int] = {}
+
+    for task in tasks:
+        deps = [c for c in (task.context if isinstance(task.context, list) else []) if id(c) in index]
+        for dep in deps:
+            if id(dep) not in level:
+                raise ValueError(f"任务 {task.name} 依赖了排在其后的任务 {dep.name}")
+        level[id(task)] = 1 + max((level[id(d)] for d in deps), default=-1)
+
+    levels: List[List[Task]] = [[] for _ in range(max(level.values(), default=-1) + 1)]
+    for task in tasks:
+        levels[level[id(task)]].append(task)
+    return levels
+
+
+def schedule_concurrently(tasks: List[Task]) -> List[Task]:
+    """
+    返回按层级重排后的任务列表，并设置 async_execution
+
+    多任务层级中的任务全部异步执行，由下一层的第一个同步任务等待汇合。
+    crewAI 不允许异步任务直接依赖上一段连续的异步任务，因此若相邻两层都是多任务层，
+    后一层的第一个任务保持同步，作为汇合点；最后一个任务始终同步执行。
+    """
+    ordered: List[Task] = []
+    previous_async = False
+    levels = task_levels(tasks)
+    for n, group in enumerate(levels):
+        concurrent = len(group) > 1
+        for i, task in enumerate(group):
+            task.async_execution = concurrent and not (previous_async and i == 0)
+            # crewAI 要求任务序列最多以一个异步任务结尾
+            if n == len(levels) - 1 and i == len(group) - 1:
+                task.async_execution = False
+            ordered.append(task)
+        previous_async = ordered[-1].async_execution
+    return ordered
@@ -0,0 +1,366 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+八字分析 HTTP 服务
+
+基于 asyncio 的轻量HTTP服务，一个进程同时服务多个分析请求：
+- POST /analyze  提交出生信息（JSON），以 Server-Sent Events 流式返回分析过程和最终报告
+- GET  /health   返回当前执行中和排队中的请求数，以及被合并的相同请求数
+- GET  /metrics  各任务/智能体耗时、token和缓存命中的累计指标（Prometheus 文本格式）
+
+同时执行的分析数和排队长度都有上限，排队已满时直接返回 429，由客户端稍后重试。
+与正在执行（或排队）的分析输入相同的请求不另行执行，直接订阅那次分析的事件流，也不占用执行槽和队列。
+
+启动：
+    serve --port 8000 --max-inflight 4 --queue-size 16 --local-bazi
+
+也可以用环境变量 BAZI_SERVER_HOST、BAZI_SERVER_PORT、BAZI_MAX_INFLIGHT、BAZI_QUEUE_SIZE 设置默认值，
+--local-bazi 等团队开关与 run_crew 相同。
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from datetime import date
+from typing import Any, AsyncIterator, Callable, Dict, Optional, Tuple
+
+from agent_project.crew import CLI_FLAGS, options_from_argv
+from agent_project.crew_pool import shared_pool
+from agent_project.instrumentation import instrumentation
+from agent_project.single_flight import StreamSingleFlight, flight_key
+from agent_project.streaming_callback import astream_analysis
+from agent_project.tools.lunar_calendar import LunarDate, lunar_to_solar
+from agent_project.tools.time_context import parse_reference_date
+
+# 请求体大小上限
+MAX_BODY_BYTES = 64 * 1024
+
+# 排队已满时建议客户端等待的秒数
+RETRY_AFTER_SECONDS = 5
+
+# 读取请求头和请求体的超时秒数，避免慢速客户端一直占用连接
+READ_TIMEOUT_SECONDS = 30
+
+# 请求头行数上限；单行长度受 StreamReader 的缓冲区上限（默认 64 KiB）限制
+MAX_HEADERS = 100
+
+_STATUS_TEXT = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+                408: 'Request Timeout', 413: 'Payload Too Large', 429: 'Too Many Requests',
+                431: 'Request Header Fields Too Large'}
+
+
+def inputs_from_payload(payload: Dict[str, Any]) -> Dict[str, Any]:
+    """校验请求中的出生信息并转换为团队的 kickoff 输入"""
+    if not isinstance(payload, dict):
+        raise ValueError("请求体应为JSON对象")
+
+    try:
+        birth_year = int(payload['birth_year'])
+        birth_month = int(payload['birth_month'])
+        birth_day = int(payload['birth_day'])
+        birth_hour = int(payload['birth_hour'])
+        birth_minute = int(payload.get('birth_minute') or 0)
+    except KeyError as e:
+        raise ValueError(f"缺少字段：{e.args[0]}")
+    except (TypeError, ValueError):
+        raise ValueError("出生时间字段应为整数")
+
+    name = str(payload.get('name') or '').strip()
+    gender = payload.get('gender')
+    if not name:
+        raise ValueError("缺少字段：name")
+    if not (1900 <= birth_year <= 2100):
+        raise ValueError("年份应在1900-2100之间")
+    if not (1 <= birth_month <= 12):
+        raise ValueError("月份应在1-12之间")
+    if not (1 <= birth_day <= 31):
+        raise ValueError("日期应在1-31之间")
+    if not (0 <= birth_hour <= 23):
+        raise ValueError("小时应在0-23之间")
+    if not (0 <= birth_minute <= 59):
+        raise ValueError("分钟应在0-59之间")
+    if gender not in ['男', '女']:
+        raise ValueError("性别请输入'男'或'女'")
+
+    # calendar 为 "lunar"/"农历" 时出生年月日按农历理解，leap_month 为真表示闰月
+    birth_note = ""
+    if str(payload.get('calendar') or '').lower() in ('lunar', '农历'):
+        lunar = LunarDate(birth_year, birth_month, birth_day, bool(payload.get('leap_month')))
+        solar = lunar_to_solar(*lunar)
+        birth_year, birth_month, birth_day = solar.year, solar.month, solar.day
+        birth_note = f"（农历{lunar}）"
+    else:
+        try:
+            date(birth_year, birth_month, birth_day)
+        except ValueError:
+            raise ValueError(f"日期无效：{birth_year}年{birth_month}月没有{birth_day}日")
+
+    # reference_date 为运势预测的参照日期（如 2025-06-15），默认为当天
+    reference = parse_reference_date(payload.get('reference_date'))
+
+    return {
+        'name': name,
+        'gender': gender,
+        'birth_date': f"{birth_year}年{birth_month}月{birth_day}日{birth_note}",
+        'birth_time': f"{birth_hour}时{birth_minute:02d}分",
+        'birth_place': str(payload.get('birth_place') or '未指定'),
+        'provided_bazi': str(payload.get('provided_bazi') or ''),
+        'birth_year': birth_year,
+        'birth_month': birth_month,
+        'birth_day': birth_day,
+        'birth_hour': birth_hour,
+        'birth_minute': birth_minute,
+        'reference_date': f"{reference:%Y-%m-%d}",
+    }
+
+
+def sse_event(event: str, data: Any) -> bytes:
+    """编码一条 Server-Sent Events 消息"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n".encode('utf-8')
+
+
+class AdmissionController:
+    """
+    并发准入控制
+
+    最多 max_inflight 个分析同时执行，另有 queue_size 个请求可以排队等待，
+    两者都满时 try_admit 返回 False。
+    """
+
+    def __init__(self, max_inflight: int, queue_size: int):
+        if max_inflight < 1 or queue_size < 0:
+            raise ValueError("并发上限至少为1，排队长度不能为负数")
+        self.max_inflight = max_inflight
+        self.queue_size = queue_size
+        self.inflight = 0
+        self.queued = 0
+        self._semaphore = asyncio.Semaphore(max_inflight)
+
+    def try_admit(self) -> bool:
+        """登记一个请求；执行槽和队列都已满时拒绝"""
+        if self.inflight + self.queued >= self.max_inflight + self.queue_size:
+            return False
+        self.queued += 1
+        return True
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        """等待执行槽（调用前须已通过 try_admit）"""
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.queued -= 1
+        self.inflight += 1
+        try:
+            yield
+        finally:
+            self.inflight -= 1
+            self._semaphore.release()
+
+    def stats(self) -> Dict[str, int]:
+        return {'inflight': self.inflight, 'queued': self.queued,
+                'max_inflight': self.max_inflight, 'queue_size': self.queue_size}
+
+
+class AnalysisServer:
+    """八字分析 HTTP 服务"""
+
+    def __init__(self, max_inflight: int = 4, queue_size: int = 16,
+                 options: Optional[Dict[str, Any]] = None,
+                 runner: Optional[Callable[..., AsyncIterator[Dict[str, Any]]]] = None,
+                 read_timeout: float = READ_TIMEOUT_SECONDS):
+        self.admission = AdmissionController(max_inflight, queue_size)
+        self.read_timeout = read_timeout
+        self.options = {k: v for k, v in (options or {}).items() if v is not None}
+        self.pool = None
+        self.runner = runner or self._pooled_stream
+        self.flights = StreamSingleFlight()
+
+    async def _pooled_stream(self, inputs: Dict[str, Any], **options) -> AsyncIterator[Dict[str, Any]]:
+        """从预热的实例池取出团队执行流式分析"""
+        with self.pool.acquire() as project:
+            async for event in astream_analysis(inputs, project=project):
+                yield event
+
+    async def start(self, host: str, port: int) -> asyncio.AbstractServer:
+        instrumentation()
+        # 每个执行槽预先准备一个团队实例
+        if self.runner == self._pooled_stream and self.pool is None:
+            self.pool = shared_pool(stream=True, **self.options)
+            self.pool.warm(self.admission.max_inflight)
+        # 每个执行中的分析占用一个工作线程
+        asyncio.get_running_loop().set_default_executor(
+            ThreadPoolExecutor(max_workers=self.admission.max_inflight, thread_name_prefix='bazi')
+        )
+        return await asyncio.start_server(self.handle, host, port)
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            try:
+                method, path, body = await asyncio.wait_for(self._read_request(reader), self.read_timeout)
+            except asyncio.TimeoutError:
+                raise _HTTPError(408, "读取请求超时")
+            if path == '/health' and method == 'GET':
+                await self._send_json(writer, 200, dict(self.admission.stats(), coalesced=self.flights.coalesced))
+            elif path == '/metrics' and method == 'GET':
+                body = instrumentation().prometheus_text().encode('utf-8')
+                await self._write(writer, self._head(200, {
+                    'Content-Type': 'text/plain; version=0.0.4; charset=utf-8',
+                    'Content-Length': str(len(body)),
+                }) + body)
+            elif path == '/analyze':
+                if method != 'POST':
+                    await self._send_json(writer, 405, {'error': "请使用POST提交出生信息"})
+                else:
+                    await self._analyze(writer, body)
+            else:
+                await self._send_json(writer, 404, {'error': "接口不存在"})
+        except _HTTPError as e:
+            await self._send_json(writer, e.status, {'error': e.message})
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def _analyze(self, writer: asyncio.StreamWriter, body: bytes):
+        try:
+            payload = json.loads(body.decode('utf-8'))
+        except (json.JSONDecodeError, UnicodeDecodeError):
+            await self._send_json(writer, 400, {'error': "请求体应为JSON对象"})
+            return
+        try:
+            inputs = inputs_from_payload(payload)
+        except ValueError as e:
+            await self._send_json(writer, 400, {'error': str(e)})
+            return
+
+        key = flight_key(inputs)
+        coalesced = key in self.flights
+        if not coalesced and not self.admission.try_admit():
+            await self._send_json(writer, 429, {'error': "服务繁忙，请稍后重试"},
+                                  {'Retry-After': str(RETRY_AFTER_SECONDS)})
+            return
+
+        connected = await self._write(writer, self._head(200, {
+            'Content-Type': 'text/event-stream; charset=utf-8',
+            'Cache-Control': 'no-cache',
+        }) + sse_event('queued', dict(self.admission.stats(), coalesced=coalesced)))
+
+        try:
+            # 分析在后台任务中执行到结束，客户端断开不影响执行槽的释放和其他订阅者
+            async for event in self.flights.stream(key, lambda: self._admitted_run(inputs)):
+                if connected:
+                    connected = await self._write(writer, sse_event(event['event'], event))
+                if not connected:
+                    break
+        except Exception as e:
+            if connected:
+                await self._write(writer, sse_event('error', {'event': 'error', 'message': str(e)}))
+
+    async def _admitted_run(self, inputs: Dict[str, Any]) -> AsyncIterator[Dict[str, Any]]:
+        """占用执行槽运行一次分析（调用前须已通过 try_admit）"""
+        async with self.admission.slot():
+            async for event in self.runner(inputs, **self.options):
+                yield event
+
+    async def _read_request(self, reader: asyncio.StreamReader) -> Tuple[str, str, bytes]:
+        request_line = (await self._readline(reader, 400, "请求行过长")).decode('latin-1').split()
+        if len(request_line) != 3:
+            raise _HTTPError(400, "请求格式错误")
+        method, target, _ = request_line
+
+        headers = {}
+        while True:
+            line = (await self._readline(reader, 431, "请求头过长")).decode('latin-1')
+            if line in ('\r\n', '\n', ''):
+                break
+            if len(headers) >= MAX_HEADERS:
+                raise _HTTPError(431, "请求头过多")
+            key, _, value = line.partition(':')
+            headers[key.strip().lower()] = value.strip()
+
+        try:
+            length = int(headers.get('content-length') or 0)
+        except ValueError:
+            length = -1
+        if length < 0:
+            raise _HTTPError(400, "Content-Length 无效")
+        if length > MAX_BODY_BYTES:
+            raise _HTTPError(413, "请求体过大")
+        body = await reader.readexactly(length) if length else b''
+        return method.upper(), target.split('?', 1)[0], body
+
+    @staticmethod
+    async def _readline(reader: asyncio.StreamReader, status: int, message: str) -> bytes:
+        """读取一行；超过 StreamReader 缓冲区上限时以 status 拒绝请求"""
+        try:
+            return await reader.readline()
+        except (ValueError, asyncio.LimitOverrunError):
+            raise _HTTPError(status, message)
+
+    @staticmethod
+    def _head(status: int, headers: Dict[str, str]) -> bytes:
+        lines = [f"HTTP/1.1 {status} {_STATUS_TEXT.get(status, '')}"]
+        lines += [f"{k}: {v}" for k, v in headers.items()]
+        lines.append("Connection: close")
+        return ("\r\n".join(lines) + "\r\n\r\n").encode('latin-1')
+
+    async def _send_json(self, writer: asyncio.StreamWriter, status: int, data: Dict[str, Any],
+                         headers: Optional[Dict[str, str]] = None):
+        body = json.dumps(data, ensure_ascii=False).encode('utf-8')
+        head = self._head(status, {'Content-Type': 'application/json; charset=utf-8',
+                                   'Content-Length': str(len(body)), **(headers or {})})
+        await self._write(writer, head + body)
+
+    @staticmethod
+    async def _write(writer: asyncio.StreamWriter, data: bytes) -> bool:
+        """写出数据，客户端已断开时返回 False"""
+        try:
+            writer.write(data)
+            await writer.drain()
+            return True
+        except ConnectionError:
+            return False
+
+
+class _HTTPError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+def serve():
+    """启动八字分析 HTTP 服务"""
+    parser = argparse.ArgumentParser(description="八字分析 HTTP 服务")
+    parser.add_argument('--host', default=os.getenv('BAZI_SERVER_HOST', '127.0.0.1'))
+    parser.add_argument('--port', type=int, default=int(os.getenv('BAZI_SERVER_PORT', '8000')))
+    parser.add_argument('--max-inflight', type=int, default=int(os.getenv('BAZI_MAX_INFLIGHT', '4')),
+                        help="同时执行的分析数上限")
+    parser.add_argument('--queue-size', type=int, default=int(os.getenv('BAZI_QUEUE_SIZE', '16')),
+                        help="排队等待的请求数上限，超出时返回429")
+    for flag in CLI_FLAGS:
+        parser.add_argument(flag, action='store_true')
+    args = parser.parse_args()
+
+    server = AnalysisServer(args.max_inflight, args.queue_size, options_from_argv(sys.argv))
+
+    async def main():
+        listener = await server.start(args.host, args.port)
+        print(f"八字分析服务已启动：http://{args.host}:{args.port}"
+              f"（并发 {args.max_inflight}，排队 {args.queue_size}）")
+        async with listener:
+            await listener.serve_forever()
+
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    serve()
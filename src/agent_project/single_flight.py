@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+相同请求合并执行（single-flight）
+
+同一时刻到达的多个相同分析请求只执行一次：第一个请求真正调用团队，
+之后到达的相同请求等待这次执行并共享结果（流式请求共享事件流，先补发已产生的事件再接收后续事件）。
+执行结束即移除记录，不缓存结果，之后的请求重新执行，因此不存在过期结果。
+"""
+
+import asyncio
+import json
+import threading
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional
+
+from agent_project.crew import parse_birth_inputs
+
+# 不影响分析结果、不参与合并键的输入
+IGNORED_INPUT_KEYS = ('request_id',)
+
+# 出生时间的各种写法，能解析出出生时刻时统一替换为 (年, 月, 日, 时, 分)
+BIRTH_INPUT_KEYS = ('birth_date', 'birth_time', 'birth_year', 'birth_month', 'birth_day', 'birth_hour',
+                    'birth_minute', 'birth_calendar', 'birth_leap_month')
+
+
+def flight_key(inputs: Dict[str, Any]) -> str:
+    """
+    合并键：标准化后的输入
+
+    文本去除首尾空白，出生时间不论以文本、数值字段还是农历给出都换算为同一公历时刻。
+    """
+    normalized = {k: str(v).strip() for k, v in inputs.items()
+                  if k not in IGNORED_INPUT_KEYS and v is not None}
+    try:
+        birth = parse_birth_inputs(inputs)
+    except ValueError:
+        birth = None
+    if birth is not None:
+        normalized = {k: v for k, v in normalized.items() if k not in BIRTH_INPUT_KEYS}
+        normalized['birth'] = list(birth)
+    return json.dumps(normalized, ensure_ascii=False, sort_keys=True)
+
+
+class _Call:
+    """一次执行中的调用"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight:
+    """
+    同步调用的合并（线程安全）
+
+    do(key, fn) 在没有相同 key 的调用执行时调用 fn，否则等待正在执行的调用并返回同一结果或抛出同一异常。
+    """
+
+    def __init__(self):
+        self._calls: Dict[str, _Call] = {}
+        self._lock = threading.Lock()
+        self.coalesced = 0
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Any:
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            call.done.wait()
+        else:
+            try:
+                call.result = fn()
+            except BaseException as e:
+                call.error = e
+            finally:
+                with self._lock:
+                    del self._calls[key]
+                call.done.set()
+
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+    @property
+    def inflight(self) -> int:
+        return len(self._calls)
+
+
+class _Flight:
+    """一次执行中的流式调用：已产生的事件及完成状态"""
+
+    def __init__(self):
+        self.events: List[Dict[str, Any]] = []
+        self.error: Optional[BaseException] = None
+        self.finished = False
+        self.changed = asyncio.Condition()
+        self.task: Optional[asyncio.Task] = None
+
+
+class StreamSingleFlight:
+    """
+    流式调用的合并（在同一个事件循环中使用）
+
+    相同 key 的事件流只生成一次，在后台任务中消费到结束（与订阅者是否断开无关），
+    每个订阅者都从第一个事件开始收到完整的事件流。
+    """
+
+    def __init__(self):
+        self._flights: Dict[str, _Flight] = {}
+        self.coalesced = 0
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._flights
+
+    @property
+    def inflight(self) -> int:
+        return len(self._flights)
+
+    def stream(self, key: str, factory: Callable[[], AsyncIterator[Dict[str, Any]]]) -> AsyncIterator[Dict[str, Any]]:
+        """订阅 key 的事件流；没有正在执行的相同调用时用 factory() 开始一次新的执行"""
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = self._flights[key] = _Flight()
+            flight.task = asyncio.get_running_loop().create_task(self._produce(key, flight, factory))
+        else:
+            self.coalesced += 1
+        return self._subscribe(flight)
+
+    async def _produce(self, key: str, flight: _Flight,
+                       factory: Callable[[], AsyncIterator[Dict[str, Any]]]) -> None:
+        try:
+            async for event in factory():
+                async with flight.changed:
+                    flight.events.append(event)
+                    flight.changed.notify_all()
+        except Exception as e:
+            flight.error = e
+        finally:
+            del self._flights[key]
+            async with flight.changed:
+                flight.finished = True
+                flight.changed.notify_all()
+
+    @staticmethod
+    async def _subscribe(flight: _Flight) -> AsyncIterator[Dict[str, Any]]:
+        position = 0
+        while True:
+            async with flight.changed:
+                while position == len(flight.events) and not flight.finished:
+                    await flight.changed.wait()
+                pending = flight.events[position:]
+                finished = flight.finished
+            for event in pending:
+                yield event
+            position += len(pending)
+            if finished and position == len(flight.events):
+                break
+        if flight.error is not None:
+            raise flight.error
@@ -2,21 +2,51 @@
 # -*- coding: utf-8 -*-
 """
 流式输出回调处理器
+
+StreamRouter 监听 crewAI 事件总线，把任务开始/结束、LLM调用和流式token
+分发给各次运行注册的 StreamingCallback；astream_analysis 在此基础上提供异步迭代接口。
 """
 
+import asyncio
+import io
 import sys
-from typing import Any, Dict, List, Optional
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, AsyncIterator, Dict, List, Optional, TextIO
 from crewai.agent import Agent
 from crewai.task import Task
+from crewai.utilities.events import (
+    AgentExecutionCompletedEvent,
+    AgentExecutionStartedEvent,
+    LLMCallCompletedEvent,
+    LLMCallStartedEvent,
+    LLMStreamChunkEvent,
+    TaskCompletedEvent,
+    TaskFailedEvent,
+    TaskStartedEvent,
+)
+from crewai.utilities.events.base_event_listener import BaseEventListener
+
+# SimpleStreamingHandler 的默认参数：攒满多少字符或间隔多少秒输出一次，保存的内容超过多少字符后转存临时文件
+FLUSH_CHARS = 256
+FLUSH_INTERVAL = 0.05
+SPILL_CHARS = 1 << 20
 
 
 class StreamingCallback:
     """流式输出回调处理器"""
     
-    def __init__(self):
+    def __init__(self, handler: Optional["SimpleStreamingHandler"] = None):
         self.current_agent = None
         self.current_task = None
+        self.handler = handler
         
+    def _flush_handler(self):
+        if self.handler is not None:
+            self.handler.flush()
+
     def on_agent_start(self, agent: Agent, **kwargs):
         """智能体开始工作时的回调"""
         self.current_agent = agent
@@ -27,6 +57,7 @@ class StreamingCallback:
         
     def on_agent_end(self, agent: Agent, **kwargs):
         """智能体完成工作时的回调"""
+        self._flush_handler()
         print(f"\n✅ 【{agent.role}】工作完成")
         print("=" * 50)
         sys.stdout.flush()
@@ -37,8 +68,9 @@ class StreamingCallback:
         print(f"\n📝 开始执行任务: {task.description[:50]}...")
         sys.stdout.flush()
         
-    def on_task_end(self, task: Task, **kwargs):
+    def on_task_end(self, task: Task, output: Any = None, **kwargs):
         """任务完成时的回调"""
+        self._flush_handler()
         print(f"\n✅ 任务完成")
         sys.stdout.flush()
         
@@ -72,10 +104,14 @@ class StreamingCallback:
     def on_llm_new_token(self, token: str, **kwargs):
         """LLM生成新token时的回调（流式输出）"""
         # 实时输出每个token
-        print(token, end='', flush=True)
+        if self.handler is not None:
+            self.handler.write(token)
+        else:
+            print(token, end='', flush=True)
         
     def on_llm_end(self, response: str, **kwargs):
         """LLM生成完成时的回调"""
+        self._flush_handler()
         print(f"\n💭 AI思考完成")
         sys.stdout.flush()
         
@@ -89,26 +125,293 @@ class StreamingCallback:
         
     def on_chain_error(self, error: Exception, **kwargs):
         """链出错时的回调"""
+        self._flush_handler()
         print(f"\n❌ 执行出错: {error}")
         sys.stdout.flush()
 
 
 class SimpleStreamingHandler:
-    """简化的流式处理器"""
-    
-    def __init__(self):
-        self.buffer = ""
-        
+    """
+    简化的流式处理器
+
+    token 先攒在待输出列表中，累计达到 flush_chars 个字符或距上次输出超过 flush_interval 秒时
+    一次性写入输出流，避免每个token一次系统调用；LLM调用或任务结束时由 StreamingCallback 调用 flush 输出剩余内容。
+    已输出的全部内容按片段保存，超过 spill_chars 个字符后转存到临时文件，内存占用不随报告长度增长。
+    """
+
+    def __init__(self, sink: Optional[TextIO] = None, flush_chars: int = FLUSH_CHARS,
+                 flush_interval: float = FLUSH_INTERVAL, spill_chars: int = SPILL_CHARS):
+        if flush_chars < 1 or spill_chars < 1:
+            raise ValueError("缓冲区大小至少为1个字符")
+        # 未指定时在输出时取当前的 sys.stdout，以便调用方重定向标准输出
+        self.sink = sink
+        self.flush_chars = flush_chars
+        self.flush_interval = flush_interval
+        self.spill_chars = spill_chars
+        self._lock = threading.Lock()
+        self._pending: List[str] = []
+        self._pending_chars = 0
+        self._last_flush = time.monotonic()
+        self._segments: List[str] = []
+        self._segment_chars = 0
+        self._spill: Optional[TextIO] = None
+
     def write(self, text: str):
-        """写入文本并实时输出"""
-        if text and text.strip():
-            print(text, end='', flush=True)
-            self.buffer += text
-            
+        """写入文本，按大小或时间间隔批量输出"""
+        if not text:
+            return
+        with self._lock:
+            self._pending.append(text)
+            self._pending_chars += len(text)
+            if (self._pending_chars >= self.flush_chars
+                    or time.monotonic() - self._last_flush >= self.flush_interval):
+                self._flush_locked()
+
     def flush(self):
-        """刷新缓冲区"""
-        sys.stdout.flush()
-        
+        """输出所有待输出的内容"""
+        with self._lock:
+            self._flush_locked()
+
+    def _flush_locked(self):
+        self._last_flush = time.monotonic()
+        if not self._pending:
+            return
+        chunk = "".join(self._pending)
+        self._pending.clear()
+        self._pending_chars = 0
+        sink = self.sink or sys.stdout
+        sink.write(chunk)
+        sink.flush()
+        self._keep(chunk)
+
+    def _keep(self, chunk: str):
+        self._segments.append(chunk)
+        self._segment_chars += len(chunk)
+        if self._segment_chars >= self.spill_chars:
+            if self._spill is None:
+                self._spill = tempfile.TemporaryFile(mode='w+', encoding='utf-8')
+            self._spill.write("".join(self._segments))
+            self._segments.clear()
+            self._segment_chars = 0
+
     def get_content(self) -> str:
-        """获取所有内容"""
-        return self.buffer
+        """获取所有内容（包括尚未输出的部分）"""
+        with self._lock:
+            spilled = ""
+            if self._spill is not None:
+                self._spill.flush()
+                self._spill.seek(0)
+                spilled = self._spill.read()
+                self._spill.seek(0, io.SEEK_END)
+            return spilled + "".join(self._segments) + "".join(self._pending)
+
+    @property
+    def buffer(self) -> str:
+        return self.get_content()
+
+    def close(self):
+        """输出剩余内容并删除临时文件"""
+        with self._lock:
+            self._flush_locked()
+            if self._spill is not None:
+                self._spill.close()
+                self._spill = None
+            self._segments.clear()
+            self._segment_chars = 0
+
+    def __enter__(self) -> "SimpleStreamingHandler":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class QueueStreamingCallback(StreamingCallback):
+    """把回调转换为事件字典放入 asyncio 队列，供异步迭代接口消费"""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, queue: asyncio.Queue):
+        super().__init__()
+        self._loop = loop
+        self._queue = queue
+
+    def _put(self, event: Dict[str, Any]):
+        # 回调在 crewAI 的执行线程中触发，需要切回事件循环线程入队
+        self._loop.call_soon_threadsafe(self._queue.put_nowait, event)
+
+    def on_agent_start(self, agent: Agent, **kwargs):
+        pass
+
+    def on_agent_end(self, agent: Agent, **kwargs):
+        pass
+
+    def on_task_start(self, task: Task, **kwargs):
+        self._put({'event': 'task_start', 'task': task.name, 'agent': task.agent.role})
+
+    def on_task_end(self, task: Task, output: Any = None, **kwargs):
+        self._put({'event': 'task_end', 'task': task.name, 'output': getattr(output, 'raw', '')})
+
+    def on_llm_start(self, prompt: str, **kwargs):
+        pass
+
+    def on_llm_new_token(self, token: str, task: Optional[Task] = None, **kwargs):
+        self._put({'event': 'token', 'task': task.name if task is not None else None, 'text': token})
+
+    def on_llm_end(self, response: str, **kwargs):
+        pass
+
+    def on_chain_error(self, error: Exception, **kwargs):
+        self._put({'event': 'error', 'message': str(error)})
+
+
+class StreamRouter(BaseEventListener):
+    """
+    把事件总线上的事件分发给订阅的回调
+
+    事件总线是进程级的，多个团队可能同时运行：LLM事件按发出事件的模型实例归属，
+    任务事件按任务对象归属；流式token所属的任务按执行线程查找（crewAI 在同一线程内执行任务和LLM调用）。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._owners: Dict[int, StreamingCallback] = {}
+        self._thread_tasks: Dict[int, Task] = {}
+        super().__init__()
+
+    def subscribe(self, objects: List[Any], callback: StreamingCallback):
+        with self._lock:
+            for obj in objects:
+                self._owners[id(obj)] = callback
+
+    def unsubscribe(self, objects: List[Any]):
+        with self._lock:
+            for obj in objects:
+                self._owners.pop(id(obj), None)
+
+    def _owner(self, obj: Any) -> Optional[StreamingCallback]:
+        with self._lock:
+            return self._owners.get(id(obj))
+
+    def setup_listeners(self, crewai_event_bus):
+        # 只注册自己的处理函数，总线上其他订阅者（包括其他团队的监听器）保持不变
+
+        @crewai_event_bus.on(TaskStartedEvent)
+        def on_task_started(source, event: TaskStartedEvent):
+            callback = self._owner(event.task)
+            if callback is not None:
+                self._thread_tasks[threading.get_ident()] = event.task
+                callback.on_task_start(event.task)
+
+        @crewai_event_bus.on(TaskCompletedEvent)
+        def on_task_completed(source, event: TaskCompletedEvent):
+            callback = self._owner(event.task)
+            if callback is not None:
+                self._thread_tasks.pop(threading.get_ident(), None)
+                callback.on_task_end(event.task, output=event.output)
+
+        @crewai_event_bus.on(TaskFailedEvent)
+        def on_task_failed(source, event: TaskFailedEvent):
+            callback = self._owner(event.task)
+            if callback is not None:
+                self._thread_tasks.pop(threading.get_ident(), None)
+                callback.on_chain_error(Exception(event.error))
+
+        @crewai_event_bus.on(AgentExecutionStartedEvent)
+        def on_agent_started(source, event: AgentExecutionStartedEvent):
+            callback = self._owner(event.agent)
+            if callback is not None:
+                callback.on_agent_start(event.agent)
+
+        @crewai_event_bus.on(AgentExecutionCompletedEvent)
+        def on_agent_completed(source, event: AgentExecutionCompletedEvent):
+            callback = self._owner(event.agent)
+            if callback is not None:
+                callback.on_agent_end(event.agent)
+
+        @crewai_event_bus.on(LLMCallStartedEvent)
+        def on_llm_started(source, event: LLMCallStartedEvent):
+            callback = self._owner(source)
+            if callback is not None:
+                callback.on_llm_start(event.messages)
+
+        @crewai_event_bus.on(LLMStreamChunkEvent)
+        def on_llm_chunk(source, event: LLMStreamChunkEvent):
+            callback = self._owner(source)
+            if callback is not None:
+                callback.on_llm_new_token(event.chunk, task=self._thread_tasks.get(threading.get_ident()))
+
+        @crewai_event_bus.on(LLMCallCompletedEvent)
+        def on_llm_completed(source, event: LLMCallCompletedEvent):
+            callback = self._owner(source)
+            if callback is not None:
+                callback.on_llm_end(event.response)
+
+
+_router: Optional[StreamRouter] = None
+_router_lock = threading.Lock()
+
+
+def stream_router() -> StreamRouter:
+    """进程内唯一的事件路由（首次使用时注册到事件总线）"""
+    global _router
+    with _router_lock:
+        if _router is None:
+            _router = StreamRouter()
+        return _router
+
+
+@contextmanager
+def attach_streaming(project, callback: StreamingCallback):
+    """
+    在上下文内把 project 团队的事件转发给 callback
+
+    project 应以 stream=True 创建，其模型实例只属于这一个团队。
+    """
+    crew = project.crew()
+    tasks = list(crew.tasks) + [t for t in getattr(project, '_scheduled_tasks', []) if t not in crew.tasks]
+    objects = [project.deepseek_llm, *crew.agents, *tasks]
+    router = stream_router()
+    router.subscribe(objects, callback)
+    try:
+        yield callback
+    finally:
+        router.unsubscribe(objects)
+
+
+_DONE = object()
+
+
+async def astream_analysis(inputs: Dict[str, Any], project=None, **options) -> AsyncIterator[Dict[str, Any]]:
+    """
+    以异步迭代器的形式运行八字分析
+
+    依次产出事件字典：
+    {'event': 'task_start', 'task': 任务名, 'agent': 智能体角色}
+    {'event': 'token', 'task': 任务名, 'text': 新生成的文本}
+    {'event': 'task_end', 'task': 任务名, 'output': 任务完整输出}
+    {'event': 'result', 'output': 最终报告}
+    团队在线程池中执行；执行出错时迭代器抛出异常。提前停止迭代不会中断已开始的分析。
+    """
+    if project is None:
+        from agent_project.crew import AgentProject
+
+        project = AgentProject(stream=True, **options)
+
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue()
+    callback = QueueStreamingCallback(loop, queue)
+
+    def run():
+        with attach_streaming(project, callback):
+            return project.crew().kickoff(inputs=inputs)
+
+    future = loop.run_in_executor(None, run)
+    future.add_done_callback(lambda _: queue.put_nowait(_DONE))
+
+    while True:
+        event = await queue.get()
+        if event is _DONE:
+            break
+        yield event
+
+    result = await future
+    yield {'event': 'result', 'output': result.raw}
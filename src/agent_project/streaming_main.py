@@ -8,8 +8,10 @@ import sys
 import warnings
 import os
 from datetime import datetime
-from agent_project.crew import AgentProject
-from agent_project.streaming_callback import SimpleStreamingHandler
+from agent_project.crew import AgentProject, options_from_argv, reference_date_from_argv
+from agent_project.tools.lunar_calendar import LunarDate, lunar_to_solar
+from agent_project.tools.time_context import parse_reference_date
+from agent_project.streaming_callback import SimpleStreamingHandler, StreamingCallback, attach_streaming
 
 warnings.filterwarnings("ignore", category=SyntaxWarning, module="pysbd")
 
@@ -17,6 +19,17 @@ warnings.filterwarnings("ignore", category=SyntaxWarning, module="pysbd")
 def run_with_streaming():
     """
     运行八字分析智能体团队（支持流式输出）
+
+    命令行参数：
+    --local-bazi  本地计算八字，跳过排盘环节的LLM调用
+    --concurrent  按任务依赖图并发执行互不依赖的任务
+    --chart-cache 相同命盘复用五行分析与性格解读的结果
+    --full-context 下游任务接收上游的完整报告（默认接收压缩摘要）
+    --measure-tokens 运行结束后输出每个任务压缩前后的输入token数
+    --plan-cache  复用已缓存的任务规划，跳过每次运行前的规划调用
+    --trace       记录各任务耗时与token数，运行结束后写出JSON跟踪文件
+    --incremental 只重新执行运势预测和人生指导，其余任务复用已缓存的输出
+    --reference-date 2025-06-15  运势预测的参照日期（默认当天，也可用 BAZI_REFERENCE_DATE 设置）
     """
     print("=== 八字分析智能体系统（流式输出版本）===")
     print("请输入您的出生信息进行八字分析：")
@@ -37,6 +50,7 @@ def run_with_streaming():
 
     # 获取出生日期
     try:
+        lunar = input("出生日期是公历还是农历？（公历/农历，默认公历）：").strip() == "农历"
         birth_year = int(input("请输入出生年份（如：1990）："))
         birth_month = int(input("请输入出生月份（如：5）："))
         birth_day = int(input("请输入出生日期（如：15）："))
@@ -57,6 +71,17 @@ def run_with_streaming():
         if gender not in ['男', '女']:
             raise ValueError("性别请输入'男'或'女'")
 
+        # 农历日期在本地换算为公历
+        birth_note = ""
+        if lunar:
+            leap = input("是否闰月？(y/n，默认n)：").lower().strip() in ['y', 'yes', '是']
+            lunar_date = LunarDate(birth_year, birth_month, birth_day, leap)
+            solar = lunar_to_solar(*lunar_date)
+            birth_year, birth_month, birth_day = solar.year, solar.month, solar.day
+            birth_note = f"（农历{lunar_date}）"
+
+        reference = parse_reference_date(reference_date_from_argv(sys.argv))
+
     except ValueError as e:
         print(f"输入错误：{e}")
         return
@@ -68,10 +93,11 @@ def run_with_streaming():
     inputs = {
         'name': name,
         'gender': gender,
-        'birth_date': f"{birth_year}年{birth_month}月{birth_day}日",
+        'birth_date': f"{birth_year}年{birth_month}月{birth_day}日{birth_note}",
         'birth_time': f"{birth_hour}时{birth_minute:02d}分",
         'birth_place': birth_place,
         'provided_bazi': provided_bazi or "",
+        'reference_date': f"{reference:%Y-%m-%d}",
         # 同时保留详细的时间信息供工具使用
         'birth_year': birth_year,
         'birth_month': birth_month,
@@ -81,47 +107,33 @@ def run_with_streaming():
     }
 
     print(f"\n🎯 开始为 {name}（{gender}）进行八字分析...")
-    print(f"📅 出生时间：{birth_year}年{birth_month}月{birth_day}日{birth_hour}时{birth_minute:02d}分")
+    print(f"📅 出生时间：{birth_year}年{birth_month}月{birth_day}日{birth_hour}时{birth_minute:02d}分{birth_note}")
     if provided_bazi:
         print(f"🔮 使用提供的八字：{provided_bazi}")
     print(f"📍 出生地点：{birth_place}")
+    print(f"🗓️ 参照日期：{reference:%Y-%m-%d}")
     print("=" * 60)
 
     try:
-        # 创建流式处理器
-        stream_handler = SimpleStreamingHandler()
-        
-        # 重定向标准输出以捕获流式内容
-        original_stdout = sys.stdout
-        
+        project = AgentProject(stream=True, **options_from_argv(sys.argv))
+
         print("\n🚀 开始分析，请稍候...")
         print("=" * 60)
-        
-        # 执行分析
-        result = AgentProject().crew().kickoff(inputs=inputs)
-        
-        # 恢复标准输出
-        sys.stdout = original_stdout
-        
+
+        # 创建流式处理器，LLM生成的token经 StreamingCallback 实时输出；结束时输出剩余内容并删除临时文件
+        with SimpleStreamingHandler() as stream_handler:
+            with attach_streaming(project, StreamingCallback(stream_handler)):
+                result = project.crew().kickoff(inputs=inputs)
+
         print("\n" + "=" * 60)
         print("✅ 八字分析完成！")
         print("=" * 60)
-        
-        # 显示最终结果
-        if hasattr(result, 'raw'):
-            print("\n📋 最终分析报告：")
-            print("-" * 40)
-            print(result.raw)
-        else:
-            print("\n📋 最终分析报告：")
-            print("-" * 40)
-            print(str(result))
-            
+
+        # 最终报告已随最后一个任务实时输出，不再重复打印
+        print("\n📋 最终分析报告已在上方实时输出")
         return result
-        
+
     except Exception as e:
-        # 恢复标准输出
-        sys.stdout = original_stdout
         print(f"\n❌ 分析过程中出现错误：{e}")
         import traceback
         traceback.print_exc()
@@ -154,7 +166,9 @@ def test_streaming():
     print("=" * 60)
     
     try:
-        result = AgentProject().crew().kickoff(inputs=inputs)
+        project = AgentProject(stream=True, **options_from_argv(sys.argv))
+        with attach_streaming(project, StreamingCallback()):
+            result = project.crew().kickoff(inputs=inputs)
         print("\n✅ 测试完成！")
         return result
     except Exception as e:
@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+批量排盘、五行评分与十神/干支关系标注（NumPy 向量化）
+
+与 bazi_engine.compute_pillars 使用同一套干支算法和节气表，
+用于存量用户资料的批量回填，一次处理整列出生时间。
+"""
+
+from typing import Dict, Optional
+
+import numpy as np
+
+from agent_project.tools.bazi_engine import DAY_BASE_ORDINAL, DAY_DZ_OFFSET, DAY_TG_OFFSET
+from agent_project.tools.solar_terms import (
+    DATA_FILE, EPOCH_ORDINAL, LICHUN, MAX_YEAR, MIN_YEAR, TABLE_FIRST_YEAR, TERMS_PER_YEAR,
+)
+from agent_project.tools.relations import (
+    BRANCH_MAIN_STEM, BRANCH_RELATIONS, PILLAR_PAIRS, STEM_RELATIONS, TEN_GOD_MATRIX,
+)
+from agent_project.tools.solar_time import EOT_COEFFICIENTS, EOT_MINUTES_PER_RADIAN, STANDARD_MERIDIAN
+from agent_project.tools.wuxing_engine import BRANCH_WEIGHTS, MONTH_MULTIPLIERS, STEM_WEIGHTS
+
+# numpy datetime64[D] 以 1970-01-01 为 0
+_UNIX_EPOCH_ORDINAL = 719163
+
+_TERM_TABLE: Optional[np.ndarray] = None
+
+_STEM_WEIGHTS = np.array(STEM_WEIGHTS, dtype=np.float32)
+_BRANCH_WEIGHTS = np.array(BRANCH_WEIGHTS, dtype=np.float32)
+_MONTH_MULTIPLIERS = np.array(MONTH_MULTIPLIERS, dtype=np.float32)
+# 一柱（天干序号 * 12 + 地支序号）的五行权重，四柱各查一次表即可
+_PILLAR_WEIGHTS = (_STEM_WEIGHTS[:, None, :] + _BRANCH_WEIGHTS[None, :, :]).reshape(120, 5)
+_TEN_GOD_MATRIX = np.array(TEN_GOD_MATRIX, dtype=np.int8)
+_STEM_RELATIONS = np.array(STEM_RELATIONS, dtype=np.uint8)
+_BRANCH_RELATIONS = np.array(BRANCH_RELATIONS, dtype=np.uint8)
+_BRANCH_MAIN_STEM = np.array(BRANCH_MAIN_STEM, dtype=np.intp)
+_PAIR_LEFT = np.array([i for i, _ in PILLAR_PAIRS], dtype=np.intp)
+_PAIR_RIGHT = np.array([j for _, j in PILLAR_PAIRS], dtype=np.intp)
+
+
+def _term_table() -> np.ndarray:
+    """节气时刻表（int64 分钟数）"""
+    global _TERM_TABLE
+    if _TERM_TABLE is None:
+        _TERM_TABLE = np.fromfile(DATA_FILE, dtype='<u4').astype(np.int64)
+    return _TERM_TABLE
+
+
+def _solar_offset_batch(day_of_year: np.ndarray, hours: np.ndarray, minutes: np.ndarray,
+                        longitudes: np.ndarray) -> np.ndarray:
+    """真太阳时相对北京时间的偏移（分钟），与 solar_time.solar_offset_minutes 相同"""
+    gamma = 2 * np.pi / 365 * (day_of_year - 1 + (hours + minutes / 60 - 20) / 24)
+    c0, c1, s1, c2, s2 = EOT_COEFFICIENTS
+    eot = EOT_MINUTES_PER_RADIAN * (c0 + c1 * np.cos(gamma) + s1 * np.sin(gamma)
+                                    + c2 * np.cos(2 * gamma) + s2 * np.sin(2 * gamma))
+    return 4 * (longitudes - STANDARD_MERIDIAN) + eot
+
+
+def compute_pillars_batch(years, months, days, hours, minutes=None, longitudes=None) -> np.ndarray:
+    """
+    批量计算四柱天干地支序号
+
+    参数为等长的整数数组（或可转换为数组的序列），minutes 缺省为 0。
+    longitudes 为出生地经度（浮点数组，NaN 表示不校正），给出时日柱、时柱按真太阳时计算。
+    返回形状为 (N, 8) 的 int8 数组，列顺序与 compute_pillars 相同：
+    年干, 年支, 月干, 月支, 日干, 日支, 时干, 时支。
+    """
+    years = np.asarray(years, dtype=np.int64)
+    months = np.asarray(months, dtype=np.int64)
+    days = np.asarray(days, dtype=np.int64)
+    hours = np.asarray(hours, dtype=np.int64)
+    minutes = np.zeros_like(years) if minutes is None else np.asarray(minutes, dtype=np.int64)
+
+    if years.size and (years.min() < MIN_YEAR or years.max() > MAX_YEAR):
+        raise ValueError(f"年份应在{MIN_YEAR}-{MAX_YEAR}之间")
+    if months.size and (months.min() < 1 or months.max() > 12):
+        raise ValueError("月份应在1-12之间")
+    if hours.size and (hours.min() < 0 or hours.max() > 23):
+        raise ValueError("小时应在0-23之间")
+    if minutes.size and (minutes.min() < 0 or minutes.max() > 59):
+        raise ValueError("分钟应在0-59之间")
+
+    # 公历日期 → 自 1970-01-01 起的日数
+    month_start = (years - 1970).astype('M8[Y]') + (months - 1).astype('m8[M]')
+    month_length = ((month_start + np.timedelta64(1, 'M')).astype('M8[D]')
+                    - month_start.astype('M8[D]')).astype(np.int64)
+    if days.size and ((days < 1) | (days > month_length)).any():
+        raise ValueError("存在无效日期")
+    day_number = month_start.astype('M8[D]').astype(np.int64) + days - 1
+
+    # 出生时刻（自节气表起点的分钟数）
+    t = (day_number + _UNIX_EPOCH_ORDINAL - EPOCH_ORDINAL) * 1440 + hours * 60 + minutes
+
+    # 月令：与本月"节"的交节时刻比较
+    table = _term_table()
+    year_offset = (years - TABLE_FIRST_YEAR) * TERMS_PER_YEAR
+    month_dz = np.where(t < table[year_offset + 2 * (months - 1)], (months - 1) % 12, months % 12)
+
+    # 年柱：立春前属上一年
+    solar_year = years - ((months < 3) & (t < table[year_offset + LICHUN]))
+    year_tg = (solar_year - 4) % 10
+    year_dz = (solar_year - 4) % 12
+    month_tg = (year_tg * 2 + 2 + (month_dz - 2) % 12) % 10
+
+    # 真太阳时：只影响日柱、时柱
+    local_day, local_hour = day_number, hours
+    if longitudes is not None:
+        longitudes = np.asarray(longitudes, dtype=np.float64)
+        day_of_year = day_number - (years - 1970).astype('M8[Y]').astype('M8[D]').astype(np.int64) + 1
+        offset = _solar_offset_batch(day_of_year, hours, minutes, longitudes)
+        local = np.floor(day_number * 1440 + hours * 60 + minutes + np.nan_to_num(offset)).astype(np.int64)
+        local_day, local_hour = local // 1440, local % 1440 // 60
+
+    # 日柱：23:00 以后按次日计算
+    days_diff = local_day + _UNIX_EPOCH_ORDINAL - DAY_BASE_ORDINAL + (local_hour == 23)
+    day_tg = (days_diff + DAY_TG_OFFSET) % 10
+    day_dz = (days_diff + DAY_DZ_OFFSET) % 12
+
+    # 时柱：五鼠遁
+    hour_dz = (local_hour + 1) // 2 % 12
+    hour_tg = (day_tg * 2 + hour_dz) % 10
+
+    return np.stack([year_tg, year_dz, month_tg, month_dz,
+                     day_tg, day_dz, hour_tg, hour_dz], axis=1).astype(np.int8)
+
+
+def score_wuxing_batch(pillars: np.ndarray) -> np.ndarray:
+    """
+    批量计算五行力量
+
+    pillars 为 compute_pillars_batch 返回的 (N, 8) 数组，
+    返回 (N, 5) 的 float32 数组，列顺序为木火土金水，算法与 wuxing_engine.score_indices 相同。
+    """
+    pillars = np.asarray(pillars, dtype=np.intp)
+    codes = pillars[:, 0::2] * 12 + pillars[:, 1::2]
+    scores = (_PILLAR_WEIGHTS[codes[:, 0]] + _PILLAR_WEIGHTS[codes[:, 1]]
+              + _PILLAR_WEIGHTS[codes[:, 2]] + _PILLAR_WEIGHTS[codes[:, 3]])
+    scores *= _MONTH_MULTIPLIERS[pillars[:, 3]]
+    return scores
+
+
+def annotate_batch(pillars: np.ndarray) -> Dict[str, np.ndarray]:
+    """
+    批量标注十神与干支关系
+
+    pillars 为 compute_pillars_batch 返回的 (N, 8) 数组，返回：
+    - ten_gods：(N, 8) int8，列顺序与 pillars 相同，天干列为该干对日干的十神，
+      地支列为该支本气对日干的十神（TEN_GODS 下标；日干列恒为比肩）
+    - stem_relations / branch_relations：(N, 6) uint8 关系位掩码，列顺序为 relations.PILLAR_PAIRS
+    """
+    pillars = np.asarray(pillars, dtype=np.intp)
+    stems = pillars[:, 0::2]
+    branches = pillars[:, 1::2]
+    day = pillars[:, 4:5]
+
+    ten_gods = np.empty(pillars.shape, dtype=np.int8)
+    ten_gods[:, 0::2] = _TEN_GOD_MATRIX[day, stems]
+    ten_gods[:, 1::2] = _TEN_GOD_MATRIX[day, _BRANCH_MAIN_STEM[branches]]
+
+    return {
+        'ten_gods': ten_gods,
+        'stem_relations': _STEM_RELATIONS[stems[:, _PAIR_LEFT], stems[:, _PAIR_RIGHT]],
+        'branch_relations': _BRANCH_RELATIONS[branches[:, _PAIR_LEFT], branches[:, _PAIR_RIGHT]],
+    }
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+八字命盘对象
+
+工具之间传递四柱时使用 BaziChart（八个干支序号 + 标志位），
+只有在输出给用户或LLM时才渲染为文本。
+"""
+
+import re
+from typing import Optional, Tuple
+
+from agent_project.tools.bazi_engine import DIZHI, TIANGAN, WUXING_DZ, WUXING_TG, compute_pillars, day_hour_moment
+
+# 标志位
+FLAG_NEXT_DAY_ZI = 1   # 23:00-23:59 出生，日柱按次日子时
+FLAG_PROVIDED = 2      # 用户提供的八字（非本地计算）
+FLAG_TRUE_SOLAR = 4    # 日柱、时柱按出生地真太阳时计算
+
+PILLAR_NAMES = ('年柱', '月柱', '日柱', '时柱')
+
+_TG_INDEX = {c: i for i, c in enumerate(TIANGAN)}
+_DZ_INDEX = {c: i for i, c in enumerate(DIZHI)}
+_PILLAR_LINE = re.compile(r'(年柱|月柱|日柱|时柱)[：:]\s*([甲乙丙丁戊己庚辛壬癸])([子丑寅卯辰巳午未申酉戌亥])')
+_GANZHI_8 = re.compile(r'(?:[甲乙丙丁戊己庚辛壬癸][子丑寅卯辰巳午未申酉戌亥]){4}')
+
+
+def _parse_ganzhi(bazi: str) -> Tuple[int, ...]:
+    """八字字符串 → 八个干支序号"""
+    bazi = bazi.strip()
+    if len(bazi) != 8:
+        raise ValueError(f"八字格式不正确：{bazi}")
+    try:
+        return tuple(_TG_INDEX[c] if i % 2 == 0 else _DZ_INDEX[c] for i, c in enumerate(bazi))
+    except KeyError as e:
+        raise ValueError(f"八字中含有无效字符：{e.args[0]}") from e
+
+
+class BaziChart:
+    """八字命盘（四柱天干地支序号）"""
+
+    __slots__ = ('indices', 'flags')
+
+    def __init__(self, indices: Tuple[int, ...], flags: int = 0):
+        if len(indices) != 8:
+            raise ValueError("四柱需要8个干支序号")
+        for i in range(0, 8, 2):
+            tg, dz = indices[i], indices[i + 1]
+            if not (0 <= tg < 10 and 0 <= dz < 12) or tg % 2 != dz % 2:
+                raise ValueError(f"无效的干支组合：{PILLAR_NAMES[i // 2]}({tg}, {dz})")
+        object.__setattr__(self, 'indices', tuple(int(x) for x in indices))
+        object.__setattr__(self, 'flags', int(flags))
+
+    def __setattr__(self, name, value):
+        raise AttributeError("BaziChart 为不可变对象")
+
+    @classmethod
+    def from_birth(cls, year: int, month: int, day: int, hour: int, minute: int = 0,
+                   longitude: Optional[float] = None) -> "BaziChart":
+        """根据出生时间本地计算；给出出生地经度时日柱、时柱按真太阳时"""
+        local_hour = day_hour_moment(year, month, day, hour, minute, longitude).hour
+        flags = FLAG_NEXT_DAY_ZI if local_hour == 23 else 0
+        if longitude is not None:
+            flags |= FLAG_TRUE_SOLAR
+        return cls(compute_pillars(year, month, day, hour, minute, longitude), flags)
+
+    @classmethod
+    def from_string(cls, bazi: str, flags: int = 0) -> "BaziChart":
+        """由八字字符串（如：癸未甲寅戊午壬子）构造，视为用户提供"""
+        return cls(_parse_ganzhi(bazi), flags | FLAG_PROVIDED)
+
+    @classmethod
+    def parse(cls, text: str) -> Optional["BaziChart"]:
+        """从排盘报告或自由文本中提取四柱，提取失败返回 None"""
+        found = {}
+        for name, tg, dz in _PILLAR_LINE.findall(text):
+            found.setdefault(name, tg + dz)
+        if len(found) == 4:
+            candidate = ''.join(found[name] for name in PILLAR_NAMES)
+        else:
+            match = _GANZHI_8.search(text)
+            if not match:
+                return None
+            candidate = match.group(0)
+
+        flags = FLAG_NEXT_DAY_ZI if '次日子时' in text else 0
+        if '用户提供' in text:
+            flags |= FLAG_PROVIDED
+        try:
+            return cls(_parse_ganzhi(candidate), flags)
+        except ValueError:
+            return None
+
+    @property
+    def next_day_zi(self) -> bool:
+        return bool(self.flags & FLAG_NEXT_DAY_ZI)
+
+    @property
+    def provided(self) -> bool:
+        return bool(self.flags & FLAG_PROVIDED)
+
+    @property
+    def true_solar(self) -> bool:
+        return bool(self.flags & FLAG_TRUE_SOLAR)
+
+    @property
+    def stems(self) -> Tuple[int, ...]:
+        """四柱天干序号"""
+        return self.indices[0::2]
+
+    @property
+    def branches(self) -> Tuple[int, ...]:
+        """四柱地支序号"""
+        return self.indices[1::2]
+
+    @property
+    def day_master(self) -> str:
+        """日主（日干）"""
+        return TIANGAN[self.indices[4]]
+
+    @property
+    def pillars(self) -> Tuple[str, ...]:
+        """四柱干支文字"""
+        return tuple(TIANGAN[self.indices[i]] + DIZHI[self.indices[i + 1]] for i in range(0, 8, 2))
+
+    @property
+    def key(self) -> int:
+        """紧凑整数键：每个序号4位，共32位"""
+        value = 0
+        for index in self.indices:
+            value = (value << 4) | index
+        return value
+
+    def elements(self) -> Tuple[Tuple[str, ...], Tuple[str, ...]]:
+        """四柱天干、地支的五行"""
+        return (tuple(WUXING_TG[TIANGAN[i]] for i in self.stems),
+                tuple(WUXING_DZ[DIZHI[i]] for i in self.branches))
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, BaziChart):
+            return NotImplemented
+        return self.indices == other.indices and self.flags == other.flags
+
+    def __hash__(self) -> int:
+        return hash((self.key, self.flags))
+
+    def __str__(self) -> str:
+        return ''.join(self.pillars)
+
+    def __repr__(self) -> str:
+        return f"BaziChart('{self}', flags={self.flags})"
+
+    def __reduce__(self):
+        return (BaziChart, (self.indices, self.flags))
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+八字四柱本地排盘算法
+
+年柱以立春为界、月柱以"节"为界（查 solar_terms 预计算表），
+日柱按 1900-01-01 甲戌日推算，时柱按五鼠遁，23:00 起为次日子时。
+给出出生地经度时，日柱、时柱改按真太阳时计算（节气交节是绝对时刻，年柱、月柱仍按北京时间比较）。
+"""
+
+from datetime import date, datetime
+from typing import Optional, Tuple
+
+from agent_project.tools.solar_terms import solar_year_and_month
+from agent_project.tools.solar_time import true_solar_time
+
+# 天干地支数组
+TIANGAN = ['甲', '乙', '丙', '丁', '戊', '己', '庚', '辛', '壬', '癸']
+DIZHI = ['子', '丑', '寅', '卯', '辰', '巳', '午', '未', '申', '酉', '戌', '亥']
+
+# 五行对应
+WUXING_TG = {'甲': '木', '乙': '木', '丙': '火', '丁': '火', '戊': '土',
+             '己': '土', '庚': '金', '辛': '金', '壬': '水', '癸': '水'}
+WUXING_DZ = {'子': '水', '丑': '土', '寅': '木', '卯': '木', '辰': '土', '巳': '火',
+             '午': '火', '未': '土', '申': '金', '酉': '金', '戌': '土', '亥': '水'}
+
+# 日柱基准：1900年1月1日为甲戌日
+DAY_BASE_ORDINAL = date(1900, 1, 1).toordinal()
+DAY_TG_OFFSET = 0
+DAY_DZ_OFFSET = 10
+
+
+def year_stem_branch(solar_year: int) -> Tuple[int, int]:
+    """干支纪年的天干、地支序号"""
+    return (solar_year - 4) % 10, (solar_year - 4) % 12
+
+
+def month_stem(year_tg_index: int, month_dz_index: int) -> int:
+    """五虎遁：由年干和月支推月干（甲己之年丙作首）"""
+    return (year_tg_index * 2 + 2 + (month_dz_index - 2) % 12) % 10
+
+
+def day_stem_branch(ordinal: int) -> Tuple[int, int]:
+    """由公历日序数推日柱天干、地支序号"""
+    days_diff = ordinal - DAY_BASE_ORDINAL
+    return (days_diff + DAY_TG_OFFSET) % 10, (days_diff + DAY_DZ_OFFSET) % 12
+
+
+def hour_stem_branch(day_tg_index: int, hour: int) -> Tuple[int, int]:
+    """五鼠遁：由日干和小时推时柱（hour 为已处理子时跨日后的小时）"""
+    hour_dz_index = (hour + 1) // 2 % 12
+    return (day_tg_index * 2 + hour_dz_index) % 10, hour_dz_index
+
+
+def day_hour_moment(year: int, month: int, day: int, hour: int, minute: int = 0,
+                    longitude: Optional[float] = None) -> datetime:
+    """用于排日柱、时柱的时刻：给出经度时为真太阳时，否则为北京时间"""
+    moment = datetime(year, month, day, hour, minute)
+    if longitude is not None:
+        moment = true_solar_time(moment, longitude)
+    return moment
+
+
+def compute_pillars(year: int, month: int, day: int, hour: int, minute: int = 0,
+                    longitude: Optional[float] = None) -> Tuple[int, ...]:
+    """
+    计算四柱天干地支序号
+
+    返回 (年干, 年支, 月干, 月支, 日干, 日支, 时干, 时支) 八个序号。
+    年柱、月柱按出生时刻与节气交节时刻比较；日柱在 23:00 以后按次日计算。
+    longitude 为出生地经度，给出时日柱、时柱按真太阳时计算。
+    """
+    solar_year, month_dz_index = solar_year_and_month(year, month, day, hour, minute)
+    year_tg_index, year_dz_index = year_stem_branch(solar_year)
+    month_tg_index = month_stem(year_tg_index, month_dz_index)
+
+    local = day_hour_moment(year, month, day, hour, minute, longitude)
+    # 处理子时跨日问题（23:00-23:59属于下一日的子时）
+    ordinal = local.toordinal()
+    if local.hour == 23:
+        ordinal += 1
+    day_tg_index, day_dz_index = day_stem_branch(ordinal)
+    hour_tg_index, hour_dz_index = hour_stem_branch(day_tg_index, local.hour)
+
+    return (year_tg_index, year_dz_index, month_tg_index, month_dz_index,
+            day_tg_index, day_dz_index, hour_tg_index, hour_dz_index)
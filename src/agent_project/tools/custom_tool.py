@@ -1,7 +1,12 @@
 from crewai.tools import BaseTool
-from typing import Type, Optional
+from typing import Dict, NamedTuple, Type, Optional, Union
 from pydantic import BaseModel, Field
-from datetime import date
+
+from agent_project.tools.bazi_chart import BaziChart, FLAG_NEXT_DAY_ZI, PILLAR_NAMES
+from agent_project.tools.bazi_engine import day_hour_moment
+from agent_project.tools.lunar_calendar import lunar_to_solar
+from agent_project.tools.solar_time import lookup_place, place_longitude
+from agent_project.tools.wuxing_engine import ELEMENTS, day_master_strength, score_chart, season_states
 
 
 class BaziCalculatorInput(BaseModel):
@@ -15,6 +20,86 @@ class BaziCalculatorInput(BaseModel):
     gender: str = Field(..., description="性别：男/女")
     birth_place: str = Field("", description="出生地点")
     provided_bazi: Optional[str] = Field(None, description="用户提供的准确八字（如：癸未甲寅戊午壬子）")
+    lunar: bool = Field(False, description="出生年月日是否为农历")
+    leap_month: bool = Field(False, description="农历出生月份是否为闰月")
+
+
+def render_bazi_report(chart: BaziChart, name: str, birth_year: int, birth_month: int, birth_day: int,
+                       birth_hour: int, birth_minute: int = 0, gender: str = "", birth_place: str = "") -> str:
+    """将命盘渲染为排盘报告文本"""
+    # 真太阳时说明
+    place = lookup_place(birth_place) if chart.true_solar else None
+    solar_note = ""
+    local_hour, local_minute = birth_hour, birth_minute
+    if place is not None:
+        local = day_hour_moment(birth_year, birth_month, birth_day, birth_hour, birth_minute, place.longitude)
+        local_hour, local_minute = local.hour, local.minute
+        solar_note = f"，真太阳时{local.month}月{local.day}日{local:%H:%M}"
+
+    # 处理子时说明
+    time_note = ""
+    if chart.next_day_zi:
+        time_note = f"（注：{local_hour}:{local_minute:02d}属于次日子时）"
+    if solar_note:
+        time_note = f"（北京时间{solar_note}）{time_note}"
+
+    stem_elements, branch_elements = chart.elements()
+    pillar_lines = []
+    for i, (pillar_name, zhu) in enumerate(zip(PILLAR_NAMES, chart.pillars)):
+        line = f"{pillar_name}：{zhu} (天干{zhu[0]}属{stem_elements[i]}，地支{zhu[1]}属{branch_elements[i]})"
+        if i == 2:
+            line += " → 日主"
+        pillar_lines.append(line)
+    pillars_text = "\n".join(pillar_lines)
+
+    if chart.provided:
+        title = "八字四柱（用户提供的准确八字）："
+        note = "注：此为用户提供的专业八字，已考虑节气、真太阳时等因素。"
+    elif place is not None:
+        title = "八字四柱："
+        note = (f"注：年柱、月柱已按节气交节时刻（精确到分钟）划分；日柱、时柱按出生地"
+                f"{place.city or place.province}（东经{place.longitude:.2f}°）的真太阳时计算。")
+    else:
+        title = "八字四柱："
+        note = "注：年柱、月柱已按节气交节时刻（精确到分钟）划分，出生时间按北京时间计算，未做真太阳时校正。"
+
+    return f"""
+八字排盘结果：
+================
+姓名：{name}
+性别：{gender}
+出生时间：{birth_year}年{birth_month}月{birth_day}日{birth_hour}时{birth_minute:02d}分{time_note}
+出生地点：{birth_place}
+
+{title}
+{pillars_text}
+
+五行统计：
+天干：{' '.join(stem_elements)}
+地支：{' '.join(branch_elements)}
+
+{note}
+"""
+
+
+class BaziReport(NamedTuple):
+    """
+    排盘工具的结构化结果：命盘与出生信息
+
+    只在交给智能体时（crewAI 对工具结果取 str）渲染为排盘报告文本。
+    """
+    chart: BaziChart
+    name: str
+    birth_year: int
+    birth_month: int
+    birth_day: int
+    birth_hour: int
+    birth_minute: int = 0
+    gender: str = ""
+    birth_place: str = ""
+
+    def __str__(self) -> str:
+        return render_bazi_report(*self)
 
 
 class BaziCalculatorTool(BaseTool):
@@ -27,125 +112,80 @@ class BaziCalculatorTool(BaseTool):
     )
     args_schema: Type[BaseModel] = BaziCalculatorInput
 
+    def calculate(self, birth_year: int, birth_month: int, birth_day: int, birth_hour: int,
+                  birth_minute: int = 0, provided_bazi: Union[str, BaziChart, None] = None,
+                  birth_place: str = "") -> BaziChart:
+        """计算命盘，不做文本渲染；能识别出生地时日柱、时柱按真太阳时"""
+        # 如果用户提供了准确的八字，优先使用
+        if isinstance(provided_bazi, BaziChart):
+            return provided_bazi
+        if provided_bazi:
+            try:
+                # 处理子时跨日问题（23:00-23:59属于下一日的子时）
+                return BaziChart.from_string(provided_bazi, FLAG_NEXT_DAY_ZI if birth_hour == 23 else 0)
+            except ValueError:
+                pass
+
+        # 如果没有提供八字或八字无效，则进行计算
+        # 年柱以立春为界、月柱以节气交节时刻为界，查预计算的节气表
+        return BaziChart.from_birth(birth_year, birth_month, birth_day, birth_hour, birth_minute,
+                                    place_longitude(birth_place))
+
     def _run(self, name: str, birth_year: int, birth_month: int, birth_day: int, birth_hour: int,
-             birth_minute: int = 0, gender: str = "", birth_place: str = "", provided_bazi: Optional[str] = None) -> str:
-        """计算生辰八字"""
+             birth_minute: int = 0, gender: str = "", birth_place: str = "", provided_bazi: Optional[str] = None,
+             lunar: bool = False, leap_month: bool = False) -> Union[BaziReport, str]:
+        """计算生辰八字，出错时返回错误说明"""
         try:
-            # 天干地支数组
-            tiangan = ['甲', '乙', '丙', '丁', '戊', '己', '庚', '辛', '壬', '癸']
-            dizhi = ['子', '丑', '寅', '卯', '辰', '巳', '午', '未', '申', '酉', '戌', '亥']
-
-            # 五行对应
-            wuxing_tg = {'甲': '木', '乙': '木', '丙': '火', '丁': '火', '戊': '土',
-                        '己': '土', '庚': '金', '辛': '金', '壬': '水', '癸': '水'}
-            wuxing_dz = {'子': '水', '丑': '土', '寅': '木', '卯': '木', '辰': '土', '巳': '火',
-                        '午': '火', '未': '土', '申': '金', '酉': '金', '戌': '土', '亥': '水'}
-
-            # 如果用户提供了准确的八字，优先使用
-            if provided_bazi and len(provided_bazi) == 8:
-                year_zhu = provided_bazi[0:2]
-                month_zhu = provided_bazi[2:4]
-                day_zhu = provided_bazi[4:6]
-                hour_zhu = provided_bazi[6:8]
-
-                # 验证八字的有效性
-                valid_chars = set(tiangan + dizhi)
-                if all(char in valid_chars for char in provided_bazi):
-                    # 处理子时跨日问题（23:00-23:59属于下一日的子时）
-                    actual_birth_info = ""
-                    if birth_hour == 23 and birth_minute >= 0:
-                        actual_birth_info = f"（注：{birth_hour}:{birth_minute:02d}属于次日子时）"
-
-                    result = f"""
-八字排盘结果：
-================
-姓名：{name}
-性别：{gender}
-出生时间：{birth_year}年{birth_month}月{birth_day}日{birth_hour}时{birth_minute:02d}分{actual_birth_info}
-出生地点：{birth_place}
+            if lunar:
+                # 农历日期先在本地换算为公历
+                solar = lunar_to_solar(birth_year, birth_month, birth_day, leap_month)
+                birth_year, birth_month, birth_day = solar.year, solar.month, solar.day
+            chart = self.calculate(birth_year, birth_month, birth_day, birth_hour, birth_minute, provided_bazi,
+                                   birth_place)
+            return BaziReport(chart, name, birth_year, birth_month, birth_day, birth_hour,
+                              birth_minute, gender, birth_place)
 
-八字四柱（用户提供的准确八字）：
-年柱：{year_zhu} (天干{year_zhu[0]}属{wuxing_tg[year_zhu[0]]}，地支{year_zhu[1]}属{wuxing_dz[year_zhu[1]]})
-月柱：{month_zhu} (天干{month_zhu[0]}属{wuxing_tg[month_zhu[0]]}，地支{month_zhu[1]}属{wuxing_dz[month_zhu[1]]})
-日柱：{day_zhu} (天干{day_zhu[0]}属{wuxing_tg[day_zhu[0]]}，地支{day_zhu[1]}属{wuxing_dz[day_zhu[1]]}) → 日主
-时柱：{hour_zhu} (天干{hour_zhu[0]}属{wuxing_tg[hour_zhu[0]]}，地支{hour_zhu[1]}属{wuxing_dz[hour_zhu[1]]})
+        except Exception as e:
+            return f"八字计算出错：{str(e)}"
 
-五行统计：
-天干：{wuxing_tg[year_zhu[0]]} {wuxing_tg[month_zhu[0]]} {wuxing_tg[day_zhu[0]]} {wuxing_tg[hour_zhu[0]]}
-地支：{wuxing_dz[year_zhu[1]]} {wuxing_dz[month_zhu[1]]} {wuxing_dz[day_zhu[1]]} {wuxing_dz[hour_zhu[1]]}
 
-注：此为用户提供的专业八字，已考虑节气、真太阳时等因素。
-"""
-                    return result
-
-            # 如果没有提供八字或八字无效，则进行计算
-            # 处理子时跨日问题
-            calc_year = birth_year
-            calc_month = birth_month
-            calc_day = birth_day
-            calc_hour = birth_hour
-
-            if birth_hour == 23:  # 23:00-23:59属于下一日的子时
-                calc_hour = 0  # 子时
-                # 日期加一天
-                birth_date = date(birth_year, birth_month, birth_day)
-                next_day = date.fromordinal(birth_date.toordinal() + 1)
-                calc_year = next_day.year
-                calc_month = next_day.month
-                calc_day = next_day.day
-
-            # 计算年柱
-            year_tg_index = (calc_year - 4) % 10
-            year_dz_index = (calc_year - 4) % 12
-            year_zhu = f"{tiangan[year_tg_index]}{dizhi[year_dz_index]}"
-
-            # 计算月柱（简化算法，实际需要考虑节气）
-            month_tg_index = (year_tg_index * 2 + calc_month) % 10
-            month_dz_index = (calc_month + 1) % 12
-            month_zhu = f"{tiangan[month_tg_index]}{dizhi[month_dz_index]}"
-
-            # 计算日柱（使用简化的公式）
-            birth_date = date(calc_year, calc_month, calc_day)
-            base_date = date(1900, 1, 1)  # 基准日期
-            days_diff = (birth_date - base_date).days
-            day_tg_index = (days_diff + 9) % 10  # 1900年1月1日是庚子日
-            day_dz_index = (days_diff + 11) % 12
-            day_zhu = f"{tiangan[day_tg_index]}{dizhi[day_dz_index]}"
-
-            # 计算时柱
-            hour_dz_index = (calc_hour + 1) // 2 % 12
-            hour_tg_index = (day_tg_index * 2 + hour_dz_index) % 10
-            hour_zhu = f"{tiangan[hour_tg_index]}{dizhi[hour_dz_index]}"
-
-            # 处理子时说明
-            time_note = ""
-            if birth_hour == 23:
-                time_note = f"（注：{birth_hour}:{birth_minute:02d}属于次日子时）"
-
-            result = f"""
-八字排盘结果：
-================
-姓名：{name}
-性别：{gender}
-出生时间：{birth_year}年{birth_month}月{birth_day}日{birth_hour}时{birth_minute:02d}分{time_note}
-出生地点：{birth_place}
+def render_wuxing_report(chart: BaziChart) -> str:
+    """将命盘的五行评分渲染为分析报告文本"""
+    scores = score_chart(chart)
+    states = season_states(chart)
+    total = sum(scores)
 
-八字四柱：
-年柱：{year_zhu} (天干{tiangan[year_tg_index]}属{wuxing_tg[tiangan[year_tg_index]]}，地支{dizhi[year_dz_index]}属{wuxing_dz[dizhi[year_dz_index]]})
-月柱：{month_zhu} (天干{tiangan[month_tg_index]}属{wuxing_tg[tiangan[month_tg_index]]}，地支{dizhi[month_dz_index]}属{wuxing_dz[dizhi[month_dz_index]]})
-日柱：{day_zhu} (天干{tiangan[day_tg_index]}属{wuxing_tg[tiangan[day_tg_index]]}，地支{dizhi[day_dz_index]}属{wuxing_dz[dizhi[day_dz_index]]}) → 日主
-时柱：{hour_zhu} (天干{tiangan[hour_tg_index]}属{wuxing_tg[tiangan[hour_tg_index]]}，地支{dizhi[hour_dz_index]}属{wuxing_dz[dizhi[hour_dz_index]]})
+    analysis = "五行平衡分析：\n================\n"
+    analysis += f"命盘：{chart}（天干计1分，地支按藏干分配1分，再乘月令旺相休囚死系数）\n"
 
-五行统计：
-天干：{wuxing_tg[tiangan[year_tg_index]]} {wuxing_tg[tiangan[month_tg_index]]} {wuxing_tg[tiangan[day_tg_index]]} {wuxing_tg[tiangan[hour_tg_index]]}
-地支：{wuxing_dz[dizhi[year_dz_index]]} {wuxing_dz[dizhi[month_dz_index]]} {wuxing_dz[dizhi[day_dz_index]]} {wuxing_dz[dizhi[hour_dz_index]]}
+    for element, score, state in zip(ELEMENTS, scores, states):
+        percentage = (score / total) * 100
+        analysis += f"{element}：{score:.2f}分 ({percentage:.1f}%) [{state}]"
 
-注：此为基础排盘结果，实际应用中需要考虑节气、真太阳时等因素。
-"""
-            return result
+        if percentage > 30:
+            analysis += " - 偏旺"
+        elif percentage < 10:
+            analysis += " - 偏弱"
+        else:
+            analysis += " - 平衡"
+        analysis += "\n"
 
-        except Exception as e:
-            return f"八字计算出错：{str(e)}"
+    strength = day_master_strength(chart, scores)
+    day_element = ELEMENTS[chart.indices[4] // 2]
+    analysis += (f"日主：{chart.day_master}{day_element}，同党（同我、生我）力量占比{strength * 100:.1f}%"
+                 f"（{'偏强' if strength > 0.5 else '偏弱'}）\n")
+
+    # 给出建议
+    analysis += "\n五行建议：\n"
+    weak_elements = [e for e, c in zip(ELEMENTS, scores) if c == 0]
+    strong_elements = [e for e, c in zip(ELEMENTS, scores) if (c / total) > 0.3]
+
+    if weak_elements:
+        analysis += f"缺失五行：{', '.join(weak_elements)}，建议在生活中适当补充。\n"
+    if strong_elements:
+        analysis += f"过旺五行：{', '.join(strong_elements)}，建议适当克制。\n"
+
+    return analysis
 
 
 class WuxingAnalysisInput(BaseModel):
@@ -161,52 +201,27 @@ class WuxingAnalysisTool(BaseTool):
     )
     args_schema: Type[BaseModel] = WuxingAnalysisInput
 
-    def _run(self, bazi_result: str) -> str:
+    def analyze(self, chart: BaziChart) -> Dict[str, float]:
+        """计算命盘五行力量（含地支藏干与月令系数）"""
+        return dict(zip(ELEMENTS, score_chart(chart)))
+
+    def _run(self, bazi_result: Union[str, BaziChart, BaziReport]) -> str:
         """分析五行平衡"""
         try:
-            # 确保输入是正确的字符串格式
-            if isinstance(bazi_result, bytes):
-                bazi_result = bazi_result.decode('utf-8')
-
-            # 从八字结果中提取五行信息
-            lines = bazi_result.split('\n')
-            wuxing_count = {'金': 0, '木': 0, '水': 0, '火': 0, '土': 0}
-
-            # 统计五行出现次数
-            for line in lines:
-                for element in wuxing_count.keys():
-                    wuxing_count[element] += line.count(element)
-
-            # 分析五行平衡
-            total = sum(wuxing_count.values())
-            if total == 0:
-                return "无法从八字结果中提取五行信息，请检查八字格式是否正确"
-
-            analysis = "五行平衡分析：\n================\n"
-
-            for element, count in wuxing_count.items():
-                percentage = (count / total) * 100
-                analysis += f"{element}：{count}个 ({percentage:.1f}%)"
-
-                if percentage > 30:
-                    analysis += " - 偏旺"
-                elif percentage < 10:
-                    analysis += " - 偏弱"
-                else:
-                    analysis += " - 平衡"
-                analysis += "\n"
-
-            # 给出建议
-            analysis += "\n五行建议：\n"
-            weak_elements = [e for e, c in wuxing_count.items() if c == 0]
-            strong_elements = [e for e, c in wuxing_count.items() if (c / total) > 0.3]
-
-            if weak_elements:
-                analysis += f"缺失五行：{', '.join(weak_elements)}，建议在生活中适当补充。\n"
-            if strong_elements:
-                analysis += f"过旺五行：{', '.join(strong_elements)}，建议适当克制。\n"
-
-            return analysis
+            if isinstance(bazi_result, BaziReport):
+                chart = bazi_result.chart
+            elif isinstance(bazi_result, BaziChart):
+                chart = bazi_result
+            else:
+                # 确保输入是正确的字符串格式
+                if isinstance(bazi_result, bytes):
+                    bazi_result = bazi_result.decode('utf-8')
+                # 文本输入只在此处解析一次，之后统一使用命盘对象
+                chart = BaziChart.parse(bazi_result)
+                if chart is None:
+                    return "无法从八字结果中提取五行信息，请检查八字格式是否正确"
+
+            return render_wuxing_report(chart)
 
         except Exception as e:
             return f"五行分析出错：{str(e)}"
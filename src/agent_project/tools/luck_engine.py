@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+大运流年本地推算
+
+- 排运方向：阳年男命、阴年女命顺排，阴年男命、阳年女命逆排（年干按立春划分）
+- 起运岁数：顺排取出生到下一个"节"、逆排取上一个"节"到出生的时长，三天折一年
+- 大运：自月柱起按六十甲子顺/逆推，每步十年
+- 流年：按公历年份取干支，并标注与原局四柱、当运大运的天干合冲、地支六合六冲
+"""
+
+from bisect import bisect_right
+from datetime import datetime, timedelta
+from typing import List, NamedTuple, Optional, Sequence, Tuple
+
+from agent_project.tools.bazi_chart import PILLAR_NAMES, BaziChart
+from agent_project.tools.bazi_engine import DIZHI, TIANGAN, year_stem_branch
+from agent_project.tools.relations import BRANCH_RELATIONS, REL_CLASH, REL_COMBINE, STEM_RELATIONS
+from agent_project.tools.solar_terms import SOLAR_TERM_NAMES, term_datetime, term_minutes, to_minutes
+
+# 排出的大运步数
+LUCK_STEPS = 8
+
+# 起运折算：三天（4320分钟）折一年
+MINUTES_PER_LUCK_YEAR = 3 * 1440
+DAYS_PER_YEAR = 365.2422
+
+# "节"在节气表中的序号（小寒、立春、惊蛰……大雪）
+JIE_INDICES = tuple(range(0, 24, 2))
+
+
+class LuckPillar(NamedTuple):
+    """一步大运"""
+    stem: int
+    branch: int
+    start_age: float
+    start_year: int
+
+    @property
+    def ganzhi(self) -> str:
+        return TIANGAN[self.stem] + DIZHI[self.branch]
+
+
+class LuckCycle(NamedTuple):
+    """排运结果"""
+    forward: bool
+    # 计算起运用的节气：(名称, 交节时刻)
+    term: Tuple[str, datetime]
+    start_age: float
+    start_date: datetime
+    pillars: Tuple[LuckPillar, ...]
+
+    def pillar_for_year(self, year: int) -> Optional[LuckPillar]:
+        """某年所行的大运，尚未起运返回 None"""
+        current = None
+        for pillar in self.pillars:
+            if pillar.start_year <= year:
+                current = pillar
+        return current
+
+
+def cycle_index(stem: int, branch: int) -> int:
+    """干支在六十甲子中的序号（甲子为0）"""
+    return (6 * stem - 5 * branch) % 60
+
+
+def is_forward(year_stem: int, gender: str) -> bool:
+    """大运是否顺排"""
+    if gender not in ('男', '女'):
+        raise ValueError(f"排大运需要性别（男/女），收到：{gender}")
+    return (year_stem % 2 == 0) == (gender == '男')
+
+
+def _jie_around(year: int, t: int) -> Tuple[Tuple[int, int], Tuple[int, int]]:
+    """出生时刻前后最近的"节"，返回 ((年份, 节气序号) 上一个, 下一个)"""
+    keys = [(y, i) for y in (year - 1, year, year + 1) for i in JIE_INDICES]
+    times = [term_minutes(y, i) for y, i in keys]
+    position = bisect_right(times, t)
+    return keys[position - 1], keys[position]
+
+
+def luck_cycle(chart: BaziChart, gender: str, year: int, month: int, day: int,
+               hour: int, minute: int = 0, steps: int = LUCK_STEPS) -> LuckCycle:
+    """
+    排大运
+
+    chart 提供年干（定顺逆）和月柱（大运起点）；出生时间用于计算起运岁数。
+    """
+    forward = is_forward(chart.indices[0], gender)
+    t = to_minutes(year, month, day, hour, minute)
+    previous, following = _jie_around(year, t)
+    term_year, term_index = following if forward else previous
+    span = abs(term_minutes(term_year, term_index) - t)
+
+    start_age = span / MINUTES_PER_LUCK_YEAR
+    start_date = datetime(year, month, day, hour, minute) + timedelta(days=start_age * DAYS_PER_YEAR)
+
+    month_cycle = cycle_index(chart.indices[2], chart.indices[3])
+    direction = 1 if forward else -1
+    pillars = []
+    for step in range(steps):
+        n = (month_cycle + direction * (step + 1)) % 60
+        pillars.append(LuckPillar(n % 10, n % 12, start_age + 10 * step, start_date.year + 10 * step))
+
+    term = (SOLAR_TERM_NAMES[term_index], term_datetime(term_year, term_index))
+    return LuckCycle(forward, term, start_age, start_date, tuple(pillars))
+
+
+def _combine_or_clash(mask: int) -> Optional[str]:
+    if mask & REL_COMBINE:
+        return '合'
+    if mask & REL_CLASH:
+        return '冲'
+    return None
+
+
+def stem_relation(a: int, b: int) -> Optional[str]:
+    """天干五合（甲己、乙庚……）或相冲（甲庚、乙辛、丙壬、丁癸）"""
+    return _combine_or_clash(STEM_RELATIONS[a][b])
+
+
+def branch_relation(a: int, b: int) -> Optional[str]:
+    """地支六合（子丑、寅亥……）或六冲（子午、丑未……）"""
+    return _combine_or_clash(BRANCH_RELATIONS[a][b])
+
+
+def pillar_relations(stem: int, branch: int, targets: Sequence[Tuple[str, int, int]]) -> List[str]:
+    """
+    一柱干支与若干目标柱的合冲关系
+
+    targets 为 (名称, 天干序号, 地支序号) 列表，返回如 "丙壬冲（时干）"、"午子冲（时支）" 的描述。
+    """
+    found = []
+    for name, target_stem, target_branch in targets:
+        relation = stem_relation(stem, target_stem)
+        if relation:
+            found.append(f"{TIANGAN[stem]}{TIANGAN[target_stem]}{relation}（{name}干）")
+        relation = branch_relation(branch, target_branch)
+        if relation:
+            found.append(f"{DIZHI[branch]}{DIZHI[target_branch]}{relation}（{name}支）")
+    return found
+
+
+def natal_targets(chart: BaziChart) -> List[Tuple[str, int, int]]:
+    """原局四柱作为合冲判断的目标（名称取"年""月""日""时"）"""
+    return [(PILLAR_NAMES[i][0], chart.indices[2 * i], chart.indices[2 * i + 1]) for i in range(4)]
+
+
+def annual_pillar(year: int) -> Tuple[int, int]:
+    """流年干支序号"""
+    return year_stem_branch(year)
+
+
+def _age_text(age: float) -> str:
+    years = int(age)
+    months = int(round((age - years) * 12))
+    if months == 12:
+        years, months = years + 1, 0
+    return f"{years}岁{months}个月" if months else f"{years}岁"
+
+
+def render_luck_report(chart: BaziChart, cycle: Optional[LuckCycle], years: Sequence[int]) -> str:
+    """将大运与流年渲染为文本，cycle 为 None 时（缺少性别等）只列流年"""
+    lines = ["大运流年（本地推算）：", "================"]
+    if cycle is not None:
+        yang_year = chart.indices[0] % 2 == 0
+        gender = '男' if cycle.forward == yang_year else '女'
+        term_name, term_time = cycle.term
+        lines.append(
+            f"排运：{'阳' if yang_year else '阴'}年{gender}命{'顺' if cycle.forward else '逆'}排，"
+            f"{'出生至下一节' if cycle.forward else '上一节至出生'}（{term_name} {term_time:%Y-%m-%d %H:%M}）"
+            f"按三天折一年，{_age_text(cycle.start_age)}起运（约{cycle.start_date:%Y年%m月}）"
+        )
+        lines.append("大运：")
+        for pillar in cycle.pillars:
+            age = int(pillar.start_age)
+            lines.append(f"  {pillar.ganzhi}  {age}-{age + 9}岁（{pillar.start_year}-{pillar.start_year + 9}年）")
+
+    targets = natal_targets(chart)
+    lines.append("流年：")
+    for year in years:
+        stem, branch = annual_pillar(year)
+        line = f"  {year} {TIANGAN[stem]}{DIZHI[branch]}年"
+        current = cycle.pillar_for_year(year) if cycle is not None else None
+        if current is not None:
+            line += f"，行{current.ganzhi}运"
+        pillar_targets = targets + ([('运', current.stem, current.branch)] if current is not None else [])
+        relations = pillar_relations(stem, branch, pillar_targets)
+        line += "：" + ("、".join(relations) if relations else "与原局、大运无合冲")
+        lines.append(line)
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,328 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+农历（夏历）与公历互换（1900–2100）
+
+每个农历年用一个整数按位打包：
+- 第 15 位到第 4 位依次为正月到腊月，置 1 表示大月（30天），否则小月（29天）
+- 低 4 位为闰月月份，0 表示无闰月
+- 第 16 位为闰月的大小
+导入时由此展开每年正月初一的日序号和各月的起始偏移，换算只需下标查找和加减，
+批量接口（整列换算）用 NumPy 在同一张月表上做 searchsorted。
+
+表格按东经120°（北京时间）的朔日与中气推算，规则为无中气之月置闰。
+重新生成（需要安装 ephem）：
+    python -m agent_project.tools.lunar_calendar
+"""
+
+import re
+from bisect import bisect_right
+from datetime import date
+from typing import List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+MIN_YEAR = 1900
+MAX_YEAR = 2100
+
+# 农历1900年正月初一
+BASE_DATE = date(1900, 1, 31)
+
+LUNAR_INFO = (
+    0x04bd8, 0x04ae0, 0x0a570, 0x054d5, 0x0d260, 0x0d950, 0x16554, 0x056a0, 0x09ad0, 0x055d2,  # 1900
+    0x04ae0, 0x0a5b6, 0x0a4d0, 0x0d250, 0x1d295, 0x0b550, 0x056a0, 0x0ada2, 0x095b0, 0x14977,  # 1910
+    0x049b0, 0x0a4b0, 0x0b4b5, 0x06a50, 0x06d40, 0x1ab54, 0x02b60, 0x09570, 0x052f2, 0x04970,  # 1920
+    0x06566, 0x0d4a0, 0x0ea50, 0x16a95, 0x05ad0, 0x02b60, 0x186e3, 0x092e0, 0x1c8d7, 0x0c950,  # 1930
+    0x0d4a0, 0x1d8a6, 0x0b550, 0x056a0, 0x1a5b4, 0x025d0, 0x092d0, 0x0d2b2, 0x0a950, 0x0b557,  # 1940
+    0x06ca0, 0x0b550, 0x15355, 0x04da0, 0x0a5b0, 0x14573, 0x052b0, 0x0a9a8, 0x0e950, 0x06aa0,  # 1950
+    0x0aea6, 0x0ab50, 0x04b60, 0x0aae4, 0x0a570, 0x05260, 0x0f263, 0x0d950, 0x05b57, 0x056a0,  # 1960
+    0x096d0, 0x04dd5, 0x04ad0, 0x0a4d0, 0x0d4d4, 0x0d250, 0x0d558, 0x0b540, 0x0b6a0, 0x195a6,  # 1970
+    0x095b0, 0x049b0, 0x0a974, 0x0a4b0, 0x0b27a, 0x06a50, 0x06d40, 0x0af46, 0x0ab60, 0x09570,  # 1980
+    0x04af5, 0x04970, 0x064b0, 0x074a3, 0x0ea50, 0x06b58, 0x05ac0, 0x0ab60, 0x096d5, 0x092e0,  # 1990
+    0x0c960, 0x0d954, 0x0d4a0, 0x0da50, 0x07552, 0x056a0, 0x0abb7, 0x025d0, 0x092d0, 0x0cab5,  # 2000
+    0x0a950, 0x0b4a0, 0x0baa4, 0x0ad50, 0x055d9, 0x04ba0, 0x0a5b0, 0x15176, 0x052b0, 0x0a930,  # 2010
+    0x07954, 0x06aa0, 0x0ad50, 0x05b52, 0x04b60, 0x0a6e6, 0x0a4e0, 0x0d260, 0x0ea65, 0x0d530,  # 2020
+    0x05aa0, 0x076a3, 0x096d0, 0x04afb, 0x04ad0, 0x0a4d0, 0x1d0b6, 0x0d250, 0x0d520, 0x0dd45,  # 2030
+    0x0b5a0, 0x056d0, 0x055b2, 0x049b0, 0x0a577, 0x0a4b0, 0x0aa50, 0x1b255, 0x06d20, 0x0ada0,  # 2040
+    0x14b63, 0x09370, 0x049f8, 0x04970, 0x064b0, 0x168a6, 0x0ea50, 0x06aa0, 0x1a6c4, 0x0aae0,  # 2050
+    0x092e0, 0x0d2e3, 0x0c960, 0x0d557, 0x0d4a0, 0x0da50, 0x05d55, 0x056a0, 0x0a6d0, 0x055d4,  # 2060
+    0x052d0, 0x0a9b8, 0x0a950, 0x0b4a0, 0x0b6a6, 0x0ad50, 0x055a0, 0x0aba4, 0x0a5b0, 0x052b0,  # 2070
+    0x0b273, 0x06930, 0x07337, 0x06aa0, 0x0ad50, 0x14b55, 0x04b60, 0x0a570, 0x054e4, 0x0d160,  # 2080
+    0x0e968, 0x0d520, 0x0daa0, 0x16aa6, 0x056d0, 0x04ae0, 0x0a9d4, 0x0a2d0, 0x0d150, 0x0f252,  # 2090
+    0x0d520,  # 2100
+)
+
+MONTH_NAMES = ('正', '二', '三', '四', '五', '六', '七', '八', '九', '十', '冬', '腊')
+_DAY_TENS = ('初', '十', '廿', '三')
+_DIGITS = '一二三四五六七八九十'
+
+# numpy datetime64[D] 以 1970-01-01 为 0
+_UNIX_EPOCH_ORDINAL = 719163
+
+
+class LunarDate(NamedTuple):
+    """农历日期；leap 为 True 表示闰月"""
+    year: int
+    month: int
+    day: int
+    leap: bool = False
+
+    def __str__(self) -> str:
+        return f"{self.year}年{'闰' if self.leap else ''}{MONTH_NAMES[self.month - 1]}月{day_name(self.day)}"
+
+
+def day_name(day: int) -> str:
+    """农历日名：初一……初十、十一……二十、廿一……三十"""
+    if day == 10:
+        return '初十'
+    if day == 20:
+        return '二十'
+    if day == 30:
+        return '三十'
+    return _DAY_TENS[day // 10] + _DIGITS[day % 10 - 1]
+
+
+def leap_month(year: int) -> int:
+    """该年闰几月，无闰月返回 0"""
+    return LUNAR_INFO[year - MIN_YEAR] & 0xf
+
+
+def year_months(year: int) -> List[Tuple[int, bool, int]]:
+    """该年各月依次为 (月份, 是否闰月, 天数)"""
+    info = LUNAR_INFO[year - MIN_YEAR]
+    leap = info & 0xf
+    months = []
+    for month in range(1, 13):
+        months.append((month, False, 30 if info & (0x8000 >> (month - 1)) else 29))
+        if month == leap:
+            months.append((month, True, 30 if info & 0x10000 else 29))
+    return months
+
+
+def _expand() -> Tuple[Tuple[int, ...], Tuple[Tuple[int, ...], ...]]:
+    """展开每年正月初一的日序号和各月相对正月初一的偏移（末项为全年天数）"""
+    year_starts = [BASE_DATE.toordinal()]
+    offsets = []
+    for year in range(MIN_YEAR, MAX_YEAR + 1):
+        running = [0]
+        for _, _, days in year_months(year):
+            running.append(running[-1] + days)
+        offsets.append(tuple(running))
+        year_starts.append(year_starts[-1] + running[-1])
+    return tuple(year_starts), tuple(offsets)
+
+
+# _YEAR_STARTS 比年份多一项，末项为农历2101年正月初一
+_YEAR_STARTS, _MONTH_OFFSETS = _expand()
+
+FIRST_DATE = BASE_DATE
+LAST_DATE = date.fromordinal(_YEAR_STARTS[-1] - 1)
+
+
+def _check_year(year: int) -> None:
+    if not (MIN_YEAR <= year <= MAX_YEAR):
+        raise ValueError(f"农历年份应在{MIN_YEAR}-{MAX_YEAR}之间")
+
+
+def _month_position(year: int, month: int, leap: bool) -> int:
+    """农历月在该年月序中的位置（闰月排在同名月之后）"""
+    if not (1 <= month <= 12):
+        raise ValueError("农历月份应在1-12之间")
+    leap_in_year = leap_month(year)
+    if leap and leap_in_year != month:
+        raise ValueError(f"农历{year}年没有闰{MONTH_NAMES[month - 1]}月")
+    return month - 1 + (leap_in_year != 0 and (month > leap_in_year or leap))
+
+
+def lunar_to_solar(year: int, month: int, day: int, leap: bool = False) -> date:
+    """农历 → 公历"""
+    _check_year(year)
+    position = _month_position(year, month, leap)
+    offsets = _MONTH_OFFSETS[year - MIN_YEAR]
+    length = offsets[position + 1] - offsets[position]
+    if not (1 <= day <= length):
+        raise ValueError(f"农历{year}年{'闰' if leap else ''}{MONTH_NAMES[month - 1]}月只有{length}天")
+    return date.fromordinal(_YEAR_STARTS[year - MIN_YEAR] + offsets[position] + day - 1)
+
+
+def solar_to_lunar(year: int, month: int, day: int) -> LunarDate:
+    """公历 → 农历"""
+    ordinal = date(year, month, day).toordinal()
+    if not (_YEAR_STARTS[0] <= ordinal < _YEAR_STARTS[-1]):
+        raise ValueError(f"日期超出农历表范围（{FIRST_DATE:%Y年%m月%d日}至{LAST_DATE:%Y年%m月%d日}）")
+    # 正月初一都在公历1-2月，农历年份只可能是公历年份或前一年
+    lunar_year = min(year, MAX_YEAR)
+    if ordinal < _YEAR_STARTS[lunar_year - MIN_YEAR]:
+        lunar_year -= 1
+    offsets = _MONTH_OFFSETS[lunar_year - MIN_YEAR]
+    offset = ordinal - _YEAR_STARTS[lunar_year - MIN_YEAR]
+    position = bisect_right(offsets, offset) - 1
+    day = offset - offsets[position] + 1
+    leap = leap_month(lunar_year)
+    # 闰月及其后各月的位置比月份多1
+    if leap and position >= leap:
+        return LunarDate(lunar_year, position, day, position == leap)
+    return LunarDate(lunar_year, position + 1, day)
+
+
+_NUMERALS = {'正': 1, '冬': 11, '腊': 12, '十一': 11, '十二': 12, **{c: i + 1 for i, c in enumerate(_DIGITS)}}
+_LUNAR_PATTERN = re.compile(
+    r'(\d{4})\s*年\s*(闰)?\s*(正|冬|腊|十[一二]?|[一二三四五六七八九]|\d{1,2})\s*月\s*'
+    r'(初[一二三四五六七八九十]|十[一二三四五六七八九]|二十|廿[一二三四五六七八九]|三十|\d{1,2})'
+)
+
+
+def _day_number(text: str) -> int:
+    if text.isdigit():
+        return int(text)
+    if text in ('初十', '二十', '三十'):
+        return {'初十': 10, '二十': 20, '三十': 30}[text]
+    return _DAY_TENS.index(text[0]) * 10 + _DIGITS.index(text[1]) + 1
+
+
+def parse_lunar_date(text: str) -> Optional[LunarDate]:
+    """解析 "2003年正月十三"、"农历2023年闰二月初一"、"1990年5月15日" 之类的农历日期，无法识别返回 None"""
+    match = _LUNAR_PATTERN.search(text or '')
+    if not match:
+        return None
+    year, leap, month, day = match.groups()
+    month_number = int(month) if month.isdigit() else _NUMERALS[month]
+    return LunarDate(int(year), month_number, _day_number(day), bool(leap))
+
+
+# 批量接口使用的月表：各农历月的起始日（datetime64[D] 的整数值）、所属年份、月份、是否闰月，
+# 以及各年的打包数据和正月在月表中的位置
+_MONTH_TABLE: Optional[Tuple[np.ndarray, ...]] = None
+
+
+def _month_table() -> Tuple[np.ndarray, ...]:
+    global _MONTH_TABLE
+    if _MONTH_TABLE is None:
+        starts, years, months, leaps, first_months = [], [], [], [], []
+        for year in range(MIN_YEAR, MAX_YEAR + 1):
+            year_start = _YEAR_STARTS[year - MIN_YEAR] - _UNIX_EPOCH_ORDINAL
+            first_months.append(len(starts))
+            for (month, leap, _), offset in zip(year_months(year), _MONTH_OFFSETS[year - MIN_YEAR]):
+                starts.append(year_start + offset)
+                years.append(year)
+                months.append(month)
+                leaps.append(leap)
+        # 末项为农历2101年正月初一，作为最后一个月的结束
+        starts.append(_YEAR_STARTS[-1] - _UNIX_EPOCH_ORDINAL)
+        _MONTH_TABLE = (np.array(starts, dtype=np.int64), np.array(years, dtype=np.int64),
+                        np.array(months, dtype=np.int64), np.array(leaps, dtype=bool),
+                        np.array(LUNAR_INFO, dtype=np.int64), np.array(first_months, dtype=np.int64))
+    return _MONTH_TABLE
+
+
+def lunar_to_solar_batch(years, months, days, leaps=None) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    批量农历 → 公历
+
+    参数为等长的整数数组，leaps 为是否闰月的布尔数组（缺省均非闰月）。
+    返回公历 (年, 月, 日) 三个 int64 数组，可直接传给 bazi_batch.compute_pillars_batch。
+    """
+    years = np.asarray(years, dtype=np.int64)
+    months = np.asarray(months, dtype=np.int64)
+    days = np.asarray(days, dtype=np.int64)
+    leaps = np.zeros(years.shape, dtype=bool) if leaps is None else np.asarray(leaps, dtype=bool)
+
+    if years.size and (years.min() < MIN_YEAR or years.max() > MAX_YEAR):
+        raise ValueError(f"农历年份应在{MIN_YEAR}-{MAX_YEAR}之间")
+    if months.size and (months.min() < 1 or months.max() > 12):
+        raise ValueError("农历月份应在1-12之间")
+    starts, _, _, _, info, first_months = _month_table()
+    leap_in_year = info[years - MIN_YEAR] & 0xf
+    if (leaps & (leap_in_year != months)).any():
+        raise ValueError("存在该年没有的闰月")
+
+    position = first_months[years - MIN_YEAR] + months - 1 + ((leap_in_year != 0) & ((months > leap_in_year) | leaps))
+    lengths = starts[position + 1] - starts[position]
+    if days.size and ((days < 1) | (days > lengths)).any():
+        raise ValueError("存在无效的农历日期")
+
+    result = (starts[position] + days - 1).astype('M8[D]')
+    return (result.astype('M8[Y]').astype(np.int64) + 1970,
+            result.astype('M8[M]').astype(np.int64) % 12 + 1,
+            (result - result.astype('M8[M]')).astype(np.int64) + 1)
+
+
+def solar_to_lunar_batch(years, months, days) -> np.ndarray:
+    """
+    批量公历 → 农历
+
+    返回形状为 (N, 4) 的 int64 数组，列依次为农历年、月、日、是否闰月（0/1）。
+    """
+    years = np.asarray(years, dtype=np.int64)
+    months = np.asarray(months, dtype=np.int64)
+    days = np.asarray(days, dtype=np.int64)
+    day_number = ((years - 1970).astype('M8[Y]') + (months - 1).astype('m8[M]')).astype('M8[D]').astype(np.int64)
+    day_number = day_number + days - 1
+
+    starts, month_years, month_numbers, month_leaps, _, _ = _month_table()
+    if day_number.size and (day_number.min() < starts[0] or day_number.max() >= starts[-1]):
+        raise ValueError(f"日期超出农历表范围（{FIRST_DATE:%Y年%m月%d日}至{LAST_DATE:%Y年%m月%d日}）")
+    k = np.searchsorted(starts, day_number, side='right') - 1
+    return np.stack([month_years[k], month_numbers[k], day_number - starts[k] + 1,
+                     month_leaps[k].astype(np.int64)], axis=1)
+
+
+def build_table() -> List[int]:
+    """用 ephem 按朔日与中气推算各年的打包数据（仅用于重新生成 LUNAR_INFO）"""
+    from datetime import datetime, timedelta
+    import ephem
+    from agent_project.tools.solar_terms import term_datetime
+
+    # 朔日（北京时间的日期）
+    moons = []
+    d = ephem.Date(datetime(MIN_YEAR - 2, 10, 1))
+    while not moons or moons[-1] < date(MAX_YEAR + 2, 3, 1):
+        d = ephem.next_new_moon(d)
+        moons.append(ephem.Date(d + 8 * ephem.hour).datetime().date())
+        d = ephem.Date(d + 1)
+    # 中气（大寒、雨水……冬至，即节气表的奇数项）所在日期
+    zhongqi = [term_datetime(y, i).date() for y in range(MIN_YEAR - 1, MAX_YEAR + 2) for i in range(1, 24, 2)]
+
+    def month_of(day: date) -> int:
+        return bisect_right(moons, day) - 1
+
+    def has_zhongqi(k: int) -> bool:
+        i = bisect_right(zhongqi, moons[k] - timedelta(days=1))
+        return i < len(zhongqi) and zhongqi[i] < moons[k + 1]
+
+    # 以冬至所在月为十一月，两个冬至之间有13个月时，第一个无中气的月为闰月
+    labels = {}
+    for year in range(MIN_YEAR - 1, MAX_YEAR + 1):
+        first, last = month_of(term_datetime(year, 23).date()), month_of(term_datetime(year + 1, 23).date())
+        needs_leap = last - first == 13
+        number = 11
+        labels[first] = (11, False)
+        for k in range(first + 1, last):
+            if needs_leap and not has_zhongqi(k):
+                labels[k] = (number, True)
+                needs_leap = False
+            else:
+                number = number % 12 + 1
+                labels[k] = (number, False)
+
+    table = []
+    lunar_year = None
+    info = 0
+    for k in sorted(labels):
+        number, leap = labels[k]
+        if number == 1 and not leap:
+            if lunar_year is not None and lunar_year >= MIN_YEAR:
+                table.append(info)
+            lunar_year = moons[k].year
+            info = 0
+        if leap:
+            info |= number
+        if (moons[k + 1] - moons[k]).days == 30:
+            info |= 0x10000 if leap else 0x8000 >> (number - 1)
+    return table[:MAX_YEAR - MIN_YEAR + 1]
+
+
+if __name__ == "__main__":
+    new_table = build_table()
+    for i in range(0, len(new_table), 10):
+        print("    " + ", ".join(f"0x{v:05x}" for v in new_table[i:i + 10]) + f",  # {MIN_YEAR + i}")
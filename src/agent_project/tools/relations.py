@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+十神与干支关系查表
+
+导入时预先展开：
+- TEN_GOD_MATRIX：10×10，[日干][他干] → 十神序号（TEN_GODS 中的下标）
+- STEM_RELATIONS：10×10 天干关系位掩码（五合、相冲）
+- BRANCH_RELATIONS：12×12 地支关系位掩码（六冲、六合、六害、刑、三合）
+单个命盘或批量命盘（bazi_batch.annotate_batch）的标注都只做数组下标查找。
+"""
+
+from typing import Any, Dict, List, Tuple
+
+from agent_project.tools.bazi_chart import PILLAR_NAMES, BaziChart
+from agent_project.tools.bazi_engine import DIZHI, TIANGAN
+from agent_project.tools.wuxing_engine import ELEMENTS, HIDDEN_STEMS
+
+TEN_GODS = ('比肩', '劫财', '食神', '伤官', '偏财', '正财', '七杀', '正官', '偏印', '正印')
+
+# 关系位
+REL_COMBINE = 1    # 天干五合 / 地支六合
+REL_CLASH = 2      # 天干相冲 / 地支六冲
+REL_HARM = 4       # 地支六害
+REL_PUNISH = 8     # 地支相刑（含自刑）
+REL_TRIPLE = 16    # 地支三合（同局两支，即半合）
+
+RELATION_NAMES = ((REL_COMBINE, '合'), (REL_CLASH, '冲'), (REL_HARM, '害'),
+                  (REL_PUNISH, '刑'), (REL_TRIPLE, '半合'))
+
+# 四柱两两组合的顺序（批量接口的列顺序）
+PILLAR_PAIRS = ((0, 1), (0, 2), (0, 3), (1, 2), (1, 3), (2, 3))
+
+# 相刑：寅巳申、丑戌未两组互刑，子卯相刑，辰午酉亥自刑
+_PUNISH_GROUPS = ((2, 5, 8), (1, 10, 7), (0, 3))
+_SELF_PUNISH = (4, 6, 9, 11)
+
+# 六合化神（子丑土、寅亥木、卯戌火、辰酉金、巳申水、午未土），按地支序号
+BRANCH_COMBINE_ELEMENT = (2, 2, 0, 1, 3, 4, 2, 2, 4, 3, 1, 0)
+
+# 三合局（申子辰水、巳酉丑金、寅午戌火、亥卯未木），按地支序号 % 4
+TRIPLE_ELEMENT = (4, 3, 1, 0)
+
+# 地支本气
+BRANCH_MAIN_STEM = tuple(TIANGAN.index(HIDDEN_STEMS[dz][0][0]) for dz in DIZHI)
+
+
+def ten_god(day_stem: int, other_stem: int) -> int:
+    """他干对日干的十神序号：五行生克定类别，阴阳同异定偏正"""
+    return ((other_stem // 2 - day_stem // 2) % 5) * 2 + (day_stem % 2 != other_stem % 2)
+
+
+def _stem_mask(a: int, b: int) -> int:
+    if abs(a - b) == 5:
+        return REL_COMBINE
+    # 甲庚、乙辛、丙壬、丁癸相冲（戊己居中无冲）
+    if abs(a - b) == 6 and min(a, b) < 4:
+        return REL_CLASH
+    return 0
+
+
+def _branch_mask(a: int, b: int) -> int:
+    mask = 0
+    if a != b:
+        if (a + b) % 12 == 1:
+            mask |= REL_COMBINE
+        if abs(a - b) == 6:
+            mask |= REL_CLASH
+        if (a + b) % 12 == 7:
+            mask |= REL_HARM
+        if a % 4 == b % 4:
+            mask |= REL_TRIPLE
+        if any(a in group and b in group for group in _PUNISH_GROUPS):
+            mask |= REL_PUNISH
+    elif a in _SELF_PUNISH:
+        mask |= REL_PUNISH
+    return mask
+
+
+TEN_GOD_MATRIX = tuple(tuple(ten_god(d, o) for o in range(10)) for d in range(10))
+STEM_RELATIONS = tuple(tuple(_stem_mask(a, b) for b in range(10)) for a in range(10))
+BRANCH_RELATIONS = tuple(tuple(_branch_mask(a, b) for b in range(12)) for a in range(12))
+
+
+def relation_names(mask: int) -> List[str]:
+    """关系位掩码 → 关系名称列表"""
+    return [name for bit, name in RELATION_NAMES if mask & bit]
+
+
+def _pillar_label(i: int) -> str:
+    return PILLAR_NAMES[i][0]
+
+
+def annotate_chart(chart: BaziChart) -> Dict[str, Any]:
+    """
+    标注命盘的十神与干支关系
+
+    返回：
+    - ten_gods：四柱天干的十神（日干为"日主"）
+    - hidden_ten_gods：四柱地支藏干的 (藏干, 十神) 列表
+    - stem_relations / branch_relations：[(柱序号, 柱序号, 关系名称, 合化五行或None)]
+    - triples：原局凑齐的三合局五行
+    """
+    stems, branches = chart.stems, chart.branches
+    day = stems[2]
+    ten_gods = [TEN_GODS[TEN_GOD_MATRIX[day][s]] for s in stems]
+    ten_gods[2] = '日主'
+    hidden = [[(tg, TEN_GODS[TEN_GOD_MATRIX[day][TIANGAN.index(tg)]]) for tg, _ in HIDDEN_STEMS[DIZHI[b]]]
+              for b in branches]
+
+    stem_relations: List[Tuple[int, int, str, Any]] = []
+    branch_relations: List[Tuple[int, int, str, Any]] = []
+    for i, j in PILLAR_PAIRS:
+        mask = STEM_RELATIONS[stems[i]][stems[j]]
+        if mask:
+            element = ELEMENTS[(min(stems[i], stems[j]) + 2) % 5] if mask & REL_COMBINE else None
+            stem_relations.append((i, j, relation_names(mask)[0], element))
+        mask = BRANCH_RELATIONS[branches[i]][branches[j]]
+        for bit, name in RELATION_NAMES:
+            if not mask & bit:
+                continue
+            element = None
+            if bit == REL_COMBINE:
+                element = ELEMENTS[BRANCH_COMBINE_ELEMENT[branches[i]]]
+            elif bit == REL_TRIPLE:
+                element = ELEMENTS[TRIPLE_ELEMENT[branches[i] % 4]]
+            branch_relations.append((i, j, name, element))
+
+    present = set(branches)
+    triples = [ELEMENTS[TRIPLE_ELEMENT[r]] for r in range(4)
+               if all(b in present for b in range(12) if b % 4 == r)]
+    return {
+        'ten_gods': ten_gods,
+        'hidden_ten_gods': hidden,
+        'stem_relations': stem_relations,
+        'branch_relations': branch_relations,
+        'triples': triples,
+    }
+
+
+def render_relations_report(chart: BaziChart) -> str:
+    """将十神与刑冲合害渲染为文本"""
+    notes = annotate_chart(chart)
+    stems, branches = chart.stems, chart.branches
+    lines = ["十神与刑冲合害（本地推算）：", "================"]
+    lines.append("天干十神：" + "  ".join(
+        f"{_pillar_label(i)}干{TIANGAN[s]}（{god}）" for i, (s, god) in enumerate(zip(stems, notes['ten_gods']))))
+    lines.append("地支藏干：" + "  ".join(
+        f"{_pillar_label(i)}支{DIZHI[b]}（{' '.join(tg + god for tg, god in hidden)}）"
+        for i, (b, hidden) in enumerate(zip(branches, notes['hidden_ten_gods']))))
+
+    def describe(chars, relations, kind):
+        items = []
+        for i, j, name, element in relations:
+            text = f"{chars[i]}{chars[j]}{'自' if chars[i] == chars[j] else ''}{name}"
+            if element:
+                text += f"{element}局" if name == '半合' else f"化{element}"
+            items.append(f"{text}（{_pillar_label(i)}{kind}、{_pillar_label(j)}{kind}）")
+        return "、".join(items) if items else "无"
+
+    lines.append("天干合冲：" + describe([TIANGAN[s] for s in stems], notes['stem_relations'], '干'))
+    lines.append("地支关系：" + describe([DIZHI[b] for b in branches], notes['branch_relations'], '支'))
+    if notes['triples']:
+        lines.append("三合成局：" + "、".join(f"{e}局" for e in notes['triples']))
+    return "\n".join(lines) + "\n"
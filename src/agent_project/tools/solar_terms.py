@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+二十四节气交节时刻表（1900–2100）
+
+交节时刻预先离线计算后打包在 data/solar_terms.bin 中，运行时只做数组下标查找。
+文件格式：按 (年份 - TABLE_FIRST_YEAR) * 24 + 节气序号 顺序排列的 uint32（小端），
+每一项为自 1899-01-01 00:00（北京时间，UTC+8）起算的分钟数。
+节气序号从小寒（0）开始，到冬至（23）结束。
+
+重新生成数据文件（需要安装 ephem）：
+    python -m agent_project.tools.solar_terms
+"""
+
+import sys
+from array import array
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Optional, Tuple
+
+SOLAR_TERM_NAMES = [
+    '小寒', '大寒', '立春', '雨水', '惊蛰', '春分', '清明', '谷雨',
+    '立夏', '小满', '芒种', '夏至', '小暑', '大暑', '立秋', '处暑',
+    '白露', '秋分', '寒露', '霜降', '立冬', '小雪', '大雪', '冬至',
+]
+
+# 立春在表中的序号
+LICHUN = 2
+
+# 对外支持的年份范围；数据文件前后各多存一年，便于跨年查找
+MIN_YEAR = 1900
+MAX_YEAR = 2100
+TABLE_FIRST_YEAR = MIN_YEAR - 1
+TABLE_LAST_YEAR = MAX_YEAR + 1
+
+TERMS_PER_YEAR = 24
+EPOCH = datetime(TABLE_FIRST_YEAR, 1, 1)
+EPOCH_ORDINAL = EPOCH.toordinal()
+
+DATA_FILE = Path(__file__).parent / 'data' / 'solar_terms.bin'
+
+
+def _load_table() -> array:
+    """加载节气时刻表"""
+    table = array('I')
+    with open(DATA_FILE, 'rb') as f:
+        table.frombytes(f.read())
+    if sys.byteorder == 'big':
+        table.byteswap()
+    expected = (TABLE_LAST_YEAR - TABLE_FIRST_YEAR + 1) * TERMS_PER_YEAR
+    if len(table) != expected:
+        raise ValueError(f"节气数据文件长度异常：期望{expected}项，实际{len(table)}项")
+    return table
+
+
+_TABLE: Optional[array] = None
+
+
+def to_minutes(year: int, month: int, day: int, hour: int = 0, minute: int = 0) -> int:
+    """将北京时间换算为自表格起点起的分钟数"""
+    return (date(year, month, day).toordinal() - EPOCH_ORDINAL) * 1440 + hour * 60 + minute
+
+
+def term_minutes(year: int, index: int) -> int:
+    """查询某年第 index 个节气的交节时刻（分钟数）"""
+    if not (TABLE_FIRST_YEAR <= year <= TABLE_LAST_YEAR):
+        raise ValueError(f"节气表年份应在{TABLE_FIRST_YEAR}-{TABLE_LAST_YEAR}之间")
+    global _TABLE
+    if _TABLE is None:
+        _TABLE = _load_table()
+    return _TABLE[(year - TABLE_FIRST_YEAR) * TERMS_PER_YEAR + index]
+
+
+def term_datetime(year: int, index: int) -> datetime:
+    """查询某年第 index 个节气的交节时刻（北京时间）"""
+    return EPOCH + timedelta(minutes=term_minutes(year, index))
+
+
+def solar_year_and_month(year: int, month: int, day: int, hour: int = 0, minute: int = 0) -> Tuple[int, int]:
+    """
+    按节气划分干支年与月令
+
+    返回 (干支纪年所属年份, 月支序号)，月支序号按地支排列（子=0，丑=1，寅=2 ...）。
+    年份以立春为界，月令以每月的"节"（小寒、立春、惊蛰……大雪）为界。
+    """
+    t = to_minutes(year, month, day, hour, minute)
+
+    # 公历 m 月内交的"节"为表中第 2*(m-1) 项，交节后进入地支为 m % 12 的月令
+    branch = month % 12
+    if t < term_minutes(year, 2 * (month - 1)):
+        branch = (month - 1) % 12
+
+    solar_year = year
+    if month < 3 and t < term_minutes(year, LICHUN):
+        solar_year -= 1
+    return solar_year, branch
+
+
+def build_table() -> array:
+    """用 ephem 计算全部节气时刻（仅用于重新生成数据文件）"""
+    import math
+    import ephem
+
+    def sun_longitude(d):
+        sun = ephem.Sun(d)
+        return float(ephem.Ecliptic(ephem.Equatorial(sun.ra, sun.dec, epoch=d)).lon)
+
+    table = array('I')
+    for year in range(TABLE_FIRST_YEAR, TABLE_LAST_YEAR + 1):
+        for index in range(TERMS_PER_YEAR):
+            # 小寒对应太阳视黄经285°，之后每个节气递增15°
+            target = math.radians((285 + 15 * index) % 360)
+            d = ephem.Date(datetime(year, 1, 6)) + index * 15.2184
+            for _ in range(20):
+                diff = (sun_longitude(d) - target + math.pi) % (2 * math.pi) - math.pi
+                d = ephem.Date(d - diff / (2 * math.pi) * 365.2422)
+                if abs(diff) < 1e-9:
+                    break
+            # ephem 日期为 UTC，换算为北京时间并四舍五入到分钟
+            beijing = ephem.Date(d + 8 * ephem.hour).datetime()
+            table.append(round((beijing - EPOCH).total_seconds() / 60))
+    return table
+
+
+if __name__ == "__main__":
+    new_table = build_table()
+    if sys.byteorder == 'big':
+        new_table.byteswap()
+    DATA_FILE.parent.mkdir(parents=True, exist_ok=True)
+    with open(DATA_FILE, 'wb') as f:
+        new_table.tofile(f)
+    print(f"已生成 {DATA_FILE}（{len(new_table)} 项）")
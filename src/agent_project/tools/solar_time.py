@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+出生地经度查询与真太阳时校正
+
+地名表（data/places.tsv）在首次查询时载入内存，建成按字符展开的前缀树；
+查询时从左到右做最长匹配，先认省级名称、再认该省下的城市，
+"福建厦门"、"福建省厦门市"、"上海徐汇" 之类的写法都能匹配，单次查询为微秒级。
+
+真太阳时 = 北京时间 + 4分钟 ×（经度 − 120°）+ 均时差（Spencer 公式，误差约半分钟）。
+"""
+
+import math
+from datetime import datetime, timedelta
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, NamedTuple, Optional
+
+PLACES_FILE = Path(__file__).parent / 'data' / 'places.tsv'
+
+# 北京时间的标准经线
+STANDARD_MERIDIAN = 120.0
+
+# Spencer 均时差公式系数：常数项，cos γ，sin γ，cos 2γ，sin 2γ（结果单位为弧度，乘 229.18 换算为分钟）
+EOT_COEFFICIENTS = (0.000075, 0.001868, -0.032077, -0.014615, -0.040849)
+EOT_MINUTES_PER_RADIAN = 229.18
+
+
+class Place(NamedTuple):
+    """地名查询结果；city 为空表示只匹配到省级名称（经度取省会）"""
+    province: str
+    city: str
+    longitude: float
+
+
+# 前缀树节点：字符 → 子节点；键 None 保存以该节点结尾的地名对应的条目
+_Trie = Dict[Optional[str], object]
+_trie: Optional[_Trie] = None
+
+
+def _load_trie() -> _Trie:
+    trie: _Trie = {}
+    with open(PLACES_FILE, encoding='utf-8') as f:
+        for line in f:
+            if not line.strip() or line.startswith('#'):
+                continue
+            province, city, longitude = line.rstrip('\n').split('\t')
+            place = Place(province, city, float(longitude))
+            node = trie
+            for char in city or province:
+                node = node.setdefault(char, {})
+            node.setdefault(None, []).append(place)
+    return trie
+
+
+def _longest_match(text: str, start: int):
+    """从 start 起的最长地名，返回 (条目列表, 结束位置)，无匹配返回 (None, start)"""
+    node = _trie
+    found, end = None, start
+    for i in range(start, len(text)):
+        node = node.get(text[i])
+        if node is None:
+            break
+        if None in node:
+            found, end = node[None], i + 1
+    return found, end
+
+
+@lru_cache(maxsize=4096)
+def lookup_place(text: str) -> Optional[Place]:
+    """
+    查询地名经度
+
+    先匹配到的省级名称限定后续城市的范围；只匹配到省级名称时返回省会经度，完全无法识别返回 None。
+    """
+    global _trie
+    if _trie is None:
+        _trie = _load_trie()
+    text = (text or '').strip()
+    province: Optional[Place] = None
+    i = 0
+    while i < len(text):
+        entries, end = _longest_match(text, i)
+        if entries is None:
+            i += 1
+            continue
+        i = end
+        for place in entries:
+            if not place.city:
+                if province is None:
+                    province = place
+            elif province is None or place.province == province.province:
+                return place
+    return province
+
+
+def equation_of_time(moment: datetime) -> float:
+    """均时差（分钟）：真太阳时与平太阳时之差，moment 为北京时间"""
+    # 公式以世界时正午为日内零点：北京时间先减8小时再减12小时
+    day_of_year = moment.timetuple().tm_yday
+    gamma = 2 * math.pi / 365 * (day_of_year - 1 + (moment.hour + moment.minute / 60 - 20) / 24)
+    c0, c1, s1, c2, s2 = EOT_COEFFICIENTS
+    return EOT_MINUTES_PER_RADIAN * (c0 + c1 * math.cos(gamma) + s1 * math.sin(gamma)
+                                     + c2 * math.cos(2 * gamma) + s2 * math.sin(2 * gamma))
+
+
+def solar_offset_minutes(moment: datetime, longitude: float) -> float:
+    """真太阳时相对北京时间的偏移（分钟）"""
+    return 4 * (longitude - STANDARD_MERIDIAN) + equation_of_time(moment)
+
+
+def true_solar_time(moment: datetime, longitude: float) -> datetime:
+    """把北京时间换算为出生地的真太阳时"""
+    return moment + timedelta(minutes=solar_offset_minutes(moment, longitude))
+
+
+def place_longitude(birth_place: str) -> Optional[float]:
+    """出生地经度，无法识别时返回 None"""
+    place = lookup_place(birth_place or '')
+    return place.longitude if place is not None else None
+
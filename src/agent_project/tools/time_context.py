@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+分析参照日期与时间背景
+
+运势预测、人生指导以"当前"为参照，参照日期作为运行时输入 reference_date 给出（默认为当天），
+在本地换算为干支年月、预测时段等文本，填入任务描述中的 {reference_time}、{near_term} 等占位符。
+排盘、五行分析、性格解读不含这些占位符，输出与参照日期无关。
+"""
+
+import re
+from datetime import date
+from typing import Dict, Optional, Tuple
+
+from agent_project.tools.bazi_engine import DIZHI, TIANGAN, year_stem_branch
+from agent_project.tools.solar_terms import MAX_YEAR, MIN_YEAR, solar_year_and_month
+
+# 近期预测覆盖的月数（参照日期的下一个月起）
+NEAR_TERM_MONTHS = 6
+
+# 流年列表覆盖的年数（参照日期所在年起）
+FORTUNE_YEAR_COUNT = 4
+
+# 只给出年月时取当月15日（已过当月的"节"，月令与该月的常见称呼一致）
+DEFAULT_DAY = 15
+
+_DATE_PATTERN = re.compile(r'^(\d{4})\s*[-/.年]\s*(\d{1,2})\s*(?:[-/.月]\s*(?:(\d{1,2})\s*日?)?)?$')
+
+
+def parse_reference_date(text: Optional[str] = None, today: Optional[date] = None) -> date:
+    """
+    解析参照日期
+
+    支持 2025-06-15、2025/6/15、2025年6月15日、2025年6月、2025-06 等写法，为空时取 today（默认当天）。
+    """
+    text = str(text or '').strip()
+    if not text:
+        return today or date.today()
+    match = _DATE_PATTERN.match(text)
+    if not match:
+        raise ValueError(f"无法识别参照日期：{text}")
+    year, month = int(match.group(1)), int(match.group(2))
+    day = int(match.group(3)) if match.group(3) else DEFAULT_DAY
+    # 预测覆盖参照年起的 FORTUNE_YEAR_COUNT 年，须在节气表范围内
+    if not (MIN_YEAR <= year <= MAX_YEAR - FORTUNE_YEAR_COUNT + 1):
+        raise ValueError(f"参照日期的年份应在{MIN_YEAR}-{MAX_YEAR - FORTUNE_YEAR_COUNT + 1}之间")
+    try:
+        return date(year, month, day)
+    except ValueError:
+        raise ValueError(f"参照日期无效：{text}")
+
+
+def fortune_years(reference: date) -> Tuple[int, ...]:
+    """流年列表：参照日期所在年起的 FORTUNE_YEAR_COUNT 年"""
+    return tuple(range(reference.year, reference.year + FORTUNE_YEAR_COUNT))
+
+
+def year_ganzhi(year: int) -> str:
+    """公历年份的干支，如 2026 → 丙午"""
+    stem, branch = year_stem_branch(year)
+    return TIANGAN[stem] + DIZHI[branch]
+
+
+def _near_term(reference: date) -> str:
+    first = reference.year * 12 + reference.month  # 下一个月（月份从0计）
+    last = first + NEAR_TERM_MONTHS - 1
+    (y1, m1), (y2, m2) = divmod(first, 12), divmod(last, 12)
+    if y1 == y2:
+        return f"{y1}年{m1 + 1}-{m2 + 1}月"
+    return f"{y1}年{m1 + 1}月至{y2}年{m2 + 1}月"
+
+
+def time_context(reference: date) -> Dict[str, str]:
+    """
+    任务描述中的时间背景占位符
+
+    - reference_time：2025年6月，乙巳年午月（干支年以立春、月令以"节"划分）
+    - current_year / next_year / year_after_next：2025年乙巳年、2026年丙午年、2027年丁未年
+    - near_term：参照日期下一个月起的半年，如 2025年7-12月
+    - fortune_span：参照年起的三年，如 2025-2027年
+    """
+    solar_year, month_branch = solar_year_and_month(reference.year, reference.month, reference.day, 12)
+    year = reference.year
+    return {
+        'reference_date': f"{reference.year}年{reference.month}月{reference.day}日",
+        'reference_time': (f"{reference.year}年{reference.month}月，"
+                           f"{year_ganzhi(solar_year)}年{DIZHI[month_branch]}月"),
+        'current_year': f"{year}年{year_ganzhi(year)}年",
+        'next_year': f"{year + 1}年{year_ganzhi(year + 1)}年",
+        'year_after_next': f"{year + 2}年{year_ganzhi(year + 2)}年",
+        'near_term': _near_term(reference),
+        'fortune_span': f"{year}-{year + 2}年",
+    }
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+五行力量评分
+
+直接对命盘的八个字计分：天干按本身五行计 1 分，地支按藏干（本气、中气、余气）分配 1 分，
+再乘以月令旺相休囚死系数。所有权重在导入时预先展开为查表数组，单次评分只做加法和乘法。
+"""
+
+from typing import List, Sequence, Tuple
+
+from agent_project.tools.bazi_chart import BaziChart
+from agent_project.tools.bazi_engine import DIZHI, TIANGAN
+
+# 五行顺序：木火土金水（天干序号 // 2 即为五行序号）
+ELEMENTS = ('木', '火', '土', '金', '水')
+ELEMENT_INDEX = {e: i for i, e in enumerate(ELEMENTS)}
+
+# 地支藏干及权重（本气、中气、余气）
+HIDDEN_STEMS = {
+    '子': (('癸', 1.0),),
+    '丑': (('己', 0.6), ('癸', 0.3), ('辛', 0.1)),
+    '寅': (('甲', 0.6), ('丙', 0.3), ('戊', 0.1)),
+    '卯': (('乙', 1.0),),
+    '辰': (('戊', 0.6), ('乙', 0.3), ('癸', 0.1)),
+    '巳': (('丙', 0.6), ('戊', 0.3), ('庚', 0.1)),
+    '午': (('丁', 0.7), ('己', 0.3)),
+    '未': (('己', 0.6), ('丁', 0.3), ('乙', 0.1)),
+    '申': (('庚', 0.6), ('壬', 0.3), ('戊', 0.1)),
+    '酉': (('辛', 1.0),),
+    '戌': (('戊', 0.6), ('辛', 0.3), ('丁', 0.1)),
+    '亥': (('壬', 0.7), ('甲', 0.3)),
+}
+
+# 月令旺相休囚死系数
+SEASON_STATES = ('旺', '相', '休', '囚', '死')
+SEASON_MULTIPLIERS = {'旺': 1.5, '相': 1.2, '休': 1.0, '囚': 0.8, '死': 0.6}
+
+# 月支所当令的五行（辰戌丑未为土旺）
+_MONTH_ELEMENT = (4, 2, 0, 0, 2, 1, 1, 2, 3, 3, 2, 4)
+
+
+def _season_state(element: int, month_element: int) -> str:
+    """某五行在当令五行下的旺衰状态"""
+    diff = (element - month_element) % 5
+    # 同我者旺，我生者相，生我者休，克我者囚，我克者死（以当令五行为"我"）
+    return ('旺', '相', '死', '囚', '休')[diff]
+
+
+def _build_tables() -> Tuple[List[List[float]], List[List[float]], List[List[float]]]:
+    stem_weights = [[0.0] * 5 for _ in TIANGAN]
+    for i in range(len(TIANGAN)):
+        stem_weights[i][i // 2] = 1.0
+
+    branch_weights = [[0.0] * 5 for _ in DIZHI]
+    for i, dz in enumerate(DIZHI):
+        for tg, weight in HIDDEN_STEMS[dz]:
+            branch_weights[i][TIANGAN.index(tg) // 2] += weight
+
+    month_multipliers = [
+        [SEASON_MULTIPLIERS[_season_state(e, _MONTH_ELEMENT[dz])] for e in range(5)]
+        for dz in range(len(DIZHI))
+    ]
+    return stem_weights, branch_weights, month_multipliers
+
+
+STEM_WEIGHTS, BRANCH_WEIGHTS, MONTH_MULTIPLIERS = _build_tables()
+
+
+def score_indices(indices: Sequence[int]) -> List[float]:
+    """按八个干支序号计算五行力量（木火土金水）"""
+    scores = [0.0] * 5
+    for i in range(0, 8, 2):
+        stem = STEM_WEIGHTS[indices[i]]
+        branch = BRANCH_WEIGHTS[indices[i + 1]]
+        for e in range(5):
+            scores[e] += stem[e] + branch[e]
+    multipliers = MONTH_MULTIPLIERS[indices[3]]
+    return [round(scores[e] * multipliers[e], 4) for e in range(5)]
+
+
+def score_chart(chart: BaziChart) -> List[float]:
+    """计算命盘五行力量向量（木火土金水）"""
+    return score_indices(chart.indices)
+
+
+def season_states(chart: BaziChart) -> List[str]:
+    """命盘月令下五行的旺相休囚死状态（木火土金水）"""
+    month_element = _MONTH_ELEMENT[chart.indices[3]]
+    return [_season_state(e, month_element) for e in range(5)]
+
+
+def day_master_strength(chart: BaziChart, scores: Sequence[float]) -> float:
+    """日主同党（同我、生我）力量占比，大于0.5偏强，小于0.5偏弱"""
+    day_element = chart.indices[4] // 2
+    total = sum(scores)
+    if total == 0:
+        return 0.0
+    same = scores[day_element] + scores[(day_element - 1) % 5]
+    return round(same / total, 4)
@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+JSONL 批量分析测试（使用本地模拟的分析函数，不调用API）
+"""
+
+import asyncio
+import json
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+sys.path.append(os.path.join(os.path.dirname(__file__), 'src'))
+
+from agent_project.batch import BatchRunner, completed_ids
+
+
+def fake_analyze(inputs, options):
+    if inputs['name'] == '失败':
+        raise RuntimeError("模型调用失败")
+    return f"{inputs['name']}的报告"
+
+
+def test_batch_resume(tmp_path):
+    """测试批量执行、增量写出和断点续跑"""
+    records = [{'id': str(i), 'name': f'用户{i}', 'gender': '女', 'birth_year': 1990,
+                'birth_month': 5, 'birth_day': 15, 'birth_hour': 14} for i in range(6)]
+    records[3]['name'] = '失败'
+    records[4]['birth_month'] = 13
+    source = tmp_path / 'births.jsonl'
+    source.write_text('\n'.join(json.dumps(r, ensure_ascii=False) for r in records) + '\n', encoding='utf-8')
+
+    # 模拟上次运行在写第1条记录时中断
+    output = tmp_path / 'results.jsonl'
+    output.write_text('{"id": "0", "status": "ok", "output": "用户0的报告"}\n{"id": "1", "sta', encoding='utf-8')
+
+    stats = asyncio.run(BatchRunner(workers=3, analyze=fake_analyze).run(source, output))
+    assert stats == {'ok': 3, 'error': 2, 'skipped': 1}
+
+    lines = [json.loads(line) for line in output.read_text(encoding='utf-8').splitlines()
+             if line.startswith('{"id": "') and line.endswith('}')]
+    results = {r['id']: r for r in lines}
+    assert results['5']['output'] == '用户5的报告'
+    assert results['3']['status'] == 'error'
+    assert '月份' in results['4']['error']
+    assert completed_ids(output) == {'0', '1', '2', '5'}
+
+    # 输出文件中缺少 id 的成功记录被跳过，不影响续跑
+    with output.open('a', encoding='utf-8') as f:
+        f.write(json.dumps({'status': 'ok', 'output': '无id'}, ensure_ascii=False) + '\n')
+    assert completed_ids(output) == {'0', '1', '2', '5'}
+
+
+if __name__ == "__main__":
+    with tempfile.TemporaryDirectory() as tmp:
+        test_batch_resume(Path(tmp))
+    print("✅ 批量分析测试通过")
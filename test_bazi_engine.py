@@ -0,0 +1,346 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+本地排盘算法测试（无需API密钥）
+"""
+
+import os
+import random
+import sys
+import tempfile
+from datetime import date, datetime, timedelta
+from pathlib import Path
+
+sys.path.append(os.path.join(os.path.dirname(__file__), 'src'))
+
+import numpy as np
+
+from agent_project.tools.bazi_batch import annotate_batch, compute_pillars_batch, score_wuxing_batch
+from agent_project.tools.bazi_chart import BaziChart
+from agent_project.tools.bazi_engine import TIANGAN, DIZHI, compute_pillars
+from agent_project.tools.chart_index import check_provided_bazi, find_birth_times
+from agent_project.tools.compatibility import (
+    CandidatePool, compatibility_breakdown, compatibility_matrix, render_compatibility_report,
+)
+from agent_project.tools.lunar_calendar import (
+    FIRST_DATE, LAST_DATE, LunarDate, leap_month, lunar_to_solar, lunar_to_solar_batch, parse_lunar_date,
+    solar_to_lunar, solar_to_lunar_batch,
+)
+from agent_project.tools.luck_engine import luck_cycle, pillar_relations, natal_targets
+from agent_project.tools.relations import (
+    BRANCH_RELATIONS, PILLAR_PAIRS, REL_CLASH, REL_COMBINE, REL_HARM, REL_PUNISH, REL_TRIPLE,
+    TEN_GODS, TEN_GOD_MATRIX, annotate_chart,
+)
+from agent_project.tools.solar_terms import term_datetime, solar_year_and_month, LICHUN
+from agent_project.tools.time_context import fortune_years, parse_reference_date, time_context
+from agent_project.tools.solar_time import equation_of_time, lookup_place, place_longitude
+from agent_project.tools.wuxing_engine import score_chart, season_states
+
+
+def _chart(*args) -> str:
+    p = compute_pillars(*args)
+    return ''.join(TIANGAN[p[i]] + DIZHI[p[i + 1]] for i in (0, 2, 4, 6))
+
+
+def test_known_charts():
+    """测试已知八字"""
+    # 23:55 属次日子时
+    assert _chart(2003, 2, 13, 23, 55) == '癸未甲寅戊午壬子'
+    assert _chart(2002, 1, 8, 16, 3) == '辛巳辛丑丙子丙申'
+    assert _chart(1900, 1, 1, 12, 0) == '己亥丙子甲戌庚午'
+
+
+def test_lichun_boundary():
+    """测试立春前后年柱、月柱切换（2003年立春为2月4日14:05）"""
+    lichun = term_datetime(2003, LICHUN)
+    assert (lichun.month, lichun.day, lichun.hour, lichun.minute) == (2, 4, 14, 5)
+    # 节气表多存前后各一年，超出时的提示与实际范围一致
+    assert term_datetime(1899, LICHUN).year == 1899 and term_datetime(2101, LICHUN).year == 2101
+    try:
+        term_datetime(1898, LICHUN)
+        raise AssertionError("应拒绝节气表以外的年份")
+    except ValueError as e:
+        assert '1899-2101' in str(e)
+    assert solar_year_and_month(2003, 2, 4, 14, 4) == (2002, 1)
+    assert solar_year_and_month(2003, 2, 4, 14, 5) == (2003, 2)
+    assert _chart(2003, 2, 4, 14, 4)[:4] == '壬午癸丑'
+    assert _chart(2003, 2, 4, 14, 5)[:4] == '癸未甲寅'
+
+
+def test_month_boundary_before_xiaohan():
+    """测试小寒前仍属上一年子月"""
+    assert solar_year_and_month(2025, 1, 4, 12, 0) == (2024, 0)
+    assert solar_year_and_month(2025, 1, 6, 12, 0) == (2024, 1)
+
+
+def test_batch_matches_scalar():
+    """测试批量排盘与逐条排盘结果一致"""
+    rows = [(2003, 2, 13, 23, 55), (2003, 2, 4, 14, 4), (2003, 2, 4, 14, 5),
+            (1900, 1, 1, 0, 0), (2100, 12, 31, 23, 59), (2024, 2, 29, 12, 30)]
+    result = compute_pillars_batch(*zip(*rows))
+    assert result.shape == (len(rows), 8)
+    for row, pillars in zip(rows, result):
+        assert tuple(int(x) for x in pillars) == compute_pillars(*row)
+    for minute in (75, -1):
+        try:
+            compute_pillars_batch([2003], [2], [13], [12], [minute])
+            raise AssertionError("应拒绝无效分钟")
+        except ValueError as e:
+            assert '分钟' in str(e)
+
+
+def test_chart_roundtrip():
+    """测试命盘对象与文本之间的转换"""
+    computed = BaziChart.from_birth(2003, 2, 13, 23, 55)
+    provided = BaziChart.from_string('癸未甲寅戊午壬子')
+    assert str(computed) == str(provided) == '癸未甲寅戊午壬子'
+    assert computed.next_day_zi and not computed.provided
+    assert provided.provided and computed != provided
+    assert computed.key == provided.key
+    assert BaziChart.parse("年柱：癸未\n月柱：甲寅\n日柱：戊午\n时柱：壬子（次日子时）") == computed
+    assert BaziChart.parse("五行：金木水火土") is None
+
+
+def test_tools_return_structured_chart():
+    """测试排盘工具返回命盘对象，五行工具直接使用，交给智能体时才渲染文本"""
+    from agent_project.tools.custom_tool import BaziCalculatorTool, BaziReport, WuxingAnalysisTool
+
+    report = BaziCalculatorTool()._run('测试', 2003, 2, 13, 23, 55, '男', '福建厦门')
+    assert isinstance(report, BaziReport) and str(report.chart) == '癸未甲寅戊午壬子'
+    assert '姓名：测试' in str(report) and '日柱：戊午' in str(report)
+    assert WuxingAnalysisTool()._run(report) == WuxingAnalysisTool()._run(str(report))
+
+
+def test_wuxing_scores():
+    """测试五行评分（藏干 + 月令系数）"""
+    chart = BaziChart.from_string('癸未甲寅戊午壬子')
+    scores = score_chart(chart)
+    # 寅月木旺：木 (甲1 + 未乙0.1 + 寅甲0.6) * 1.5
+    assert abs(scores[0] - 1.7 * 1.5) < 1e-6
+    # 无金
+    assert scores[3] == 0
+    assert season_states(chart) == ['旺', '相', '死', '囚', '休']
+    batch = score_wuxing_batch(compute_pillars_batch([2003], [2], [13], [23], [55]))
+    assert all(abs(a - b) < 1e-4 for a, b in zip(batch[0], scores))
+
+
+def test_luck_cycle():
+    """测试大运排法与起运岁数（2003年立春2月4日14:05，惊蛰3月6日08:05）"""
+    chart = BaziChart.from_birth(2003, 2, 13, 23, 55)
+    male = luck_cycle(chart, '男', 2003, 2, 13, 23, 55)
+    # 癸年男命逆排，立春至出生 9天9小时50分 → 约3.14年
+    assert not male.forward and male.term[0] == '立春'
+    assert abs(male.start_age - (9 * 1440 + 590) / 4320) < 1e-9
+    assert [p.stem * 100 + p.branch for p in male.pillars[:2]] == [9 * 100 + 1, 8 * 100 + 0]  # 癸丑、壬子
+    female = luck_cycle(chart, '女', 2003, 2, 13, 23, 55)
+    assert female.forward and female.term[0] == '惊蛰'
+    assert (female.pillars[0].stem, female.pillars[0].branch) == (1, 3)  # 乙卯
+    # 2026丙午年：午未合年支、丙壬冲时干、午子冲时支
+    assert pillar_relations(2, 6, natal_targets(chart)) == ['午未合（年支）', '丙壬冲（时干）', '午子冲（时支）']
+
+
+def test_ten_gods_and_relations():
+    """测试十神矩阵、地支关系位掩码和批量标注"""
+    # 戊日主：甲为七杀、癸为正财、壬为偏财、戊为比肩
+    assert [TEN_GODS[TEN_GOD_MATRIX[4][s]] for s in (0, 9, 8, 4)] == ['七杀', '正财', '偏财', '比肩']
+    assert BRANCH_RELATIONS[0][6] == REL_CLASH            # 子午冲
+    assert BRANCH_RELATIONS[0][1] == REL_COMBINE          # 子丑合
+    assert BRANCH_RELATIONS[0][7] == REL_HARM             # 子未害
+    assert BRANCH_RELATIONS[0][3] == REL_PUNISH           # 子卯刑
+    assert BRANCH_RELATIONS[2][8] == REL_CLASH | REL_PUNISH  # 寅申冲且刑
+    assert BRANCH_RELATIONS[6][6] == REL_PUNISH           # 午午自刑
+    assert BRANCH_RELATIONS[2][6] == REL_TRIPLE           # 寅午半合
+    assert all(BRANCH_RELATIONS[a][b] == BRANCH_RELATIONS[b][a] for a in range(12) for b in range(12))
+
+    chart = BaziChart.from_string('癸未甲寅戊午壬子')
+    notes = annotate_chart(chart)
+    assert notes['ten_gods'] == ['正财', '七杀', '日主', '偏财']
+    assert (0, 2, '合', '火') in notes['stem_relations']
+    assert (2, 3, '冲', None) in notes['branch_relations']
+
+    pillars = compute_pillars_batch([2003, 1984], [2, 12], [13, 20], [23, 4], [55, 0])
+    batch = annotate_batch(pillars)
+    for row, ten_gods, stem_masks, branch_masks in zip(
+            pillars, batch['ten_gods'], batch['stem_relations'], batch['branch_relations']):
+        row = [int(x) for x in row]
+        assert [int(g) for g in ten_gods[0::2]] == [TEN_GOD_MATRIX[row[4]][s] for s in row[0::2]]
+        assert [int(m) for m in branch_masks] == [BRANCH_RELATIONS[row[2 * i + 1]][row[2 * j + 1]]
+                                                  for i, j in PILLAR_PAIRS]
+    assert int(batch['ten_gods'][0][3]) == TEN_GODS.index('七杀')  # 寅本气甲
+    assert int(batch['stem_relations'][0][1]) == REL_COMBINE   # 癸戊合
+
+
+def test_true_solar_time():
+    """地名查询与真太阳时校正"""
+    assert lookup_place('福建厦门').city == '厦门'
+    assert lookup_place('中国浙江省杭州市西湖区').city == '杭州'
+    assert lookup_place('北京朝阳').province == '北京'   # 不误认辽宁朝阳
+    assert lookup_place('辽宁朝阳').city == '朝阳'
+    assert lookup_place('火星') is None
+    # 均时差：2月中旬约 -14 分钟，11月初约 +16 分钟
+    assert -15 < equation_of_time(datetime(2003, 2, 13, 12)) < -13
+    assert 15 < equation_of_time(datetime(2003, 11, 3, 12)) < 17
+
+    # 厦门 23:55 校正后约 23:33，仍是次日子时
+    assert BaziChart.from_birth(2003, 2, 13, 23, 55, place_longitude('福建厦门')).pillars == \
+        ('癸未', '甲寅', '戊午', '壬子')
+    # 喀什 12:30 校正后约 09:36，时柱由午时变为巳时，年柱、月柱不变
+    kashgar = BaziChart.from_birth(1990, 6, 1, 12, 30, place_longitude('新疆喀什'))
+    assert kashgar.true_solar
+    assert kashgar.pillars == ('庚午', '辛巳', '丁酉', '乙巳')
+    assert BaziChart.from_birth(1990, 6, 1, 12, 30).pillars[3] == '丙午'
+    # 乌鲁木齐 00:30 校正后回到前一日的亥时
+    urumqi = BaziChart.from_birth(2000, 1, 2, 0, 30, place_longitude('乌鲁木齐'))
+    assert urumqi.pillars[2:] == BaziChart.from_birth(2000, 1, 1, 21, 0).pillars[2:]
+
+    rng = random.Random(7)
+    rows = [(rng.randint(1901, 2099), rng.randint(1, 12), rng.randint(1, 28), rng.randint(0, 23),
+             rng.randint(0, 59), rng.uniform(73, 135) if i % 5 else None) for i in range(2000)]
+    years, months, days, hours, minutes, longitudes = zip(*rows)
+    batch = compute_pillars_batch(years, months, days, hours, minutes,
+                                  [float('nan') if lon is None else lon for lon in longitudes])
+    for row, pillars in zip(rows, batch):
+        assert tuple(int(x) for x in pillars) == compute_pillars(*row)
+
+
+def test_chart_index():
+    """命盘反查：随机时刻排出的命盘都能查回包含该时刻的时段"""
+    rng = random.Random(11)
+    for _ in range(200):
+        birth = datetime(rng.randint(1900, 2100), rng.randint(1, 12), rng.randint(1, 28),
+                         rng.randint(0, 23), rng.randint(0, 59))
+        chart = BaziChart.from_birth(birth.year, birth.month, birth.day, birth.hour, birth.minute)
+        matches = find_birth_times(chart)
+        assert any(m.start <= birth < m.end for m in matches)
+        assert all(BaziChart.from_birth(m.start.year, m.start.month, m.start.day, m.start.hour,
+                                        m.start.minute).indices == chart.indices for m in matches)
+
+    # 立春交节（2003-02-04 14:05）把 13:00-14:59 的未时切成两段
+    before, after = BaziChart.from_birth(2003, 2, 4, 14, 4), BaziChart.from_birth(2003, 2, 4, 14, 5)
+    lichun = datetime(2003, 2, 4, 14, 5)
+    assert any(m.start == datetime(2003, 2, 4, 13) and m.end == lichun for m in find_birth_times(before))
+    assert any(m.start == lichun and m.end == datetime(2003, 2, 4, 15) for m in find_birth_times(after))
+
+    assert check_provided_bazi('癸未甲寅戊午壬子', 2003, 2, 13, 23, 55).consistent
+    check = check_provided_bazi('癸未甲寅戊午壬子', 2003, 2, 14, 10, 0)
+    assert not check.consistent and '2003年02月13日 23:00' in check.note
+    # 月干与年干不相配（癸年寅月应为甲寅）
+    check = check_provided_bazi('癸未丙寅戊午壬子', 2003, 2, 13, 23, 55)
+    assert not check.consistent and not check.matches and '不相配' in check.note
+    # 干支相配、但 1900–2100 年间没有出现过的八字
+    check = check_provided_bazi('甲子丙子己未己巳', 1990, 5, 5, 10)
+    assert not check.consistent and not check.matches
+    assert '没有对应的出生时间' in check.note and '不相配' not in check.note
+
+
+def test_chart_index_saved_to_given_dir(tmp_path):
+    """测试索引只写入调用方给出的目录，之后从该文件加载"""
+    from agent_project.tools import chart_index
+
+    loaded, chart_index._index = chart_index._index, None
+    try:
+        index = chart_index.load_index(tmp_path)
+        assert (tmp_path / chart_index.INDEX_FILE_NAME).exists()
+        chart_index._index = None
+        reloaded = chart_index.load_index(tmp_path)
+        assert isinstance(reloaded, np.memmap) and (reloaded == index).all()
+    finally:
+        chart_index._index = loaded
+
+
+def test_lunar_calendar():
+    """农历与公历互换"""
+    # 春节
+    for year, spring in ((1900, (1, 31)), (2003, (2, 1)), (2024, (2, 10)), (2025, (1, 29)), (2100, (2, 9))):
+        assert lunar_to_solar(year, 1, 1) == date(year, *spring)
+    assert [leap_month(y) for y in (2017, 2020, 2023, 2024, 2025, 2033)] == [6, 4, 2, 0, 6, 11]
+    assert lunar_to_solar(2023, 2, 1, leap=True) == date(2023, 3, 22)
+    assert solar_to_lunar(2003, 2, 13) == LunarDate(2003, 1, 13)
+    assert solar_to_lunar(2023, 4, 19) == LunarDate(2023, 2, 29, True)
+    assert str(solar_to_lunar(2033, 12, 22)) == '2033年闰冬月初一'
+    assert parse_lunar_date('农历2023年闰二月初一') == LunarDate(2023, 2, 1, True)
+    assert parse_lunar_date('1990年腊月廿九') == LunarDate(1990, 12, 29)
+    for bad in ((2024, 2, 1, True), (2003, 1, 31, False), (1899, 1, 1, False)):
+        try:
+            lunar_to_solar(*bad)
+            raise AssertionError(f"应拒绝无效农历日期：{bad}")
+        except ValueError:
+            pass
+
+    # 全范围逐日往返，批量接口与逐条结果一致
+    days = [FIRST_DATE + timedelta(days=i) for i in range((LAST_DATE - FIRST_DATE).days + 1)]
+    lunar = solar_to_lunar_batch([d.year for d in days], [d.month for d in days], [d.day for d in days])
+    for d, row in zip(days[::97], lunar[::97]):
+        assert tuple(int(x) for x in row) == tuple(solar_to_lunar(d.year, d.month, d.day))
+    years, months, mdays = lunar_to_solar_batch(lunar[:, 0], lunar[:, 1], lunar[:, 2], lunar[:, 3])
+    assert [date(int(y), int(m), int(d)) for y, m, d in zip(years, months, mdays)] == days
+
+
+def test_compatibility_scoring():
+    """合婚评分：矩阵与逐对计算一致，top-k 按得分排序"""
+    rng = random.Random(5)
+    rows = [(rng.randint(1960, 2005), rng.randint(1, 12), rng.randint(1, 28), rng.randint(0, 23))
+            for _ in range(300)]
+    pillars = compute_pillars_batch(*zip(*rows))
+    charts = [BaziChart(tuple(int(x) for x in row)) for row in pillars]
+
+    matrix = compatibility_matrix(pillars[:20], pillars)
+    assert matrix.shape == (20, 300)
+    for i in range(20):
+        for j in range(0, 300, 37):
+            assert abs(matrix[i, j] - compatibility_breakdown(charts[i], charts[j])['总分']) < 1e-3
+    # 评分对双方对称，且在 0-100 之间
+    assert abs(matrix[3, 7] - matrix[7, 3]) < 1e-3
+    assert 0 <= matrix.min() and matrix.max() <= 100
+
+    me = BaziChart.from_string('癸未甲寅戊午壬子')
+    indices, scores = CandidatePool(charts).top_k(me, k=5)
+    full = compatibility_matrix(me, pillars)[0]
+    assert list(scores) == sorted(full, reverse=True)[:5]
+    assert all(full[i] == s for i, s in zip(indices, scores))
+    assert '总分' in render_compatibility_report(me, charts[int(indices[0])])
+
+    parts = compatibility_breakdown(me, BaziChart.from_string('戊午丁巳辛未戊戌'))
+    assert parts['夫妻宫'] == 20 and parts['生肖'] == 10   # 午未六合
+
+
+def test_reference_date_context():
+    """测试参照日期解析与时间背景"""
+    for text in ('2025-06-15', '2025/6/15', '2025年6月15日', '2025年6月', '2025-06'):
+        assert parse_reference_date(text) == date(2025, 6, 15)
+    assert parse_reference_date('', today=date(2030, 1, 2)) == date(2030, 1, 2)
+    for bad in ('明年', '2025-02-30', '2099-01-01'):
+        try:
+            parse_reference_date(bad)
+            raise AssertionError(f"应拒绝参照日期：{bad}")
+        except ValueError:
+            pass
+
+    assert fortune_years(date(2025, 6, 15)) == (2025, 2026, 2027, 2028)
+    context = time_context(date(2025, 6, 15))
+    assert context['reference_time'] == '2025年6月，乙巳年午月'
+    assert context['current_year'] == '2025年乙巳年' and context['year_after_next'] == '2027年丁未年'
+    assert context['fortune_span'] == '2025-2027年'
+    # 立春前仍属上一干支年；预测时段跨年
+    assert time_context(date(2026, 1, 20))['reference_time'] == '2026年1月，乙巳年丑月'
+    assert time_context(date(2025, 10, 1))['near_term'] == '2025年11月至2026年4月'
+
+
+if __name__ == "__main__":
+    test_known_charts()
+    test_lichun_boundary()
+    test_month_boundary_before_xiaohan()
+    test_batch_matches_scalar()
+    test_chart_roundtrip()
+    test_tools_return_structured_chart()
+    test_wuxing_scores()
+    test_luck_cycle()
+    test_ten_gods_and_relations()
+    test_true_solar_time()
+    test_chart_index()
+    with tempfile.TemporaryDirectory() as tmp:
+        test_chart_index_saved_to_given_dir(Path(tmp))
+    test_lunar_calendar()
+    test_compatibility_scoring()
+    test_reference_date_context()
+    print("✅ 本地排盘测试通过")
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+离线基准测试工具的测试（使用本地模拟服务，不调用API）
+"""
+
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+from benchmarks.bench_crew import build_parser, percentile
+from benchmarks.stub_server import StubConfig, build_reply
+
+ROOT = Path(__file__).resolve().parent
+
+
+def test_percentile_and_stub_replies():
+    """测试百分位数计算和模拟服务对规划请求的回答"""
+    assert percentile([1.0, 2.0, 3.0, 4.0], 50) == 2.5
+    assert percentile([5.0], 99) == 5.0
+
+    config = StubConfig(response_tokens=10)
+    plan = build_reply({'messages': [{'content': "Task Number 1 - 排盘\nTask Number 2 - 分析"}]}, config)
+    plans = json.loads(plan['content'].split('Final Answer: ', 1)[1])['list_of_plans_per_task']
+    assert len(plans) == 2
+    answer = build_reply({'messages': [{'content': "分析五行"}]}, config)
+    assert len(answer['content'].split('Final Answer: ', 1)[1]) == 20
+
+
+def test_mode_flags_not_taken_as_abbreviations():
+    """测试运行模式开关 --trace 不会被当作 --tracemalloc 的缩写"""
+    args, mode_flags = build_parser().parse_known_args(['--stream', '--trace', '--runs', '4'])
+    assert args.tracemalloc is False and args.runs == 4
+    assert mode_flags == ['--trace']
+
+
+def test_benchmark_runs_offline(tmp_path):
+    """测试基准测试经由模拟服务完整执行团队"""
+    output = tmp_path / 'bench.json'
+    env = {k: v for k, v in os.environ.items() if k not in ('DEEP_SEEK_KEY', 'DEEP_SEEK_URL')}
+    subprocess.run(
+        [sys.executable, '-m', 'benchmarks.bench_crew', '--runs', '2', '--warmup', '0',
+         '--local-bazi', '--json', str(output)],
+        cwd=ROOT, env=env, check=True, capture_output=True, timeout=300,
+    )
+    result = json.loads(output.read_text(encoding='utf-8'))
+    assert result['runs'] == 2
+    assert result['options'] == {'local_bazi': True}
+    assert 0 < result['latency_seconds']['p50'] <= result['latency_seconds']['p99']
+    assert result['throughput_per_second'] > 0 and result['cpu_seconds_per_run'] > 0
+
+
+if __name__ == "__main__":
+    import tempfile
+
+    test_percentile_and_stub_replies()
+    test_mode_flags_not_taken_as_abbreviations()
+    with tempfile.TemporaryDirectory() as tmp:
+        test_benchmark_runs_offline(Path(tmp))
+    print("✅ 基准测试工具测试通过")
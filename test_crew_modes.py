@@ -0,0 +1,558 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+智能体团队运行模式测试（只构建团队，不调用API）
+"""
+
+import gc
+import io
+import json
+import os
+import sys
+import tempfile
+import weakref
+from datetime import date
+from pathlib import Path
+
+sys.path.append(os.path.join(os.path.dirname(__file__), 'src'))
+
+# 命盘反查索引、检查点等本地数据写到临时目录，不写入项目的 .bazi_cache
+os.environ['BAZI_CACHE_DIR'] = tempfile.mkdtemp(prefix='bazi_test_')
+
+from crewai.tasks.task_output import TaskOutput
+from crewai.utilities.events import (
+    CrewKickoffCompletedEvent, CrewKickoffStartedEvent, LLMCallCompletedEvent, LLMCallStartedEvent,
+    LLMStreamChunkEvent, TaskCompletedEvent, TaskStartedEvent, crewai_event_bus,
+)
+
+from agent_project.checkpoints import CheckpointStore
+from agent_project.compaction import digest
+from agent_project.crew import AgentProject, options_from_argv, reference_date_from_argv
+from agent_project.crew_pool import CrewPool
+from agent_project.instrumentation import Instrumentation
+from agent_project.plan_cache import plan_cache_key
+from agent_project.result_cache import NAME_PLACEHOLDER, ResultCache, anonymize, personal_details
+from agent_project.streaming_callback import (
+    SimpleStreamingHandler, StreamingCallback, StreamRouter, attach_streaming,
+)
+from agent_project.scheduler import task_levels
+from agent_project.tools.time_context import time_context
+from agent_project.single_flight import SingleFlight, flight_key
+
+TEST_INPUTS = {
+    'name': '测试',
+    'gender': '男',
+    'birth_date': '2003年2月13日',
+    'birth_time': '23时55分',
+    'birth_place': '福建厦门',
+    'provided_bazi': '',
+}
+
+
+def test_local_bazi_skips_calculate_task():
+    """测试本地排盘模式"""
+    project = AgentProject(local_bazi=True, concurrent_tasks=False)
+    crew = project.crew()
+    assert 'calculate_bazi_task' not in [t.name for t in crew.tasks]
+
+    inputs = dict(TEST_INPUTS)
+    for callback in crew.before_kickoff_callbacks:
+        inputs = callback(inputs)
+    assert '癸未甲寅戊午壬子' in project.calculate_bazi_task().output.raw
+
+
+def test_chart_facts_injected_into_tasks():
+    """测试本地推算的十神关系和大运流年填入性格解读、运势预测任务"""
+    crew = AgentProject(local_bazi=False, concurrent_tasks=False).crew()
+    inputs = dict(TEST_INPUTS, reference_date='2025-06-15')
+    for callback in crew.before_kickoff_callbacks:
+        inputs = callback(inputs)
+    assert '阴年男命逆排' in inputs['luck_pillars']
+    crew._interpolate_inputs(inputs)
+    fortune = [t for t in crew.tasks if t.name == 'predict_fortune_task'][0]
+    assert '2026 丙午年，行辛亥运' in fortune.description
+    personality = [t for t in crew.tasks if t.name == 'interpret_personality_task'][0]
+    assert '月干甲（七杀）' in personality.description and '午子冲（日支、时支）' in fortune.description
+
+    inputs = dict(TEST_INPUTS, gender='', reference_date='2025-06-15')
+    for callback in crew.before_kickoff_callbacks:
+        inputs = callback(inputs)
+    assert '大运：' not in inputs['luck_pillars'] and '2028 戊申年' in inputs['luck_pillars']
+
+
+def test_checkpoints_resume_from_first_incomplete_task(tmp_path):
+    """测试检查点保存已完成任务的输出，续跑时从第一个未完成的任务开始"""
+    store = CheckpointStore(tmp_path / 'checkpoints.sqlite3')
+    project = AgentProject(local_bazi=True, concurrent_tasks=False, checkpoints=store)
+    crew = project.crew()
+    inputs = dict(TEST_INPUTS, run_id='run-1')
+    for callback in crew.before_kickoff_callbacks:
+        inputs = callback(inputs)
+    assert 'run_id' not in inputs and store.inputs('run-1')['name'] == '测试'
+
+    # 模拟前两个任务完成后第三个任务失败
+    project.analyze_wuxing_task().callback(TaskOutput(description='', raw='五行分析全文', agent='x'))
+    project.interpret_personality_task().callback(TaskOutput(description='', raw='性格解读全文', agent='x'))
+
+    resumed = AgentProject(local_bazi=True, concurrent_tasks=False, checkpoints=store)
+    resumed_crew = resumed.crew()
+    inputs = dict(store.inputs('run-1'), run_id='run-1')
+    for callback in resumed_crew.before_kickoff_callbacks:
+        inputs = callback(inputs)
+    assert [t.name for t in resumed_crew.tasks] == ['predict_fortune_task', 'provide_life_guidance_task']
+    assert resumed._raw_outputs['interpret_personality_task'] == '性格解读全文'
+    assert resumed_crew.skipped_tasks['analyze_wuxing_task'] == 'checkpoint'
+
+    # 全部完成后续跑直接返回最后一个任务的输出
+    for task in resumed_crew.tasks:
+        task.callback(TaskOutput(description='', raw=f'{task.name}全文', agent='x'))
+    result = AgentProject(local_bazi=True, concurrent_tasks=False, checkpoints=store).resume('run-1')
+    assert result.raw == 'provide_life_guidance_task全文'
+    assert store.runs() == [('run-1', 4)]
+
+
+def test_concurrent_schedule():
+    """测试按依赖图并发调度"""
+    crew = AgentProject(local_bazi=False, concurrent_tasks=True).crew()
+    levels = [[t.name for t in group] for group in task_levels(crew.tasks)]
+    assert levels == [['calculate_bazi_task'], ['analyze_wuxing_task'],
+                      ['interpret_personality_task', 'predict_fortune_task'],
+                      ['provide_life_guidance_task']]
+    assert [t.async_execution for t in crew.tasks] == [False, False, True, True, False]
+
+
+def test_chart_cache_skips_cached_tasks(tmp_path):
+    """测试命盘缓存命中后跳过对应任务"""
+    cache = ResultCache(tmp_path / 'cache.sqlite3')
+    project = AgentProject(local_bazi=True, concurrent_tasks=False, chart_cache=cache)
+    crew = project.crew()
+
+    inputs = dict(TEST_INPUTS)
+    for callback in crew.before_kickoff_callbacks:
+        inputs = callback(inputs)
+    assert len(crew.tasks) == 4
+
+    # 模拟五行分析任务完成并写入缓存
+    task = project.analyze_wuxing_task()
+    task.callback(TaskOutput(description='', raw='姓名：测试，日主偏弱', agent='x'))
+
+    other = AgentProject(local_bazi=True, concurrent_tasks=False, chart_cache=cache)
+    other_crew = other.crew()
+    inputs = dict(TEST_INPUTS, name='另一位')
+    for callback in other_crew.before_kickoff_callbacks:
+        inputs = callback(inputs)
+    assert 'analyze_wuxing_task' not in [t.name for t in other_crew.tasks]
+    assert other.analyze_wuxing_task().output.raw == '姓名：另一位，日主偏弱'
+
+
+def test_chart_cache_carries_no_birth_details(tmp_path):
+    """测试命盘缓存不含第一位求测者的出生日期、时间、地点，命中时填入当前求测者的信息"""
+    cache = ResultCache(tmp_path / 'cache.sqlite3')
+    project = AgentProject(local_bazi=True, concurrent_tasks=False, chart_cache=cache)
+    crew = project.crew()
+    inputs = dict(TEST_INPUTS)
+    for callback in crew.before_kickoff_callbacks:
+        inputs = callback(inputs)
+    project.analyze_wuxing_task().callback(TaskOutput(
+        description='', agent='x', raw='姓名：测试，生于2003年2月13日23时55分（福建厦门），日主偏弱'))
+
+    # 不同出生日期、地点但命盘相同的求测者
+    other = AgentProject(local_bazi=True, concurrent_tasks=False, chart_cache=cache)
+    other_crew = other.crew()
+    inputs = dict(TEST_INPUTS, name='另一位', birth_date='1990年5月1日', birth_time='8时30分',
+                  birth_place='北京', provided_bazi='癸未甲寅戊午壬子')
+    for callback in other_crew.before_kickoff_callbacks:
+        inputs = callback(inputs)
+    assert 'analyze_wuxing_task' not in [t.name for t in other_crew.tasks]
+    raw = other.analyze_wuxing_task().output.raw
+    assert raw == '姓名：另一位，生于1990年5月1日8时30分（北京），日主偏弱'
+    assert not any(detail in raw for detail in ('测试', '2003', '2月13日', '23时', '厦门'))
+
+    # 以其他写法提到出生信息时无法确认已全部替换，不缓存
+    details = personal_details((2003, 2, 13, 23, 55), '福建厦门', '2003年2月13日', '23时55分')
+    assert anonymize('生于厦门，日主偏弱', '测试', details) is None
+    assert anonymize('二〇〇三年生，2003年属羊', '测试', details) is None
+    assert anonymize('生于福建厦门，夜里23点出生', '测试', details) is None
+
+
+def test_anonymize_short_names():
+    """测试短姓名只在已知位置替换，无法区分姓名与普通用字时不缓存"""
+    assert anonymize('张三丰的日主为金', '张三丰') == f'{NAME_PLACEHOLDER}的日主为金'
+    # "喜金"中的金是五行，不能替换，也就无法确认姓名已全部去除
+    assert anonymize('姓名：金\n金先生日主属火，喜金', '金') is None
+    assert anonymize('姓名：林\n林女士日主属火', '林') == f'姓名：{NAME_PLACEHOLDER}\n{NAME_PLACEHOLDER}女士日主属火'
+    assert anonymize('日主属木，宜往林业发展', '林') is None
+
+
+def test_incremental_mode_reruns_only_date_dependent_tasks(tmp_path):
+    """测试增量模式下只重新执行与参照日期有关的任务，时间背景随参照日期更新"""
+    cache = ResultCache(tmp_path / 'cache.sqlite3')
+    project = AgentProject(concurrent_tasks=False, chart_cache=cache, plan_cache=False, incremental=True)
+    crew = project.crew()
+    inputs = dict(TEST_INPUTS, reference_date='2025-06-15')
+    for callback in crew.before_kickoff_callbacks:
+        inputs = callback(inputs)
+    assert len(crew.tasks) == 5
+    assert inputs['reference_time'] == '2025年6月，乙巳年午月' and inputs['near_term'] == '2025年7-12月'
+    assert '2025 乙巳年' in inputs['luck_pillars'] and '2029' not in inputs['luck_pillars']
+    for task in crew.tasks[:3]:
+        task.callback(TaskOutput(description='', raw=f'求测者测试的{task.name}', agent='x'))
+
+    # 下一次刷新：排盘、五行分析、性格解读复用缓存，只执行运势预测和人生指导
+    refresh = AgentProject(concurrent_tasks=False, chart_cache=cache, plan_cache=False, incremental=True)
+    refresh_crew = refresh.crew()
+    inputs = dict(TEST_INPUTS, reference_date='2026年1月')
+    for callback in refresh_crew.before_kickoff_callbacks:
+        inputs = callback(inputs)
+    assert [t.name for t in refresh_crew.tasks] == ['predict_fortune_task', 'provide_life_guidance_task']
+    assert refresh.calculate_bazi_task().output.raw == '求测者测试的calculate_bazi_task'
+    assert inputs['next_year'] == '2027年丁未年' and inputs['near_term'] == '2026年2-7月'
+    refresh_crew._interpolate_inputs(inputs)
+    assert '2027年丁未年全年' in refresh.predict_fortune_task().description
+    assert '2026年丙午年' in refresh.fortune_predictor_agent().backstory
+
+
+def test_context_compaction():
+    """测试下游任务读取压缩后的摘要，最终结果保留完整输出"""
+    report = "## 五行分析\n" + "命主日元戊土生于寅月，木旺土虚。\n" * 40 + "**结论**：喜用神为火、土，忌神为水。木旺需泄。\n"
+    text = digest('analyze_wuxing_task', report)
+    assert len(text) < len(report) // 2
+    assert '喜用：火、土；忌：水' in text
+
+    project = AgentProject(local_bazi=True, concurrent_tasks=False)
+    task = project.crew().tasks[0]
+    task.callback(TaskOutput(description='', raw=report, agent='x'))
+    assert task.output.raw == text
+
+    full = AgentProject(local_bazi=True, concurrent_tasks=False, full_context=True)
+    task = full.crew().tasks[0]
+    task.callback(TaskOutput(description='', raw=report, agent='x'))
+    assert task.output.raw == report
+
+
+class RecordingCallback(StreamingCallback):
+    def __init__(self):
+        super().__init__()
+        self.events = []
+
+    def on_task_start(self, task, **kwargs):
+        self.events.append(('task_start', task.name))
+
+    def on_llm_new_token(self, token, task=None, **kwargs):
+        self.events.append(('token', task.name if task else None, token))
+
+
+def test_stream_events_routed_per_project():
+    """测试流式事件只分发给所属团队的回调"""
+    project = AgentProject(local_bazi=True, concurrent_tasks=False, stream=True)
+    other = AgentProject(local_bazi=True, concurrent_tasks=False, stream=True)
+    assert project.deepseek_llm is not other.deepseek_llm
+
+    callback = RecordingCallback()
+    task = project.analyze_wuxing_task()
+    with attach_streaming(project, callback):
+        crewai_event_bus.emit(task, TaskStartedEvent(context='', task=task))
+        crewai_event_bus.emit(project.deepseek_llm, LLMStreamChunkEvent(chunk='木'))
+        crewai_event_bus.emit(other.deepseek_llm, LLMStreamChunkEvent(chunk='水'))
+    crewai_event_bus.emit(project.deepseek_llm, LLMStreamChunkEvent(chunk='火'))
+
+    assert callback.events == [('task_start', 'analyze_wuxing_task'),
+                               ('token', 'analyze_wuxing_task', '木')]
+
+    # 路由不影响总线上已有的流式token订阅者
+    with crewai_event_bus.scoped_handlers():
+        chunks = []
+        crewai_event_bus.on(LLMStreamChunkEvent)(lambda source, event: chunks.append(event.chunk))
+        StreamRouter()
+        crewai_event_bus.emit(other.deepseek_llm, LLMStreamChunkEvent(chunk='土'))
+        assert chunks == ['土']
+
+
+def test_streaming_handler_batches_and_spills():
+    """测试流式处理器批量输出，超过上限的内容转存临时文件"""
+    writes = []
+
+    class Sink(io.StringIO):
+        def write(self, text):
+            writes.append(text)
+            return len(text)
+
+    handler = SimpleStreamingHandler(Sink(), flush_chars=100, flush_interval=60, spill_chars=300)
+    for _ in range(500):
+        handler.write("木旺")
+    handler.write("。")
+    assert len(writes) == 10
+    assert handler._spill is not None and handler._segment_chars < 300
+    handler.flush()
+    assert writes[-1] == "。"
+    assert handler.get_content() == "木旺" * 500 + "。"
+    spill = handler._spill
+    handler.close()
+    assert spill.closed
+
+    # 作为上下文管理器使用时退出即输出剩余内容
+    with SimpleStreamingHandler(Sink(), flush_chars=100, flush_interval=60) as handler:
+        handler.write("火")
+    assert writes[-1] == "火"
+
+
+def test_crew_pool_reuses_instances():
+    """测试实例池复用团队并在归还时清除运行状态"""
+    pool = CrewPool(max_idle=2, local_bazi=True, concurrent_tasks=False)
+    pool.warm(1)
+    with pool.acquire() as project:
+        crew = project.crew()
+        inputs = dict(TEST_INPUTS)
+        for callback in crew.before_kickoff_callbacks:
+            inputs = callback(inputs)
+        assert project.calculate_bazi_task().output is not None
+
+    assert pool.idle == 1
+    with pool.acquire() as again:
+        assert again is project
+        assert again.calculate_bazi_task().output is None
+        assert len(again.crew().tasks) == 4
+
+
+def test_crew_pool_releases_extra_instances():
+    """测试超过 max_idle 的实例归还后可被垃圾回收（不再被 crewAI 的 memoize 缓存引用）"""
+    pool = CrewPool(max_idle=1, local_bazi=True, concurrent_tasks=False)
+    with pool.acquire() as first, pool.acquire() as second, pool.acquire() as third:
+        refs = [weakref.ref(project) for project in (first, second, third)]
+    del first, second, third
+    gc.collect()
+    assert pool.idle == 1
+    assert sum(ref() is None for ref in refs) == 2
+
+
+def test_model_calls_share_http_pool():
+    """测试模型调用经由共享连接池发出并复用连接"""
+    import threading
+
+    from benchmarks.stub_server import StubConfig, create_server
+    from agent_project.crew import build_deepseek_llm
+    from agent_project.http_pool import shared_http_handler
+
+    config = StubConfig(response_tokens=5)
+    server = create_server(config=config)
+    connections = []
+    process_request = server.process_request
+    server.process_request = lambda request, address: (connections.append(address),
+                                                       process_request(request, address))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    sent = []
+    client = shared_http_handler().client
+    client.event_hooks['request'].append(sent.append)
+    env = {k: os.environ.get(k) for k in ('DEEP_SEEK_URL', 'DEEP_SEEK_KEY')}
+    os.environ['DEEP_SEEK_URL'] = f"http://127.0.0.1:{server.server_address[1]}"
+    os.environ['DEEP_SEEK_KEY'] = 'stub'
+    try:
+        for _ in range(3):
+            assert build_deepseek_llm().call("分析五行")
+    finally:
+        client.event_hooks['request'].remove(sent.append)
+        for k, v in env.items():
+            if v is None:
+                os.environ.pop(k, None)
+            else:
+                os.environ[k] = v
+        server.shutdown()
+        server.server_close()
+    assert len(sent) == config.requests == 3
+    assert len(connections) == 1
+
+
+def test_single_flight_coalesces_identical_calls():
+    """测试相同输入的并发调用只执行一次"""
+    import threading
+
+    assert flight_key(dict(TEST_INPUTS, request_id='a')) == flight_key(dict(TEST_INPUTS, request_id='b'))
+    assert flight_key(TEST_INPUTS) != flight_key(dict(TEST_INPUTS, gender='女'))
+
+    flights = SingleFlight()
+    started, release = threading.Event(), threading.Event()
+    calls = []
+
+    def run():
+        calls.append(1)
+        started.set()
+        release.wait()
+        return '结果'
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(flights.do('k', run))) for _ in range(4)]
+    threads[0].start()
+    started.wait()
+    for t in threads[1:]:
+        t.start()
+    while flights.coalesced < 3:
+        pass
+    release.set()
+    for t in threads:
+        t.join()
+    assert calls == [1] and results == ['结果'] * 4
+    assert flights.inflight == 0
+
+
+def test_lunar_birth_date_converted_locally():
+    """测试农历出生日期在 kickoff 前换算为公历"""
+    crew = AgentProject(local_bazi=True, concurrent_tasks=False).crew()
+    inputs = dict(TEST_INPUTS, birth_date='农历2003年正月十三')
+    for callback in crew.before_kickoff_callbacks:
+        inputs = callback(inputs)
+    assert inputs['birth_date'] == '2003年2月13日（农历2003年正月十三）'
+    assert '癸未甲寅戊午壬子' in crew.tasks[0].context[0].output.raw
+
+
+def test_provided_bazi_checked_before_kickoff():
+    """测试用户提供的八字与出生时间不符时在模型调用前标记"""
+    project = AgentProject(local_bazi=False, concurrent_tasks=False)
+    crew = project.crew()
+    inputs = dict(TEST_INPUTS, birth_time='10时00分', provided_bazi='癸未甲寅戊午壬子')
+    for callback in crew.before_kickoff_callbacks:
+        inputs = callback(inputs)
+    assert not project.bazi_check.consistent
+    crew._interpolate_inputs(inputs)
+    assert '与出生时间不符' in project.calculate_bazi_task().description
+
+
+def test_plan_cache_reuses_plans(tmp_path):
+    """测试规划缓存命中时直接应用缓存的规划"""
+    cache = ResultCache(tmp_path / 'plans.sqlite3', table='plans')
+    project = AgentProject(local_bazi=True, concurrent_tasks=False, plan_cache=cache)
+    crew = project.crew()
+    # 缓存键按输入形态和参照月份计算，输入包括 kickoff 前本地填入的时间背景、十神关系、大运流年和八字核对结果
+    context = time_context(date(2025, 6, 15))
+    shape = dict(TEST_INPUTS, chart_relations='十神', luck_pillars='大运流年', bazi_check='核对', **context)
+    key = plan_cache_key(project.agents_config, project.tasks_config, [t.name for t in crew.tasks],
+                         shape, project.deepseek_llm.model, context['reference_time'])
+    cache.put(key, json.dumps([f"\n步骤{i}：为{{name}}分析" for i in range(4)], ensure_ascii=False))
+
+    inputs = dict(TEST_INPUTS, reference_date='2025-06-15')
+    for callback in crew.before_kickoff_callbacks:
+        inputs = callback(inputs)
+    assert crew.plan_cache_key == key
+    crew._handle_crew_planning()
+    assert crew.tasks[3].description.endswith("步骤3：为测试分析")
+
+    # 配置变化后缓存键随之变化
+    changed = dict(project.tasks_config, extra={'description': '新任务'})
+    assert plan_cache_key(project.agents_config, changed, [t.name for t in crew.tasks],
+                          shape, project.deepseek_llm.model, context['reference_time']) != key
+    # 参照月份变化后重新规划（规划中含预测时段）
+    assert plan_cache_key(project.agents_config, project.tasks_config, [t.name for t in crew.tasks], shape,
+                          project.deepseek_llm.model, time_context(date(2025, 7, 15))['reference_time']) != key
+
+
+def test_cached_plans_carry_no_personal_data(tmp_path):
+    """测试缓存的规划按任务模板生成，另一位求测者命中缓存时只看到自己的出生信息和命盘"""
+    import agent_project.plan_cache as plan_cache_module
+    from types import SimpleNamespace
+
+    seen = []
+
+    class EchoPlanner:
+        """把收到的任务描述原样写进规划，便于检查规划中含有哪些信息"""
+        def __init__(self, tasks, planning_agent_llm):
+            self.tasks = tasks
+
+        def _handle_crew_planning(self):
+            seen.extend(t.description for t in self.tasks)
+            return SimpleNamespace(list_of_plans_per_task=[
+                SimpleNamespace(plan=f"\n规划依据：{t.description}") for t in self.tasks])
+
+    def run(inputs):
+        project = AgentProject(local_bazi=True, concurrent_tasks=False, plan_cache=cache)
+        crew = project.crew()
+        for callback in crew.before_kickoff_callbacks:
+            inputs = callback(inputs)
+        crew._interpolate_inputs(inputs)
+        crew._handle_crew_planning()
+        return inputs, project.interpret_personality_task().description
+
+    cache = ResultCache(tmp_path / 'plans.sqlite3', table='plans')
+    original = plan_cache_module.CrewPlanner
+    plan_cache_module.CrewPlanner = EchoPlanner
+    try:
+        first, first_description = run(dict(TEST_INPUTS, reference_date='2025-06-15'))
+        second, second_description = run(dict(TEST_INPUTS, name='另一位', birth_date='1990年5月15日',
+                                              birth_time='14时', reference_date='2025-06-15'))
+    finally:
+        plan_cache_module.CrewPlanner = original
+
+    # 只规划了一次，且规划模型看到的是模板
+    assert len(seen) == 4 and all(first['chart_relations'] not in d for d in seen)
+    assert first['chart_relations'] != second['chart_relations']
+    assert first_description.count(first['chart_relations']) == 2
+    assert second_description.count(second['chart_relations']) == 2
+    assert first['chart_relations'] not in second_description and '测试' not in second_description
+
+
+def test_instrumentation_records_task_spans():
+    """测试运行统计记录任务耗时、LLM调用和跳过的任务"""
+    with crewai_event_bus.scoped_handlers():
+        stats = Instrumentation()
+        project = AgentProject(local_bazi=True, concurrent_tasks=False)
+        crew = project.crew()
+        inputs = dict(TEST_INPUTS)
+        for callback in crew.before_kickoff_callbacks:
+            inputs = callback(inputs)
+
+        task = project.analyze_wuxing_task()
+        task.agent.crew = crew
+        crewai_event_bus.emit(crew, CrewKickoffStartedEvent(crew_name='crew', inputs=inputs))
+        crewai_event_bus.emit(task, TaskStartedEvent(context='', task=task))
+        crewai_event_bus.emit(project.deepseek_llm, LLMCallStartedEvent(messages='五行'))
+        crewai_event_bus.emit(project.deepseek_llm, LLMCallCompletedEvent(response='木旺', call_type='llm_call'))
+        output = TaskOutput(description='', raw='木旺', agent='x')
+        crewai_event_bus.emit(task, TaskCompletedEvent(output=output, task=task))
+        crewai_event_bus.emit(crew, CrewKickoffCompletedEvent(crew_name='crew', output=output, total_tokens=0))
+
+    run = stats.last_run(crew)
+    assert run['status'] == 'ok'
+    span, skipped = run['tasks']
+    assert span['task'] == 'analyze_wuxing_task' and span['llm_calls'] == 1
+    assert skipped == {'task': 'calculate_bazi_task', 'status': 'skipped', 'source': 'local'}
+    text = stats.prometheus_text()
+    assert 'bazi_llm_calls_total{task="analyze_wuxing_task",agent="五行命理宗师"} 1' in text
+    assert 'bazi_runs_total{status="ok"} 1' in text
+    # 其他团队查不到这次运行
+    assert stats.last_run(AgentProject(local_bazi=True, concurrent_tasks=False).crew()) is None
+
+
+def test_options_from_argv():
+    """测试命令行开关"""
+    options = options_from_argv(['run_crew', '--local-bazi'])
+    assert options['local_bazi'] is True
+    assert options['concurrent_tasks'] is None
+    assert reference_date_from_argv(['run_crew', '--reference-date', '2025-06-15']) == '2025-06-15'
+    assert reference_date_from_argv(['run_crew', '--reference-date=2025年6月', '--local-bazi']) == '2025年6月'
+
+
+if __name__ == "__main__":
+    test_local_bazi_skips_calculate_task()
+    test_chart_facts_injected_into_tasks()
+    with tempfile.TemporaryDirectory() as tmp:
+        test_checkpoints_resume_from_first_incomplete_task(Path(tmp))
+    test_concurrent_schedule()
+    with tempfile.TemporaryDirectory() as tmp:
+        test_chart_cache_skips_cached_tasks(Path(tmp))
+    with tempfile.TemporaryDirectory() as tmp:
+        test_chart_cache_carries_no_birth_details(Path(tmp))
+    with tempfile.TemporaryDirectory() as tmp:
+        test_incremental_mode_reruns_only_date_dependent_tasks(Path(tmp))
+    test_anonymize_short_names()
+    test_context_compaction()
+    test_stream_events_routed_per_project()
+    test_streaming_handler_batches_and_spills()
+    test_crew_pool_reuses_instances()
+    test_crew_pool_releases_extra_instances()
+    test_model_calls_share_http_pool()
+    test_single_flight_coalesces_identical_calls()
+    with tempfile.TemporaryDirectory() as tmp:
+        test_plan_cache_reuses_plans(Path(tmp))
+    with tempfile.TemporaryDirectory() as tmp:
+        test_cached_plans_carry_no_personal_data(Path(tmp))
+    test_instrumentation_records_task_spans()
+    test_options_from_argv()
+    print("✅ 运行模式测试通过")
@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+HTTP 服务测试（使用本地模拟的分析流程，不调用API）
+"""
+
+import asyncio
+import json
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(__file__), 'src'))
+
+from agent_project.server import MAX_HEADERS, AnalysisServer, inputs_from_payload
+
+PAYLOAD = {
+    'name': '测试', 'gender': '男',
+    'birth_year': 2003, 'birth_month': 2, 'birth_day': 13, 'birth_hour': 23, 'birth_minute': 55,
+}
+
+
+async def _request(port: int, method: str, path: str, payload=None) -> str:
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    body = json.dumps(payload, ensure_ascii=False).encode('utf-8') if payload is not None else b''
+    writer.write(f"{method} {path} HTTP/1.1\r\nHost: test\r\nContent-Length: {len(body)}\r\n\r\n".encode() + body)
+    await writer.drain()
+    response = (await reader.read()).decode('utf-8')
+    writer.close()
+    return response
+
+
+def test_inputs_from_payload():
+    """测试请求参数校验"""
+    inputs = inputs_from_payload(PAYLOAD)
+    assert inputs['birth_date'] == '2003年2月13日'
+    assert inputs['birth_time'] == '23时55分'
+    try:
+        inputs_from_payload(dict(PAYLOAD, birth_month=13))
+        raise AssertionError("应拒绝无效月份")
+    except ValueError as e:
+        assert '月份' in str(e)
+    for month, day in ((2, 30), (4, 31), (2, 29)):
+        try:
+            inputs_from_payload(dict(PAYLOAD, birth_month=month, birth_day=day))
+            raise AssertionError("应拒绝不存在的日期")
+        except ValueError as e:
+            assert '没有' in str(e)
+    assert inputs_from_payload(dict(PAYLOAD, reference_date='2026年1月'))['reference_date'] == '2026-01-15'
+
+    # 农历出生日期在本地换算为公历
+    lunar = inputs_from_payload(dict(PAYLOAD, birth_month=1, calendar='lunar'))
+    assert lunar['birth_date'] == '2003年2月13日（农历2003年正月十三）' and lunar['birth_day'] == 13
+
+
+def test_backpressure_and_sse():
+    """测试执行槽和队列占满后返回429，分析结果以SSE返回"""
+    async def scenario():
+        release = asyncio.Event()
+
+        async def runner(inputs, **options):
+            yield {'event': 'token', 'task': 'analyze_wuxing_task', 'text': inputs['name']}
+            await release.wait()
+            yield {'event': 'result', 'output': '完成'}
+
+        server = AnalysisServer(max_inflight=1, queue_size=1, runner=runner)
+        listener = await server.start('127.0.0.1', 0)
+        port = listener.sockets[0].getsockname()[1]
+
+        # 输入各不相同，不会被合并
+        first = asyncio.create_task(_request(port, 'POST', '/analyze', PAYLOAD))
+        second = asyncio.create_task(_request(port, 'POST', '/analyze', dict(PAYLOAD, birth_minute=56)))
+        while server.admission.inflight + server.admission.queued < 2:
+            await asyncio.sleep(0.01)
+
+        rejected = await _request(port, 'POST', '/analyze', dict(PAYLOAD, birth_minute=57))
+        health = await _request(port, 'GET', '/health')
+        release.set()
+        responses = await asyncio.gather(first, second)
+        listener.close()
+        return rejected, health, responses
+
+    rejected, health, responses = asyncio.run(scenario())
+    assert rejected.startswith('HTTP/1.1 429')
+    assert 'Retry-After' in rejected
+    assert '"inflight": 1, "queued": 1' in health
+    for response in responses:
+        assert 'text/event-stream' in response
+        assert 'event: token\ndata: {"event": "token", "task": "analyze_wuxing_task", "text": "测试"}' in response
+        assert 'event: result' in response
+
+
+def test_identical_requests_coalesced():
+    """测试相同请求合并为一次执行，后到的请求共享事件流且不占用执行槽"""
+    async def scenario():
+        release = asyncio.Event()
+        calls = []
+
+        async def runner(inputs, **options):
+            calls.append(inputs)
+            yield {'event': 'token', 'task': 'analyze_wuxing_task', 'text': inputs['name']}
+            await release.wait()
+            yield {'event': 'result', 'output': '完成'}
+
+        server = AnalysisServer(max_inflight=1, queue_size=0, runner=runner)
+        listener = await server.start('127.0.0.1', 0)
+        port = listener.sockets[0].getsockname()[1]
+
+        first = asyncio.create_task(_request(port, 'POST', '/analyze', PAYLOAD))
+        while not calls:
+            await asyncio.sleep(0.01)
+        # 同一出生时刻的不同写法也视为相同请求
+        same = dict(PAYLOAD, name=' 测试 ', birth_minute='55')
+        others = [asyncio.create_task(_request(port, 'POST', '/analyze', same)) for _ in range(3)]
+        while server.flights.coalesced < 3:
+            await asyncio.sleep(0.01)
+        release.set()
+        responses = await asyncio.gather(first, *others)
+        health = await _request(port, 'GET', '/health')
+        listener.close()
+        return calls, responses, health
+
+    calls, responses, health = asyncio.run(scenario())
+    assert len(calls) == 1
+    assert '"coalesced": 3' in health and '"inflight": 0' in health
+    for response in responses:
+        assert response.startswith('HTTP/1.1 200')
+        assert '"text": "测试"' in response and 'event: result' in response
+
+
+def test_malformed_and_slow_requests_rejected():
+    """测试无效的 Content-Length、请求行过长、无效日期返回400，请求头过多或过长返回431，读取请求超时返回408"""
+    async def raw(port: int, data: bytes) -> str:
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        writer.write(data)
+        await writer.drain()
+        response = (await reader.read()).decode('utf-8')
+        writer.close()
+        return response
+
+    async def scenario():
+        server = AnalysisServer(read_timeout=0.2, runner=lambda inputs, **options: None)
+        listener = await server.start('127.0.0.1', 0)
+        port = listener.sockets[0].getsockname()[1]
+        responses = [await raw(port, f"POST /analyze HTTP/1.1\r\nContent-Length: {length}\r\n\r\n".encode())
+                     for length in ('abc', '-5')]
+        # 声明了请求体却不发送
+        responses.append(await raw(port, b"POST /analyze HTTP/1.1\r\nContent-Length: 10\r\n\r\n"))
+        # 请求头过多、单行超过缓冲区上限
+        many = "".join(f"X-H{i}: 1\r\n" for i in range(MAX_HEADERS + 1))
+        responses.append(await raw(port, f"GET /health HTTP/1.1\r\n{many}\r\n".encode()))
+        responses.append(await raw(port, b"GET /health HTTP/1.1\r\nX-Long: " + b"a" * 70000 + b"\r\n\r\n"))
+        responses.append(await raw(port, b"GET /" + b"a" * 70000 + b" HTTP/1.1\r\n\r\n"))
+        # 不存在的公历日期在准入前拒绝
+        body = json.dumps(dict(PAYLOAD, birth_month=2, birth_day=30)).encode()
+        responses.append(await raw(port, b"POST /analyze HTTP/1.1\r\nContent-Length: %d\r\n\r\n" % len(body)
+                                   + body))
+        listener.close()
+        return responses
+
+    invalid, negative, slow, many, long_header, long_line, feb30 = asyncio.run(scenario())
+    assert invalid.startswith('HTTP/1.1 400') and negative.startswith('HTTP/1.1 400')
+    assert slow.startswith('HTTP/1.1 408')
+    assert many.startswith('HTTP/1.1 431') and long_header.startswith('HTTP/1.1 431')
+    assert long_line.startswith('HTTP/1.1 400')
+    assert feb30.startswith('HTTP/1.1 400') and '2月没有30日' in feb30
+
+
+if __name__ == "__main__":
+    test_inputs_from_payload()
+    test_backpressure_and_sse()
+    test_identical_requests_coalesced()
+    test_malformed_and_slow_requests_rejected()
+    print("✅ HTTP服务测试通过")